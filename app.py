@@ -1,7 +1,17 @@
+import uuid
 import streamlit as st
-from agents import *
-from tasks import *
-from crew import *
+from crew import run_crew_turn
+from modules.llm_gateway import get_gateway
+from modules.singleflight import get_singleflight
+from modules.routing import get_recorder, summarize
+from modules.metrics import start_exporters
+from modules import tracing
+from modules.structured_logging import logging_stats
+from modules.profiling import get_profiler, profile_turn
+from modules.crew_pool import pool_stats
+from modules.session_store import get_session_store
+
+start_exporters()
 
 
 # --- Streamlit App UI ---
@@ -17,6 +27,9 @@ if 'current_profile_state' not in st.session_state:
     st.session_state.current_profile_state = {}
 if 'current_assessment_state' not in st.session_state:
     st.session_state.current_assessment_state = {}
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex  # Also the key of this user's state in the session store
+    st.session_state.turn = 0
 
 # Display chat messages from history
 for message in st.session_state.chat_history:
@@ -31,18 +44,23 @@ if user_input := st.chat_input("What's on your mind?"):
 
     with st.chat_message("assistant"):
         with st.spinner("DrukCare AI is thinking..."):
+            st.session_state.turn += 1
             # Call the run_crew_turn function from your main script
-            turn_output = run_crew_turn(
-                user_input,
-                st.session_state.current_profile_state,
-                st.session_state.current_assessment_state
-            )
+            with profile_turn(st.session_state.session_id, st.session_state.turn) as profile_path:
+                turn_output = run_crew_turn(
+                    user_input,
+                    st.session_state.current_profile_state,
+                    st.session_state.current_assessment_state,
+                    session_id=st.session_state.session_id  # State is kept server-side in the session store
+                )
+            if profile_path:
+                st.session_state.last_profile = profile_path
             
             # Update session states from the turn output
             st.session_state.current_profile_state = turn_output["updated_profile_state"]
             st.session_state.current_assessment_state = turn_output["updated_assessment_state"]
             
-            ai_response = turn_output["response"].raw
+            ai_response = getattr(turn_output["response"], "raw", turn_output["response"])  # Direct questionnaire turns return text
             st.markdown(ai_response)
             st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
 
@@ -53,6 +71,30 @@ with st.sidebar:
     st.json(st.session_state.current_profile_state)
     st.subheader("Assessment State")
     st.json(st.session_state.current_assessment_state)
+    st.subheader("LLM Gateway")
+    st.json(get_gateway().stats())
+    st.subheader("Coalesced Calls")
+    st.json(get_singleflight().stats())
+    st.subheader("Model Routing")
+    st.json(summarize(get_recorder().records()))
+    st.subheader("Log Queue")
+    st.json(logging_stats())
+    st.subheader("Crew Pools")
+    st.json(pool_stats())
+    st.subheader("Session Store")
+    st.json(get_session_store().stats())
+    st.subheader("Tracing")
+    tracing.set_enabled(st.checkbox("Record spans", value=tracing.get_tracer().enabled))
+    slowest = sorted(tracing.get_tracer().spans(), key=lambda s: s["duration_ms"], reverse=True)[:5]
+    st.json([{k: s[k] for k in ("kind", "name", "duration_ms", "trace_id")} for s in slowest])
+    st.subheader("Profiling")
+    profile_count = st.number_input("Turns to profile", min_value=1, max_value=20, value=1)
+    if st.button("Profile next turns"):
+        get_profiler().request_turns(int(profile_count))
+    st.caption(f"Turns left to profile: {get_profiler().remaining}")
+    if st.session_state.get('last_profile'):
+        with open(st.session_state.last_profile, "r", encoding="utf-8") as f:
+            st.code(f.read(), language=None)
     st.markdown("---")
     if st.button("Start New Conversation"):
         st.session_state.chat_history = [{"role": "assistant", "content": "Hello! How can I assist you with your mental well-being today?"}]
@@ -1,53 +1,167 @@
-from crewai import Crew, Process
-from agents import *
-from tasks import *
 import json
-from langsmith import traceable
+from modules.tracing import traceable
 from typing import Optional
+from modules.registry import register, get
+from modules.singleflight import kickoff
+from modules.crew_pool import get_pool
+from modules.structured_logging import log_crew_tasks
+from modules.assessment_session import AssessmentSession
+from modules.profile_session import ProfileSession
+from modules.session_store import assessment_view, get_session_store, profile_view, reference
+from modules.metrics import stage
+import tasks  # registers the agent and task factories
 
-# Define the Crew with a sequential process
-bhutan_mental_health_crew = Crew(
-    agents=[
-        crisis_detection_agent,
-        behavioral_agent,
-        rag_agent,
-        assessment_agent,
-        personalized_recommendation_agent
-    ],
-    tasks=[
-        crisis_detection_task,
-        collect_user_profile_task,
-        # Ingest data might be a separate background process or an initial setup task
-        # ingest_data_task,
-        query_vector_db_task,
-        conduct_assessment_task,
-        personalize_and_recommend_task
-    ],
-    process=Process.sequential, # Execute tasks in the order defined
-    verbose=True,
-    output_log_file="output.txt",
-    manager_llm=None # Only necessary for hierarchical process
-)
+# Define the Crew with a sequential process (built on first use)
+@register("crew.bhutan_mental_health_crew")
+def build_bhutan_mental_health_crew():
+    from crewai import Crew, Process
+    # Task start/completion records go to the structured log (LOG_FILE), written off the request path
+    return log_crew_tasks(Crew(
+        agents=[
+            get("agents.crisis_detection_agent"),
+            get("agents.behavioral_agent"),
+            get("agents.rag_agent"),
+            get("agents.assessment_agent"),
+            get("agents.personalized_recommendation_agent")
+        ],
+        tasks=[
+            get("tasks.crisis_detection_task"),
+            get("tasks.collect_user_profile_task"),
+            # Ingest data might be a separate background process or an initial setup task
+            # get("tasks.ingest_data_task"),
+            get("tasks.query_vector_db_task"),
+            get("tasks.conduct_assessment_task"),
+            get("tasks.personalize_and_recommend_task")
+        ],
+        process=Process.sequential, # Execute tasks in the order defined
+        verbose=True,
+        manager_llm=None # Only necessary for hierarchical process
+    ))
+
+def profile_message(reply: dict) -> str:
+    """What to tell the user for a User Profile Manager reply."""
+    status = reply["status"]
+    if status == "consent_pending" or "pending" in status:
+        return reply["next_question_for_user"]
+    elif status == "complete":
+        return "Thank you for providing your profile. I'll use it to tailor recommendations."
+    elif status == "skipped_all":
+        return "You chose to skip profile collection. I'll provide general recommendations."
+    elif status == "consent_denied":
+        return "You chose not to share your profile. I'll provide general recommendations."
+    return ""
+
+def profile_turn(user_input: str, current_profile_state: dict, current_assessment_state: dict, session_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Answers a turn directly, without the crew, when it is wholly an answer to the pending profile question.
+    None for every other turn; anything the profile state machine can't parse goes to the crew's agent.
+    """
+    session = ProfileSession.resume(current_profile_state)
+    if session is None or not session.accepts(user_input):
+        return None
+    with stage("profile_answer"):
+        reply = session.respond(user_input)
+        if session_id:
+            get_session_store().put(session_id, "profile", reply["profile"])
+    return {
+        "response": profile_message(reply),
+        "updated_profile_state": reply["profile"],
+        "updated_assessment_state": current_assessment_state
+    }
+
+def assessment_state(reply: dict) -> dict:
+    """The assessment state to carry to the next turn, from an Administer Questionnaire reply."""
+    state = {
+        "assessment_name": reply.get("assessment_name"),
+        "consent_given": reply.get("consent_given"),
+        "current_q_idx": reply.get("current_q_idx"),
+        "scores": reply.get("scores")
+    }
+    if reply.get("skipped") or reply.get("status") == "skipped":
+        state["skipped"] = True
+    return state
+
+def assessment_message(reply: dict) -> str:
+    """What to tell the user for an Administer Questionnaire reply."""
+    status = reply["status"]
+    if status == "q_pending" or status == "consent_pending":
+        return reply["next_question_for_user"]
+    elif status == "complete":
+        return f"You completed the {reply['assessment_name']} questionnaire. Your score is {reply['total_score']} ({reply['interpretation']}). I'll use this information."
+    elif status == "consent_denied" or status == "skipped":
+        return f"You chose to skip the {reply['assessment_name']} questionnaire. That's fine."
+    elif status == "no_assessment_needed":
+        return "No specific assessment was needed at this time."
+    return ""
+
+def assessment_turn(user_input: str, current_profile_state: dict, current_assessment_state: dict, session_id: Optional[str] = None) -> Optional[dict]:
+    """
+    Answers a turn directly, without the crew, when it is an answer to a questionnaire in progress.
+    None for every other turn; free text still goes through the crew (and its crisis check).
+    """
+    session = AssessmentSession.resume(current_assessment_state)
+    if session is None or not session.accepts(user_input):
+        return None
+    with stage("assessment_answer"):
+        reply = session.respond(user_input)
+        if session_id:
+            get_session_store().put(session_id, "assessment", session.snapshot())
+    return {
+        "response": assessment_message(reply),
+        "updated_profile_state": current_profile_state,
+        "updated_assessment_state": assessment_state(reply)
+    }
 
 # Function to run a single turn of the mental health assistant crew
 @traceable
-def run_crew_turn(user_input: str, current_profile_state: dict, current_assessment_state: dict, rag_query_result: Optional[str]=None, retrieved_info: Optional[str]=None) -> dict:
+def run_crew_turn(user_input: str, current_profile_state: dict, current_assessment_state: dict, rag_query_result: Optional[str]=None, retrieved_info: Optional[str]=None, session_id: Optional[str]=None) -> dict:
     """
     Runs one turn of the mental health assistance crew.
 
+    With a `session_id`, profile and assessment state live in the session store
+    (modules/session_store.py) and the state arguments are ignored; the crew only
+    sees a session reference and one-line views of them.
+
     Returns a dictionary containing the AI's response and updated states.
     """
+    if session_id is None:
+        return _crew_turn(user_input, current_profile_state, current_assessment_state, rag_query_result, retrieved_info)
+    store = get_session_store()
+    turn = _crew_turn(user_input, store.get(session_id, "profile"), store.get(session_id, "assessment"),
+                      rag_query_result, retrieved_info, session_id)
+    # The tools and direct turns have written the new states to the store
+    turn["updated_profile_state"] = store.get(session_id, "profile")
+    turn["updated_assessment_state"] = store.get(session_id, "assessment")
+    return turn
+
+def _crew_turn(user_input: str, current_profile_state: dict, current_assessment_state: dict, rag_query_result: Optional[str]=None, retrieved_info: Optional[str]=None, session_id: Optional[str]=None) -> dict:
+    # Questionnaire and profile answers are recorded by their state machines; no agent round trip
+    for direct_turn in (assessment_turn, profile_turn):
+        direct = direct_turn(user_input, current_profile_state, current_assessment_state, session_id)
+        if direct is not None:
+            return direct
+
+    if session_id:
+        # Tools read and write the state through the reference; prompts only get short views
+        profile_json, assessment_json = profile_view(current_profile_state), assessment_view(current_assessment_state)
+        profile_ref = assessment_ref = reference(session_id)
+    else:
+        profile_json, assessment_json = json.dumps(current_profile_state), json.dumps(current_assessment_state)
+        profile_ref, assessment_ref = profile_json, assessment_json
     inputs = {
         "user_query": user_input,
-        "user_profile_data_json": json.dumps(current_profile_state),
-        "assessment_result_json": json.dumps(current_assessment_state),
+        "user_profile_data_json": profile_json,
+        "assessment_result_json": assessment_json,
+        "profile_state_ref": profile_ref,
+        "assessment_state_ref": assessment_ref,
         "rag_query_result_json": rag_query_result,
         "retrieved_info_json": retrieved_info
     }
 
     try:
         # CrewAI's kickoff returns the final output of the last task that runs
-        raw_output = bhutan_mental_health_crew.kickoff(inputs=inputs)
+        # Identical concurrent turns (reruns, double-submits) share one kickoff
+        raw_output = kickoff("crew.bhutan_mental_health_crew", get_pool("crew.bhutan_mental_health_crew", prepare=log_crew_tasks), inputs)
         raw_output_string = raw_output.raw
         
         # CrewAI's output is often a string directly from the last agent.
@@ -70,32 +184,13 @@ def run_crew_turn(user_input: str, current_profile_state: dict, current_assessme
                 # Handle output from User Profile Manager (via collect_user_profile_task)
                 if "profile" in parsed_output and "message_for_agent" in parsed_output:
                     updated_profile_state = parsed_output["profile"]
-                    if status == "consent_pending" or "pending" in status:
-                        response_for_user = parsed_output["next_question_for_user"]
-                    elif status == "complete":
-                        response_for_user = "Thank you for providing your profile. I'll use it to tailor recommendations."
-                    elif status == "skipped_all":
-                        response_for_user = "You chose to skip profile collection. I'll provide general recommendations."
-                    elif status == "consent_denied":
-                        response_for_user = "You chose not to share your profile. I'll provide general recommendations."
+                    response_for_user = profile_message(parsed_output)
                     
                 # Handle output from Administer Questionnaire (via conduct_assessment_task)
                 elif "assessment_name" in parsed_output and "total_score" in parsed_output:
                     # This means conduct_assessment_task completed or is pending
-                    updated_assessment_state = {
-                        "consent_given": parsed_output.get("consent_given"),
-                        "current_q_idx": parsed_output.get("current_q_idx"),
-                        "scores": parsed_output.get("scores")
-                    } # Reconstruct state for next turn if needed
-                    
-                    if status == "q_pending" or status == "consent_pending":
-                        response_for_user = parsed_output["next_question_for_user"]
-                    elif status == "complete":
-                        response_for_user = f"You completed the {parsed_output['assessment_name']} questionnaire. Your score is {parsed_output['total_score']} ({parsed_output['interpretation']}). I'll use this information."
-                    elif status == "consent_denied" or status == "skipped":
-                        response_for_user = f"You chose to skip the {parsed_output['assessment_name']} questionnaire. That's fine."
-                    elif status == "no_assessment_needed":
-                        response_for_user = "No specific assessment was needed at this time."
+                    updated_assessment_state = assessment_state(parsed_output) # Reconstruct state for next turn if needed
+                    response_for_user = assessment_message(parsed_output)
                 
                 # If it's a final recommendation, it won't have a 'status' like the tools do,
                 # it will be the direct output of the personalized_recommendation_agent.
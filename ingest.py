@@ -2,9 +2,10 @@ from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_docling import DoclingLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter 
+from modules.config import get_config
 
 DATA_PATH = 'RAG_documents_medicine_buddha/'
-DB_FAISS_PATH = 'vectorstore/db_medicine_buddha'
+DB_FAISS_PATH = get_config()['vectorstore_path']
 
 # Create vector database
 def create_vector_db():
@@ -15,7 +16,7 @@ def create_vector_db():
                                                    chunk_overlap=50)
     texts = text_splitter.split_documents(documents)
 
-    embeddings = HuggingFaceEmbeddings(model_name='sentence-transformers/all-mpnet-base-v2',
+    embeddings = HuggingFaceEmbeddings(model_name=get_config()['rag_embedding_model'],  # retrieval.py loads it with the same model
                                        model_kwargs={'device': 'cpu'})
 
     db = FAISS.from_documents(texts, embeddings)
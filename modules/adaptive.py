@@ -0,0 +1,174 @@
+# modules/adaptive.py
+"""
+Adaptive (early-termination) questionnaire administration.
+
+After each answer the lowest and highest totals still reachable are worked out from the
+answers so far: answered values plus every remaining item at the bottom or the top of the
+scale. Once both fall in the same band of the instrument's band table, no answer to come
+can change the interpretation, so only the critical items not yet asked (PHQ-9 item 9,
+self-harm) are still put to the user. Those are always asked.
+
+The reported score of an early-stopped assessment is the lowest reachable total, which
+lies in the settled band. Off unless ADAPTIVE_ASSESSMENT is set.
+
+    python -m modules.adaptive assessments.jsonl    # replay stored assessments
+    python -m modules.adaptive --synthetic 50000    # turns saved on generated ones
+"""
+import argparse
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from modules.config import get_config
+from modules.instruments import Instrument, Item, get_instrument
+from modules.scoring import by_item_id
+
+
+def enabled() -> bool:
+    return get_config()["adaptive_assessment"]
+
+
+def score_bounds(instrument: Instrument, responses: Mapping[str, Any]) -> Tuple[int, int]:
+    """Lowest and highest totals still reachable given answers keyed by item id (off-scale answers count 0)."""
+    total, answered = 0, 0
+    for item in instrument.items:
+        if item.id in responses:
+            total += instrument.response_value(responses[item.id]) or 0
+            answered += 1
+    remaining = len(instrument.items) - answered
+    return total + remaining * instrument.min_value, total + remaining * instrument.max_value
+
+
+def band_settled(instrument: Instrument, responses: Mapping[str, Any]) -> bool:
+    """True once every reachable total falls in one band, i.e. the interpretation can no longer change."""
+    if not instrument.scored:
+        return False
+    low, high = score_bounds(instrument, responses)
+    index = instrument.bands.index(low)
+    return index >= 0 and index == instrument.bands.index(high)
+
+
+def next_item(instrument: Instrument, responses: Mapping[str, Any], start: int = 0) -> Optional[Item]:
+    """The next item to ask from position `start` on; once the band is settled, only unasked critical items."""
+    settled = band_settled(instrument, responses)
+    for item in instrument.items[start:]:
+        if item.id not in responses and (item.critical or not settled):
+            return item
+    return None
+
+
+def next_position(instrument: Instrument, responses: Mapping[str, Any], start: int) -> int:
+    """Position of next_item() from `start` on; len(items) when the assessment is done."""
+    item = next_item(instrument, responses, start)
+    return item.number - 1 if item is not None else len(instrument.items)
+
+
+def replay_scores(instrument: Instrument, scores: List[int]) -> Dict[str, int]:
+    """
+    Answers keyed by item id for scores given in the order asked. The items asked follow from
+    the scores themselves (in order until the band settles, then the critical ones), so state
+    that only keeps a list of scores needs nothing else.
+    """
+    responses: Dict[str, int] = {}
+    start = 0
+    for value in scores:
+        item = next_item(instrument, responses, start)
+        if item is None:
+            break
+        responses[item.id] = value
+        start = item.number
+    return responses
+
+
+def next_question_index(condition: str, responses: Mapping[str, Any], index: int) -> int:
+    """
+    For the front ends' legacy question lists (instructions line first, if any): the list index
+    to ask after `index` was reached by stepping forward. Unchanged unless adaptive
+    administration is on; len(list) when the assessment is done.
+    """
+    instrument = get_instrument(condition)
+    if instrument is None or not instrument.scored or not enabled():
+        return index
+    offset = 1 if instrument.instructions else 0
+    return offset + next_position(instrument, responses, max(0, index - offset))
+
+
+def stopped_early(condition: str, responses: Mapping[str, Any]) -> bool:
+    instrument = get_instrument(condition)
+    return instrument is not None and instrument.scored and len(by_item_id(instrument, responses)) < len(instrument.items)
+
+
+# --- Replay ---
+
+def replay(instrument: Instrument, answers: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+    """Administers a completed assessment adaptively; None unless every item has an on-scale answer."""
+    full = {item_id: instrument.response_value(str(a)) for item_id, a in by_item_id(instrument, answers).items()}
+    if len(full) < len(instrument.items) or None in full.values():
+        return None
+    asked: Dict[str, int] = {}
+    item = next_item(instrument, asked)
+    while item is not None:
+        asked[item.id] = full[item.id]
+        item = next_item(instrument, asked, item.number)
+    full_score, early_score = sum(full.values()), score_bounds(instrument, asked)[0]
+    return {
+        "asked": len(asked),
+        "band_agrees": instrument.bands.index(full_score) == instrument.bands.index(early_score),
+        "critical_asked": all(item.id in asked for item in instrument.items if item.critical),
+    }
+
+
+def replay_all(records: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Turns asked and saved per instrument over completed assessments ({"instrument", "answers"} records)."""
+    totals: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"sessions": 0, "items": 0, "asked": 0, "band_agrees": 0,
+                                                             "critical_asked": 0, "skipped_records": 0})
+    for record in records:
+        instrument = get_instrument(record.get("instrument"))
+        if instrument is None or not instrument.scored:
+            continue
+        row = totals[instrument.name]
+        result = replay(instrument, record.get("answers") or {})
+        if result is None:
+            row["skipped_records"] += 1
+            continue
+        row["sessions"] += 1
+        row["items"] += len(instrument.items)
+        row["asked"] += result["asked"]
+        row["band_agrees"] += result["band_agrees"]
+        row["critical_asked"] += result["critical_asked"]
+    return dict(totals)
+
+
+def main():
+    from modules.assessment_analytics import read_jsonl, synthetic_assessments
+
+    parser = argparse.ArgumentParser(description="Replays completed assessments with early termination and reports turns saved.")
+    parser.add_argument("files", nargs="*", help="JSON-lines files of completed assessments (as for modules.assessment_analytics)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Also replay this many generated assessments")
+    args = parser.parse_args()
+
+    def records():
+        for path in args.files:
+            yield from read_jsonl(path)
+        if args.synthetic:
+            yield from synthetic_assessments(args.synthetic)
+
+    started = time.perf_counter()
+    totals = replay_all(records())
+    elapsed = time.perf_counter() - started
+    print(f"{'instrument':<12}{'sessions':>10}{'items':>7}{'mean asked':>12}{'turns saved':>13}{'saved':>8}"
+          f"{'same band':>11}{'critical':>10}")
+    for name, row in sorted(totals.items()):
+        n = max(1, row["sessions"])
+        saved = row["items"] - row["asked"]
+        print(f"{name:<12}{row['sessions']:>10}{row['items'] // n:>7}{row['asked'] / n:>12.2f}{saved:>13}"
+              f"{saved / max(1, row['items']):>8.1%}{row['band_agrees'] / n:>11.1%}{row['critical_asked'] / n:>10.1%}")
+    sessions = sum(row["sessions"] for row in totals.values())
+    saved = sum(row["items"] - row["asked"] for row in totals.values())
+    skipped = sum(row["skipped_records"] for row in totals.values())
+    print(f"\n📈 {saved} of {sum(row['items'] for row in totals.values())} question turns saved over {sessions} sessions "
+          f"(replayed in {elapsed:.2f}s)" + (f"; {skipped} incomplete records skipped" if skipped else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+# modules/assessment_analytics.py
+"""
+Population-level PHQ-9 / GAD-7 / DAST-10 analytics over stored assessments.
+
+Completed assessments are loaded into one item-response matrix per instrument (uint8, one
+row per assessment, one column per item). Every statistic is then computed on whole
+arrays: totals, bands (one searchsorted over the band table), per-item means, item
+endorsement rates and the critical-item flag rate (PHQ-9 item 9, self-harm). Results are
+grouped by any of month, age band, district and gender.
+
+Input is JSON lines, one completed assessment per line:
+
+    {"instrument": "PHQ-9", "completed_at": "2025-03-14T10:02:00", "answers": {"phq9_1": 2, ...},
+     "profile": {"age": 34, "location": "Thimphu", "gender": "female"}}
+
+Answers may be keyed by item id or question text, with values as numbers or scale labels.
+
+    python -m modules.assessment_analytics assessments.jsonl --by month district
+    python -m modules.assessment_analytics --synthetic 200000 --by age_band --json report.json
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from modules.instruments import Instrument, get_instrument, get_instruments
+
+DIMENSIONS = ("month", "age_band", "district", "gender")
+AGE_BANDS = ((0, 17, "<18"), (18, 24, "18-24"), (25, 34, "25-34"), (35, 44, "35-44"),
+             (45, 54, "45-54"), (55, 64, "55-64"), (65, 200, "65+"))
+SEVERITIES = ("low", "moderate", "high")
+
+
+def age_band(age) -> str:
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    for low, high, label in AGE_BANDS:
+        if low <= age <= high:
+            return label
+    return "unknown"
+
+
+def dimensions(record: Dict[str, Any]) -> Dict[str, str]:
+    profile = record.get("profile") or {}
+    completed = str(record.get("completed_at") or "")
+    return {
+        "month": completed[:7] if len(completed) >= 7 else "unknown",
+        "age_band": age_band(profile.get("age")),
+        "district": str(profile.get("district") or profile.get("location") or "unknown").strip().title(),  # Profiles store it as "location"
+        "gender": str(profile.get("gender") or "unknown").strip().lower(),
+    }
+
+
+class ResponseMatrix:
+    """Rows of one instrument's item responses, appended as bytes and viewed as a uint8 matrix."""
+
+    def __init__(self, instrument: Instrument):
+        self.instrument = instrument
+        self._rows = bytearray()
+        self.keys: Dict[str, List[str]] = {d: [] for d in DIMENSIONS}
+        self.incomplete = 0
+
+    def add(self, answers: Dict[str, Any], dims: Dict[str, str]) -> bool:
+        """Appends one assessment; False (and counted as incomplete) unless every item has an on-scale answer."""
+        instrument = self.instrument
+        row = [255] * len(instrument.items)
+        for key, answer in answers.items():
+            item_id = instrument.item_id(key)
+            value = instrument.response_value(str(answer)) if item_id is not None else None
+            if value is not None:
+                row[instrument.positions[item_id]] = value
+        if 255 in row:
+            self.incomplete += 1
+            return False
+        self._rows += bytes(row)
+        for d in DIMENSIONS:
+            self.keys[d].append(dims[d])
+        return True
+
+    def __len__(self) -> int:
+        return len(self._rows) // max(1, len(self.instrument.items))
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return np.frombuffer(bytes(self._rows), dtype=np.uint8).reshape(len(self), len(self.instrument.items))
+
+
+def load(records: Iterable[Dict[str, Any]]) -> Tuple[Dict[str, ResponseMatrix], int]:
+    """Sorts records into one ResponseMatrix per scored instrument; returns them and the count of unknown instruments."""
+    matrices: Dict[str, ResponseMatrix] = {}
+    unknown = 0
+    for record in records:
+        instrument = get_instrument(record.get("instrument"))
+        if instrument is None or not instrument.scored:
+            unknown += 1
+            continue
+        matrix = matrices.get(instrument.name)
+        if matrix is None:
+            matrix = matrices[instrument.name] = ResponseMatrix(instrument)
+        matrix.add(record.get("answers") or {}, dimensions(record))
+    return matrices, unknown
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def analyze(responses: ResponseMatrix, by: List[str]) -> Dict[str, Any]:
+    """Per-group totals, band/severity distributions, item means, endorsement and critical-item rates."""
+    instrument = responses.instrument
+    matrix = responses.matrix
+    n_items = matrix.shape[1]
+    totals = matrix.sum(axis=1, dtype=np.uint16)
+    bands = instrument.bands.indices(totals)
+    band_severity = np.array([SEVERITIES.index(b.severity) if b.severity in SEVERITIES else -1
+                              for b in instrument.bands] + [-1])[bands]
+    critical = [item.number - 1 for item in instrument.items if item.critical]
+    flagged = (matrix[:, critical] > 0).any(axis=1) if critical else np.zeros(len(totals), dtype=bool)
+
+    if by:
+        combined = np.array(["\x1f".join(parts) for parts in zip(*(responses.keys[d] for d in by))], dtype=object)
+        group_names, codes = np.unique(combined, return_inverse=True)
+    else:
+        group_names, codes = np.array(["all"], dtype=object), np.zeros(len(totals), dtype=np.int64)
+    g, n_bands = len(group_names), len(instrument.bands.bands)
+
+    counts = np.bincount(codes, minlength=g)
+    safe = np.maximum(counts, 1)
+    total_sum = np.bincount(codes, weights=totals, minlength=g)
+    total_sq = np.bincount(codes, weights=totals.astype(np.float64) ** 2, minlength=g)
+    in_range = bands >= 0
+    band_counts = np.bincount(codes[in_range] * n_bands + bands[in_range], minlength=g * n_bands).reshape(g, n_bands)
+    known = band_severity >= 0
+    severity_counts = np.bincount(codes[known] * 3 + band_severity[known], minlength=g * 3).reshape(g, 3)
+    item_sums = np.stack([np.bincount(codes, weights=matrix[:, j], minlength=g) for j in range(n_items)], axis=1)
+    endorsed = np.stack([np.bincount(codes, weights=matrix[:, j] > 0, minlength=g) for j in range(n_items)], axis=1)
+    flag_counts = np.bincount(codes, weights=flagged, minlength=g)
+
+    mean = total_sum / safe
+    std = np.sqrt(np.maximum(total_sq / safe - mean ** 2, 0))
+    groups = []
+    for i, name in enumerate(group_names):
+        groups.append({
+            "group": dict(zip(by, name.split("\x1f"))) if by else {},
+            "n": int(counts[i]),
+            "mean_total": round(float(mean[i]), 2),
+            "sd_total": round(float(std[i]), 2),
+            "bands": {b.label: int(band_counts[i, k]) for k, b in enumerate(instrument.bands)},
+            "severity_share": {s: round(float(severity_counts[i, k] / safe[i]), 4) for k, s in enumerate(SEVERITIES)},
+            "item_means": {item.id: round(float(item_sums[i, j] / safe[i]), 3) for j, item in enumerate(instrument.items)},
+            "item_endorsement": {item.id: round(float(endorsed[i, j] / safe[i]), 4) for j, item in enumerate(instrument.items)},
+            "critical_flag_rate": round(float(flag_counts[i] / safe[i]), 4) if critical else None,
+        })
+    return {"instrument": instrument.name, "assessments": int(len(totals)), "incomplete": responses.incomplete,
+            "by": by, "groups": groups}
+
+
+def synthetic_assessments(count: int, seed: int = 11) -> Iterator[Dict[str, Any]]:
+    """Random completed assessments with profiles, for trying the report and timing it."""
+    rng = random.Random(seed)
+    registry = get_instruments()
+    instruments = registry.scored()
+    districts = ["Thimphu", "Paro", "Punakha", "Chukha", "Samtse", "Sarpang", "Trashigang", "Bumthang", "Mongar", "Haa"]
+    start = datetime(2025, 1, 1)
+    for _ in range(count):
+        instrument = rng.choice(instruments)
+        bias = rng.random()  # Some people answer high throughout, some low
+        top = instrument.max_value
+        yield {
+            "instrument": instrument.name,
+            "completed_at": (start + timedelta(minutes=rng.randrange(365 * 24 * 60))).isoformat(),
+            "answers": {item.id: min(top, int(rng.random() * (top + 1) * (0.3 + bias))) for item in instrument.items},
+            "profile": {"age": rng.randint(14, 80), "location": rng.choice(districts),
+                        "gender": rng.choice(["female", "male", "other"])},
+        }
+
+
+def print_report(report: Dict[str, Any], top_items: int = 3):
+    name = report["instrument"]
+    print(f"\n=== {name}: {report['assessments']} complete assessments ({report['incomplete']} incomplete skipped)"
+          + (f", by {', '.join(report['by'])}" if report["by"] else "") + " ===")
+    print(f"{'group':<34}{'n':>8}{'mean':>7}{'sd':>6}{'low':>7}{'mod':>7}{'high':>7}{'flag':>7}  most endorsed items")
+    for g in report["groups"]:
+        label = " / ".join(g["group"].values()) or "all"
+        share = g["severity_share"]
+        flag = f"{g['critical_flag_rate']:.1%}" if g["critical_flag_rate"] is not None else "-"
+        items = sorted(g["item_endorsement"].items(), key=lambda kv: kv[1], reverse=True)[:top_items]
+        print(f"{label[:33]:<34}{g['n']:>8}{g['mean_total']:>7}{g['sd_total']:>6}{share['low']:>7.1%}"
+              f"{share['moderate']:>7.1%}{share['high']:>7.1%}{flag:>7}  "
+              + ", ".join(f"{item} {rate:.0%}" for item, rate in items))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grouped PHQ-9/GAD-7/DAST-10 distributions over stored assessments.")
+    parser.add_argument("files", nargs="*", help="JSON-lines files of completed assessments")
+    parser.add_argument("--by", nargs="*", default=["month"], choices=DIMENSIONS, help="Group by these dimensions")
+    parser.add_argument("--instrument", help="Only this instrument (name or alias)")
+    parser.add_argument("--synthetic", type=int, default=0, help="Also analyze this many generated assessments")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    def records():
+        for path in args.files:
+            yield from read_jsonl(path)
+        if args.synthetic:
+            yield from synthetic_assessments(args.synthetic)
+
+    started = time.perf_counter()
+    matrices, unknown = load(records())
+    loaded = time.perf_counter()
+    only = get_instrument(args.instrument) if args.instrument else None
+    reports = [analyze(m, args.by) for name, m in sorted(matrices.items()) if only is None or only.name == name]
+    done = time.perf_counter()
+
+    for report in reports:
+        print_report(report)
+    rows = sum(len(m) for m in matrices.values())
+    print(f"\n📊 {rows} assessments loaded in {loaded - started:.2f}s, analyzed in {(done - loaded) * 1000:.0f}ms"
+          + (f"; {unknown} records with no scored instrument skipped" if unknown else ""))
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
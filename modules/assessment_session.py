@@ -0,0 +1,181 @@
+# modules/assessment_session.py
+"""
+Deterministic questionnaire administration: consent, then one item per turn.
+
+This is the logic behind the Administer Questionnaire tool, usable without an agent in
+between. run_crew_turn (crew.py) answers questionnaire turns through it directly, so
+recording an answer is a dict update instead of an LLM round trip.
+
+    session = AssessmentSession("depression")
+    session.start()                # {'status': 'consent_pending', 'next_question_for_user': ...}
+    session.respond("yes")         # q_pending, question 1
+    session.answer("2")            # q_pending, question 2
+    session.state                  # {'consent_given': True, 'current_q_idx': 1, 'scores': [2]}
+    session.skip()                 # skipped
+
+Every reply has the tool's contract: 'status' (consent_pending, q_pending, complete,
+consent_denied, skipped, error), 'next_question_for_user', 'assessment_name',
+'total_score', 'interpretation', 'current_q_idx', 'scores' and, for bad input,
+'error_message'. Replies also carry 'consent_given' (and 'skipped' once the user has
+skipped), so the state can be rebuilt from one.
+"""
+from typing import Any, Dict, Optional
+
+from modules.adaptive import enabled as adaptive_enabled, next_position, replay_scores
+from modules.instruments import get_instrument
+
+
+def initial_state() -> Dict[str, Any]:
+    return {'consent_given': None, 'current_q_idx': -1, 'scores': []}
+
+
+class AssessmentSession:
+    def __init__(self, condition: str, state: Optional[Dict[str, Any]] = None):
+        self.condition = condition
+        self.instrument = get_instrument(condition)
+        state = {**initial_state(), **(state or {})}
+        self.state = {'consent_given': state['consent_given'], 'current_q_idx': state['current_q_idx'],
+                      'scores': list(state['scores'] or [])}
+        if state.get('skipped'):
+            self.state['skipped'] = True  # Stopped by the user; kept so a resumed session stays stopped
+
+    @classmethod
+    def resume(cls, state: Optional[Dict[str, Any]]) -> Optional["AssessmentSession"]:
+        """The session a stored assessment state (with its 'assessment_name') is in the middle of; None otherwise."""
+        if not state or not state.get('assessment_name'):
+            return None
+        session = cls(state['assessment_name'], state)
+        return session if session.in_progress else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The state to store between turns, with the questionnaire's name."""
+        return {'assessment_name': self.instrument.name if self.instrument is not None else None,
+                **self.state, 'scores': list(self.state['scores'])}
+
+    @property
+    def in_progress(self) -> bool:
+        """Consent given and questions still to answer."""
+        return (self.instrument is not None and self.instrument.scored and self.state['consent_given'] is True
+                and not self.state.get('skipped')
+                and 0 <= self.state['current_q_idx'] < len(self.instrument.items))
+
+    def accepts(self, user_input: str) -> bool:
+        """True if `user_input` is an answer to the current question (on the scale, a number, or 'skip')."""
+        text = user_input.lower().strip()
+        return self.in_progress and (self.instrument.response_value(text) is not None
+                                     or text.lstrip('-').isdigit() or text == 'skip')
+
+    def _reply(self, status: str, message: Optional[str], error: Optional[str] = None, complete: bool = False) -> Dict[str, Any]:
+        total = sum(self.state['scores']) if complete else None  # The lowest reachable total when stopped early
+        reply = {
+            'status': status,
+            'next_question_for_user': message,
+            'assessment_name': self.instrument.name if self.instrument is not None else None,
+            'total_score': total,
+            'interpretation': self.instrument.interpret(total) if complete else None,
+            'current_q_idx': self.state['current_q_idx'],
+            'scores': list(self.state['scores']),
+            'consent_given': self.state['consent_given'],
+        }
+        if self.state.get('skipped'):
+            reply['skipped'] = True
+        if error:
+            reply['error_message'] = error
+        return reply
+
+    def _question(self, index: int) -> str:
+        return f"{self.instrument.items[index].text} {self.instrument.scale_text}"
+
+    def _progress(self) -> str:
+        return f"{self.instrument.name} question {self.state['current_q_idx'] + 1} of {len(self.instrument.items)}"
+
+    def _unknown(self) -> Dict[str, Any]:
+        return self._reply('error', None, f"No questionnaire found for condition type: {self.condition}")
+
+    def start(self) -> Dict[str, Any]:
+        """Asks for consent."""
+        if self.instrument is None or not self.instrument.scored:
+            return self._unknown()
+        return self._reply('consent_pending', f"The system has identified '{self.condition}' as a potential area. "
+                           f"Would you like to take a brief {self.instrument.name} questionnaire to help me understand "
+                           f"your feelings better? Please say 'yes' or 'no'.")
+
+    def consent(self, given: bool) -> Dict[str, Any]:
+        if self.instrument is None or not self.instrument.scored:
+            return self._unknown()
+        self.state['consent_given'] = given
+        if not given:
+            return self._reply('consent_denied', f"You chose not to take the {self.instrument.name} questionnaire. That's perfectly fine.")
+        self.state['current_q_idx'] = 0
+        return self._reply('q_pending', f"Okay. Here is the first question ({self._progress()}): {self._question(0)}")
+
+    def answer(self, user_input: str) -> Dict[str, Any]:
+        """Records an answer to the current question; an off-scale answer re-asks it."""
+        if not self.in_progress:
+            return self.status()
+        value = self.instrument.response_value(user_input.lower().strip())
+        if value is None:
+            error = 'Invalid score provided.' if user_input.strip().lstrip('-').isdigit() else 'Invalid input.'
+            lead = (f"Please provide a score according to the scale {self.instrument.scale_text}." if error.startswith('Invalid score')
+                    else "Invalid input. Please provide a score or say 'skip'.")
+            return self._reply('q_pending', f"{lead} Current question ({self._progress()}): {self._question(self.state['current_q_idx'])}", error)
+
+        self.state['scores'].append(value)
+        if adaptive_enabled():
+            # Skip the items that can no longer change the band (the asked items follow from the scores)
+            responses = replay_scores(self.instrument, self.state['scores'])
+            self.state['current_q_idx'] = next_position(self.instrument, responses, self.state['current_q_idx'] + 1)
+        else:
+            self.state['current_q_idx'] += 1
+        return self.status()
+
+    def skip(self) -> Dict[str, Any]:
+        """Ends the questionnaire without a score."""
+        if self.instrument is None or not self.instrument.scored:
+            return self._unknown()
+        self.state['skipped'] = True
+        return self._reply('skipped', f"You chose to skip the {self.instrument.name} questionnaire. That's fine.")
+
+    def status(self) -> Dict[str, Any]:
+        """The reply for the current state, without changing it."""
+        if self.instrument is None or not self.instrument.scored:
+            return self._unknown()
+        consent, index, n = self.state['consent_given'], self.state['current_q_idx'], len(self.instrument.items)
+        if consent is None:
+            return self.start()
+        if self.state.get('skipped'):
+            return self.skip()
+        if consent is False:
+            return self._reply('consent_denied', f"You chose not to take the {self.instrument.name} questionnaire. That's perfectly fine.")
+        if 0 <= index < n:
+            return self._reply('q_pending', f"{self._progress()}: {self._question(index)}")
+        if index == n:
+            skipped = n - len(self.state['scores'])
+            return self._reply('complete', f"Thank you for completing the {self.instrument.name} questionnaire."
+                               + (" Your answers already settled the result, so the remaining questions were skipped." if skipped else ""),
+                               complete=True)
+        return self._reply('error', None, "An unexpected state occurred during the questionnaire.")
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """Score and interpretation once complete; None before that."""
+        reply = self.status()
+        if reply['status'] != 'complete':
+            return None
+        return {key: reply[key] for key in ('assessment_name', 'total_score', 'interpretation', 'scores')}
+
+    def respond(self, user_input: str) -> Dict[str, Any]:
+        """One turn of free text, as the tool receives it: a consent reply, an answer or 'skip'."""
+        if self.instrument is None or not self.instrument.scored:
+            return self._unknown()
+        text = user_input.lower().strip()
+        if self.state['consent_given'] is None:
+            if text == 'yes' or ('consent' in text and not ('do not consent' in text or "don't consent" in text)):
+                return self.consent(True)
+            if text == 'no' or 'do not consent' in text or "don't consent" in text:
+                return self.consent(False)
+            return self.start()
+        if self.in_progress:
+            if self.instrument.response_value(text) is None and text == 'skip':
+                return self.skip()
+            return self.answer(user_input)
+        return self._reply('error', None, "An unexpected state occurred during the questionnaire.")
@@ -0,0 +1,202 @@
+# modules/bulk_scoring.py
+"""
+Offline scoring of paper-collected PHQ-9 / GAD-7 / DAST-10 responses.
+
+Reads CSV or JSON lines one row at a time and writes one result row per input row, so
+memory stays flat however large the file is. Free-text answers ("several days", "y",
+"3", "Yes.") are normalized through the instrument's scale (modules/instruments.json).
+
+CSV: one column per item, headed by item id (phq9_1), number (1, q1, Q1) or question text,
+plus optional `id` and `instrument` columns (or --instrument for the whole file). JSON
+lines: the same flat fields, or {"id": ..., "instrument": ..., "answers": {...}}.
+
+    python -m modules.bulk_scoring clinic_march.csv -o scored.csv --instrument PHQ-9
+    python -m modules.bulk_scoring responses.jsonl -o scored.jsonl
+    cat responses.csv | python -m modules.bulk_scoring - --format csv > scored.jsonl
+
+Each result has id, instrument, score, interpretation, severity, status (ok, incomplete,
+unknown_instrument, invalid_row), critical (a critical item such as PHQ-9 item 9 was endorsed),
+missing (items without an answer), invalid (items whose answer is not on the scale) and
+error (for an invalid_row: the line number and why, e.g. a JSON line that is not an object).
+Incomplete rows get a score over the answered items but no interpretation.
+"""
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+from typing import Any, Dict, Iterator, NamedTuple, Optional, TextIO, Tuple, Union
+
+from modules.instruments import Instrument, get_instrument
+
+RESULT_FIELDS = ("id", "instrument", "score", "interpretation", "severity", "status", "critical", "missing", "invalid", "error")
+_ITEM_NUMBER = re.compile(r"^(?:q|item)?\s*(\d+)$", re.IGNORECASE)
+_PUNCTUATION = re.compile(r"[^a-z0-9]+")
+_META = {"id", "instrument", "answers"}
+
+
+def answer_value(instrument: Instrument, answer) -> Optional[int]:
+    """Scale value of a free-text answer; also tries it without punctuation ("Yes.", "3 ")."""
+    value = instrument.response_value(answer)
+    if value is None and isinstance(answer, str):
+        value = instrument.response_value(_PUNCTUATION.sub(" ", answer.lower()).strip())
+    return value
+
+
+def column_items(instrument: Instrument, columns) -> Dict[str, str]:
+    """Maps the column names that are items of `instrument` (by id, number or question text) to item ids."""
+    mapping = {}
+    for column in columns:
+        if column in _META:
+            continue
+        item_id = instrument.item_id(column)
+        if item_id is None:
+            match = _ITEM_NUMBER.match(column.strip())
+            if match and 1 <= int(match.group(1)) <= len(instrument.items):
+                item_id = instrument.items[int(match.group(1)) - 1].id
+        if item_id is not None:
+            mapping[column] = item_id
+    return mapping
+
+
+def score_row(instrument: Instrument, answers: Dict[str, Any]) -> Dict[str, Any]:
+    """Scores one row of answers already keyed by item id."""
+    total, missing, invalid, critical = 0, [], [], False
+    for item in instrument.items:
+        answer = answers.get(item.id)
+        if answer is None or (isinstance(answer, str) and not answer.strip()):
+            missing.append(item.id)
+            continue
+        value = answer_value(instrument, answer)
+        if value is None:
+            invalid.append(item.id)
+            continue
+        total += value
+        critical = critical or (item.critical and value > 0)
+    complete = not missing and not invalid
+    band = instrument.band(total) if complete else None
+    return {"instrument": instrument.name, "score": total,
+            "interpretation": band.label if band else None, "severity": band.severity if band else None,
+            "status": "ok" if complete else "incomplete", "critical": critical, "missing": missing, "invalid": invalid}
+
+
+class InvalidRow(NamedTuple):
+    """An input line that is not a row: unreadable JSON, or JSON that is not an object."""
+    line: int
+    error: str
+
+
+class BulkScorer:
+    """Scores rows from one file; column -> item mappings are worked out once per instrument."""
+
+    def __init__(self, default_instrument: Optional[str] = None):
+        self.default_instrument = default_instrument
+        self._mappings: Dict[Tuple[str, Tuple[str, ...]], Dict[str, str]] = {}
+        self.counts: Dict[str, int] = {"rows": 0, "ok": 0, "incomplete": 0, "unknown_instrument": 0, "invalid_row": 0}
+
+    def score(self, row: Union[Dict[str, Any], InvalidRow]) -> Dict[str, Any]:
+        self.counts["rows"] += 1
+        if isinstance(row, InvalidRow):
+            self.counts["invalid_row"] += 1
+            return {"id": None, "instrument": None, "score": None, "interpretation": None, "severity": None,
+                    "status": "invalid_row", "critical": False, "missing": [], "invalid": [],
+                    "error": f"line {row.line}: {row.error}"}
+        name = row.get("instrument") or self.default_instrument
+        instrument = get_instrument(name) if name else None
+        if instrument is None or not instrument.scored:
+            self.counts["unknown_instrument"] += 1
+            return {"id": row.get("id"), "instrument": name, "score": None, "interpretation": None, "severity": None,
+                    "status": "unknown_instrument", "critical": False, "missing": [], "invalid": [], "error": None}
+
+        source = row["answers"] if isinstance(row.get("answers"), dict) else row
+        key = (instrument.name, tuple(source))
+        mapping = self._mappings.get(key)
+        if mapping is None:
+            if len(self._mappings) >= 1024:  # Rows with ever-changing fields must not grow memory
+                self._mappings.clear()
+            mapping = self._mappings[key] = column_items(instrument, source)
+        result = score_row(instrument, {item_id: source[column] for column, item_id in mapping.items()})
+        self.counts[result["status"]] += 1
+        return {"id": row.get("id"), **result, "error": None}
+
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[Union[Dict[str, Any], InvalidRow]]:
+    """Rows as dicts; a JSON line that can't be a row comes through as an InvalidRow instead of stopping the run."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    else:
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield InvalidRow(number, f"not valid JSON ({e.msg})")
+                continue
+            yield row if isinstance(row, dict) else InvalidRow(number, f"expected a JSON object, got {type(row).__name__}")
+
+
+class ResultWriter:
+    def __init__(self, stream: TextIO, fmt: str):
+        self.stream, self.fmt = stream, fmt
+        if fmt == "csv":
+            self._csv = csv.writer(stream)
+            self._csv.writerow(RESULT_FIELDS)
+
+    def write(self, result: Dict[str, Any]):
+        if self.fmt == "csv":
+            self._csv.writerow([" ".join(result[f]) if f in ("missing", "invalid") else result[f] for f in RESULT_FIELDS])
+        else:
+            self.stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def _format(path: str, given: Optional[str]) -> str:
+    if given:
+        return given
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def run(input_path: str, output_path: str, instrument: Optional[str] = None, in_format: Optional[str] = None,
+        out_format: Optional[str] = None, progress_every: int = 100000) -> Dict[str, Any]:
+    in_fmt, out_fmt = _format(input_path, in_format), _format(output_path, out_format)
+    scorer = BulkScorer(instrument)
+    started = time.perf_counter()
+    source = sys.stdin if input_path == "-" else open(input_path, "r", encoding="utf-8-sig", newline="")
+    target = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8", newline="")
+    try:
+        writer = ResultWriter(target, out_fmt)
+        for number, row in enumerate(read_rows(source, in_fmt), 1):
+            writer.write(scorer.score(row))
+            if progress_every and number % progress_every == 0:
+                elapsed = time.perf_counter() - started
+                print(f"📊 {number} rows, {number / elapsed:,.0f} rows/s", file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+    elapsed = time.perf_counter() - started
+    return {**scorer.counts, "seconds": round(elapsed, 3), "rows_per_second": round(scorer.counts["rows"] / elapsed) if elapsed else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score PHQ-9/GAD-7/DAST-10 responses from CSV or JSON lines, streaming.")
+    parser.add_argument("input", help="CSV or JSON-lines file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="Result file (.csv or .jsonl), or - for stdout (default)")
+    parser.add_argument("--instrument", help="Instrument for rows without an `instrument` field (name or alias)")
+    parser.add_argument("--format", dest="in_format", choices=("csv", "jsonl"), help="Input format (default: from the extension)")
+    parser.add_argument("--output-format", dest="out_format", choices=("csv", "jsonl"), help="Output format (default: from the extension)")
+    parser.add_argument("--progress", type=int, default=100000, help="Report throughput every N rows (0 = never)")
+    args = parser.parse_args()
+
+    summary = run(args.input, args.output, args.instrument, args.in_format, args.out_format, args.progress)
+    print(f"📈 {summary['rows']} rows in {summary['seconds']}s ({summary['rows_per_second']:,} rows/s): "
+          f"{summary['ok']} ok, {summary['incomplete']} incomplete, {summary['unknown_instrument']} unknown instrument, "
+          f"{summary['invalid_row']} invalid rows",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,153 +6,224 @@ import json
 import random
 from typing import Dict, Any
 from dotenv import load_dotenv
-from crewai import Agent, Task, Crew, LLM
-from langchain_core.output_parsers import JsonOutputParser
-from pydantic import BaseModel, Field
-from langsmith import traceable
 
 # Load environment variables
 load_dotenv()
 
 # ======================= CONFIGURATION =======================
-from new_flow.new_agents.tools import MentalHealthTools, TextClassifierTool
 from modules.llm_setup import get_llm
 from modules.questionnaire import load_questionnaires, conduct_assessment, score_questionnaire, interpret_score
 from modules.config import get_config
+from modules.schemas import CrisisDetectionOutput, MentalConditionOutput
+from modules.condition_classifier import classify_condition
+from modules.registry import register, get
+from modules.singleflight import kickoff
+from modules.crew_pool import get_pool
+from modules.deadline import run_with_deadline
+from modules.fallback import fallback_recommendation
+from modules import metrics
+from modules.tracing import traceable
+from modules.routing import get_stage_model
 
 # Load config values
 config = get_config()
 
-# LLM Initialization
-llm = get_llm()
+# LLM, tools, agents, tasks and crews are all built on first use through the registry,
+# so importing this module stays cheap (no crewai / transformers until a crew runs).
+@register("chatbot.llm")
+def build_llm(stage: str):
+    return get_llm(stage=stage)
 
-# Tool Setup
-mental_health_tools = MentalHealthTools()
-crisis_classifier_tool = TextClassifierTool(model=config["crisis_model"])
+@register("chatbot.mental_health_tools")
+def build_mental_health_tools():
+    from new_flow.new_agents.tools import MentalHealthTools
+    return MentalHealthTools()
+
+@register("chatbot.crisis_classifier_tool")
+def build_crisis_classifier_tool():
+    from new_flow.new_agents.tools import TextClassifierTool
+    return TextClassifierTool(model=config["crisis_model"])
 
 # ======================= ASSESSMENT QUESTIONNAIRES =======================
 QUESTIONS = load_questionnaires()
 
-# ======================= OUTPUT SCHEMAS =======================
-class CrisisDetectionOutput(BaseModel):
-    is_crisis: bool = Field(description="True if the query indicates a mental health crisis.")
-    explanation: str = Field(description="Reason for classifying as crisis or not.")
-
-class MentalConditionOutput(BaseModel):
-    condition: str = Field(description="The diagnosed mental condition or concern.")
-    rationale: str = Field(description="Why the classification was made.")
-
 # ======================= AGENT FACTORY =======================
-def create_agent(role: str, goal: str, backstory: str, tools=None,**kwargs) -> Agent:
+def create_agent(role: str, goal: str, backstory: str, stage: str, tools=None, **kwargs):
+    from crewai import Agent
     return Agent(
         role=role,
         goal=goal,
         backstory=backstory,
         tools=tools or [],
-        llm=llm,
+        llm=get("chatbot.llm", stage=stage),
         verbose=True,
         allow_delegation=False,
         **kwargs
     )
 
 # ======================= AGENTS =======================
-crisis_detection_agent = create_agent(
-    "Crisis Detection Specialist",
-    "Identify immediate crisis situations and escalate if needed.",
-    "Trained to detect signs of suicidal ideation and mental health emergencies.",
-    tools=[crisis_classifier_tool]
-)
-
-mental_condition_classifier_agent = create_agent(
-    "Mental Health Condition Classifier",
-    "Classify user's mental health condition.",
-    "Analyzes text for stress, anxiety, depression and matches with PHQ-9, GAD-7, DAST-10."
-)
-
-data_retriever_agent = create_agent(
-    "User Profile Data Retriever",
-    "Retrieve user profile details.",
-    "Pulls demographic and background mental health info."
-)
-
-recommendation_agent = create_agent(
-    "Personalized Recommendation Generator",
-    "Provide tailored mental health recommendations based on all gathered information, including questionnaire scores.",
-    "You are a compassionate and knowledgeable AI dedicated to offering "\
-    "actionable and personalized advice. You synthesize user queries, "\
-    "profile data, assessment answers, and quantitative scores from assessments "\
-    "to deliver helpful recommendations, including suggesting professional help when appropriate.",
-    tools=[mental_health_tools.get_bhutanese_helplines],
-    reasoning=True
-)
+@register("chatbot.crisis_detection_agent")
+def build_crisis_detection_agent():
+    return create_agent(
+        "Crisis Detection Specialist",
+        "Identify immediate crisis situations and escalate if needed.",
+        "Trained to detect signs of suicidal ideation and mental health emergencies.",
+        stage="crisis_detection",
+        tools=[get("chatbot.crisis_classifier_tool")]
+    )
+
+@register("chatbot.mental_condition_classifier_agent")
+def build_mental_condition_classifier_agent():
+    return create_agent(
+        "Mental Health Condition Classifier",
+        "Classify user's mental health condition.",
+        "Analyzes text for stress, anxiety, depression and matches with PHQ-9, GAD-7, DAST-10.",
+        stage="condition_classification"
+    )
+
+@register("chatbot.data_retriever_agent")
+def build_data_retriever_agent():
+    return create_agent(
+        "User Profile Data Retriever",
+        "Retrieve user profile details.",
+        "Pulls demographic and background mental health info.",
+        stage="profile_retrieval"
+    )
+
+@register("chatbot.recommendation_agent")
+def build_recommendation_agent():
+    return create_agent(
+        "Personalized Recommendation Generator",
+        "Provide tailored mental health recommendations based on all gathered information, including questionnaire scores.",
+        "You are a compassionate and knowledgeable AI dedicated to offering "\
+        "actionable and personalized advice. You synthesize user queries, "\
+        "profile data, assessment answers, and quantitative scores from assessments "\
+        "to deliver helpful recommendations, including suggesting professional help when appropriate.",
+        stage="recommendation",
+        tools=[get("chatbot.mental_health_tools").get_bhutanese_helplines],
+        reasoning=True
+    )
 
 # ======================= TASKS =======================
-crisis_detection_task = Task(
-    description="Analyze the user's input for crisis indicators using the classifier tool.",
-    expected_output="JSON object with is_crisis and explanation fields.",
-    output_json=CrisisDetectionOutput,
-    input_variables=["user_query"],
-    agent=crisis_detection_agent
-)
-
-mental_condition_classification_task = Task(
-    description="Given the following user query: {user_query}, classify the user's mental health condition and match the assessment.",
-    expected_output="JSON object with condition and rationale fields.",
-    output_json=MentalConditionOutput,
-    input_variables=["user_query", "user_profile"],
-    agent=mental_condition_classifier_agent
-)
-
-data_retriever_task = Task(
-    description="Fetch user profile data in structured JSON.",
-    expected_output="User demographic and background profile as JSON.",
-    input_variables=["user_query", "user_profile"],
-    agent=data_retriever_agent
-)
-
-recommendation_task = Task(
-    description="Provide tailored mental health recommendation based on all context.",
-    expected_output="A complete recommendation for user in plain text.",
-    input_variables=["user_query", "user_profile", "classified_condition", "assessment_answers", "questionnaire_score", "is_crisis"],
-    agent=recommendation_agent
-)
+@register("chatbot.crisis_detection_task")
+def build_crisis_detection_task():
+    from crewai import Task
+    return Task(
+        description="Analyze the user's input for crisis indicators using the classifier tool. User input: {user_query}",
+        expected_output="JSON object with is_crisis and explanation fields.",
+        output_json=CrisisDetectionOutput,
+        input_variables=["user_query"],
+        agent=get("chatbot.crisis_detection_agent")
+    )
+
+@register("chatbot.mental_condition_classification_task")
+def build_mental_condition_classification_task():
+    from crewai import Task
+    return Task(
+        description="Given the following user query: {user_query}, classify the user's mental health condition and match the assessment.",
+        expected_output="JSON object with condition and rationale fields.",
+        output_json=MentalConditionOutput,
+        input_variables=["user_query", "user_profile"],
+        agent=get("chatbot.mental_condition_classifier_agent")
+    )
+
+@register("chatbot.data_retriever_task")
+def build_data_retriever_task():
+    from crewai import Task
+    return Task(
+        description="Fetch user profile data in structured JSON.",
+        expected_output="User demographic and background profile as JSON.",
+        input_variables=["user_query", "user_profile"],
+        agent=get("chatbot.data_retriever_agent")
+    )
+
+@register("chatbot.recommendation_task")
+def build_recommendation_task():
+    from crewai import Task
+    return Task(
+        description="Provide tailored mental health recommendation based on all context.",
+        expected_output="A complete recommendation for user in plain text.",
+        input_variables=["user_query", "user_profile", "classified_condition", "assessment_answers", "questionnaire_score", "is_crisis"],
+        agent=get("chatbot.recommendation_agent")
+    )
 
 # ======================= CREWS =======================
-crisis_management_crew = Crew(agents=[crisis_detection_agent], tasks=[crisis_detection_task], verbose=True)
-mental_condition_crew = Crew(agents=[mental_condition_classifier_agent], tasks=[mental_condition_classification_task], verbose=True)
-data_retrieval_crew = Crew(agents=[data_retriever_agent], tasks=[data_retriever_task], verbose=True)
-recommendation_crew = Crew(agents=[recommendation_agent], tasks=[recommendation_task], verbose=True)
+def _single_agent_crew(agent_name: str, task_name: str):
+    from crewai import Crew
+    return Crew(agents=[get(agent_name)], tasks=[get(task_name)], verbose=True)
+
+@register("chatbot.crisis_management_crew")
+def build_crisis_management_crew():
+    return _single_agent_crew("chatbot.crisis_detection_agent", "chatbot.crisis_detection_task")
+
+@register("chatbot.mental_condition_crew")
+def build_mental_condition_crew():
+    return _single_agent_crew("chatbot.mental_condition_classifier_agent", "chatbot.mental_condition_classification_task")
+
+@register("chatbot.data_retrieval_crew")
+def build_data_retrieval_crew():
+    return _single_agent_crew("chatbot.data_retriever_agent", "chatbot.data_retriever_task")
+
+@register("chatbot.recommendation_crew")
+def build_recommendation_crew():
+    return _single_agent_crew("chatbot.recommendation_agent", "chatbot.recommendation_task")
+
+def get_crew(name: str):
+    """Returns the named crew (e.g. 'recommendation_crew'), building it on first use."""
+    return get(f"chatbot.{name}")
+
+def get_crew_pool(name: str):
+    """Pool of copies of the named crew; kick off through this so concurrent turns don't share one."""
+    return get_pool(f"chatbot.{name}")
 
 # ======================= EXPORTABLE API =======================
 def run_crisis_check(user_query: str) -> dict:
-    result = crisis_management_crew.kickoff({"user_query": user_query})
-    return result.return_values if hasattr(result, "return_values") else {}
+    with metrics.stage("crisis_detection", get_stage_model("crisis_detection")):
+        result = kickoff("chatbot.crisis_management_crew", get_crew_pool("crisis_management_crew"), {"user_query": user_query})
+    # The task uses output_json, so the parsed result is on CrewOutput.json_dict
+    return getattr(result, "json_dict", None) or {}
 
 def run_condition_classification(user_query: str, user_profile: str) -> dict:
-    return mental_condition_crew.kickoff({
-        "user_query": user_query,
-        "user_profile": user_profile
-    })
+    # The local classifier answers most queries; the crew is only used when it is unsure
+    result = classify_condition(
+        user_query,
+        llm_fallback=lambda: kickoff("chatbot.mental_condition_crew", get_crew_pool("mental_condition_crew"), {
+            "user_query": user_query,
+            "user_profile": user_profile
+        }),
+        fallback_key={"crew": "chatbot.mental_condition_crew", "user_profile": user_profile}
+    )
+    return result.model_dump()
 
 def run_user_profile_retrieval(user_query: str, user_profile: str):
-    return data_retrieval_crew.kickoff({
-        "user_query": user_query,
-        "user_profile": user_profile
-    })
+    with metrics.stage("profile_retrieval", get_stage_model("profile_retrieval")):
+        return kickoff("chatbot.data_retrieval_crew", get_crew_pool("data_retrieval_crew"), {
+            "user_query": user_query,
+            "user_profile": user_profile
+        })
 
 def run_recommendations(user_query: str, user_profile: str, condition: str, answers: str, score: str, is_crisis: str):
-    return recommendation_crew.kickoff({
+    inputs = {
         "user_query": user_query,
         "user_profile": user_profile,
         "classified_condition": condition,
         "assessment_answers": answers,
         "questionnaire_score": score,
         "is_crisis": is_crisis
-    })
+    }
+    # Past the stage deadline the user gets a templated, severity-specific recommendation instead
+    return run_with_deadline(
+        "recommendation",
+        lambda: kickoff("chatbot.recommendation_crew", get_crew_pool("recommendation_crew"), inputs),
+        hedge=lambda: get_crew_pool("recommendation_crew").kickoff(inputs=inputs),
+        fallback=lambda: fallback_recommendation(condition, score, is_crisis=is_crisis == "true"),
+        context={"condition": condition, "score": score}
+    )
 
 # ======================= FULL CHAT FLOW =======================
 @traceable(name= "Druckare Chatbot full flow")
-def full_chat_flow(user_query: str, user_id: str = "anon_user"):
+def full_chat_flow(user_query: str, user_id: str = "anon_user", answer_fn=input) -> Dict[str, Any]:
+    """Runs one conversation end to end; `answer_fn` answers the questionnaire (defaults to `input`)."""
     print("📄 Fetching user profile...")
     dummy_profile = {
         "id": user_id,
@@ -171,7 +242,7 @@ def full_chat_flow(user_query: str, user_id: str = "anon_user"):
         print(f"🚨 Crisis Detected: {explanation}")
         rec = run_recommendations(user_query, user_profile=json.dumps(dummy_profile), condition="Crisis", answers="{}", score="N/A", is_crisis="true")
         print("\n🆘 Crisis Support Recommendation:\n", rec)
-        return
+        return {"is_crisis": True, "condition": "Crisis", "score": "N/A", "recommendation": rec}
 
     print("🔎 Classifying condition...")
     condition_result = run_condition_classification(user_query, json.dumps(dummy_profile))
@@ -184,7 +255,7 @@ def full_chat_flow(user_query: str, user_id: str = "anon_user"):
         answers = {}
         interpretation = "Not applicable"
     else:
-        assessment = conduct_assessment(condition)
+        assessment = conduct_assessment(condition, answer_fn=answer_fn)
         answers = assessment["answers"]
         score = assessment["score"]
         interpretation = assessment["interpretation"]
@@ -201,7 +272,9 @@ def full_chat_flow(user_query: str, user_id: str = "anon_user"):
 
     print("\n📋 Final Recommendation:\n", final_rec)
     print("📊 Score Interpretation:", interpretation)
+    return {"is_crisis": False, "condition": condition, "score": score, "recommendation": final_rec}
 
 if __name__ == "__main__":
+    metrics.start_exporters()
     query = input("👤 Enter your mental health query: ")
     full_chat_flow(query)
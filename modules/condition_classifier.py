@@ -0,0 +1,175 @@
+# modules/condition_classifier.py
+import os
+import json
+import threading
+from typing import Callable, Dict, List, Optional, Any
+
+import numpy as np
+
+from modules import metrics
+from modules.config import get_config
+from modules.instruments import get_instruments
+from modules.schemas import MentalConditionOutput
+from modules.singleflight import get_singleflight, inputs_key
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED_EXAMPLES_PATH = os.path.join(MODULE_DIR, "condition_seed_examples.json")
+
+
+def load_prototype_texts(seed_path: str = SEED_EXAMPLES_PATH) -> Dict[str, List[str]]:
+    """Collect the example texts for each label from the questionnaire items and the seed file."""
+    with open(seed_path, "r", encoding="utf-8") as f:
+        seeds = json.load(f)
+
+    registry = get_instruments()
+    # Item text without the instruction line or "1. " numbering, which would dominate the embedding
+    texts: Dict[str, List[str]] = {name: [item.text for item in registry[name].items] for name in registry.names()}
+    for label, examples in seeds.items():
+        texts.setdefault(label, []).extend(examples)
+    return texts
+
+
+class ConditionClassifier:
+    """
+    Nearest-centroid classifier over sentence embeddings.
+
+    Each label gets a prototype vector (the normalized mean of its example embeddings).
+    A query is scored by cosine similarity against every prototype, and the similarities
+    are turned into a confidence with a temperature-scaled softmax.
+    """
+
+    def __init__(self, embedding_model: str, temperature: float = 0.05,
+                 prototype_texts: Optional[Dict[str, List[str]]] = None):
+        self.embedding_model = embedding_model
+        self.temperature = temperature
+        self._prototype_texts = prototype_texts
+        self._embeddings = None
+        self._labels: List[str] = []
+        self._centroids = None
+        self._lock = threading.Lock()
+
+    def _embedder(self):
+        if self._embeddings is None:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            self._embeddings = HuggingFaceEmbeddings(model_name=self.embedding_model,
+                                                     model_kwargs={'device': 'cpu'})
+        return self._embeddings
+
+    def _ensure_prototypes(self):
+        if self._centroids is not None:
+            return
+        with self._lock:
+            if self._centroids is not None:
+                return
+            texts = self._prototype_texts or load_prototype_texts()
+            labels, centroids = [], []
+            for label, examples in texts.items():
+                if not examples:
+                    continue
+                vectors = _normalize(np.asarray(self._embedder().embed_documents(examples), dtype=np.float32))
+                labels.append(label)
+                centroids.append(vectors.mean(axis=0))
+            self._labels = labels
+            self._centroids = _normalize(np.vstack(centroids))
+
+    def scores(self, user_query: str) -> Dict[str, float]:
+        """Return the softmax probability of each label for the query."""
+        self._ensure_prototypes()
+        query_vector = _normalize(np.asarray([self._embedder().embed_query(user_query)], dtype=np.float32))[0]
+        similarities = self._centroids @ query_vector
+        logits = (similarities - similarities.max()) / self.temperature
+        probabilities = np.exp(logits) / np.exp(logits).sum()
+        return {label: float(p) for label, p in zip(self._labels, probabilities)}
+
+    def classify(self, user_query: str) -> MentalConditionOutput:
+        scores = self.scores(user_query)
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        condition, confidence = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else None
+        rationale = f"Closest match to {condition} examples (local embedding classifier)"
+        if runner_up:
+            rationale += f"; runner-up {runner_up} ({scores[runner_up]:.2f})"
+        return MentalConditionOutput(condition=condition, rationale=rationale + ".", confidence=confidence)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+_classifier: Optional[ConditionClassifier] = None
+_classifier_lock = threading.Lock()
+
+def get_condition_classifier() -> ConditionClassifier:
+    """Returns the process-wide classifier, built from config on first use."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                config = get_config()
+                _classifier = ConditionClassifier(
+                    embedding_model=config["classifier_embedding_model"],
+                    temperature=config["classifier_temperature"],
+                )
+    return _classifier
+
+
+def classify_condition(user_query: str,
+                       llm_fallback: Optional[Callable[[], Any]] = None,
+                       threshold: Optional[float] = None,
+                       fallback_key: Any = None) -> MentalConditionOutput:
+    """
+    Classify with the local model and only call `llm_fallback` when confidence is below threshold.
+
+    `llm_fallback` may return a MentalConditionOutput, a dict, or a CrewOutput with `json_dict`.
+    If it fails or returns something unusable, the local prediction is kept.
+    `fallback_key` names what the fallback runs (its crew and inputs, e.g. the user profile);
+    concurrent calls are only coalesced when it matches. A fallback without a key is never shared.
+    """
+    if threshold is None:
+        threshold = get_config()["classifier_confidence_threshold"]
+    if llm_fallback is not None and fallback_key is None:
+        fallback_key = id(llm_fallback)
+    # Concurrent classifications of the same query (reruns, double-submits) run only once
+    key = inputs_key("condition_classifier", {"user_query": user_query, "threshold": threshold, "fallback": fallback_key})
+    return get_singleflight().do(key, lambda: _classify_condition(user_query, llm_fallback, threshold))
+
+
+def _classify_condition(user_query: str, llm_fallback: Optional[Callable[[], Any]],
+                        threshold: float) -> MentalConditionOutput:
+    local = None
+    classifier = get_condition_classifier()
+    try:
+        with metrics.stage("condition_classification", model=classifier.embedding_model):
+            local = classifier.classify(user_query)
+    except Exception as e:
+        print(f"⚠️ Local condition classifier unavailable: {e}")
+
+    if local is not None and (local.confidence >= threshold or llm_fallback is None):
+        metrics.cache_result("condition_classifier", hit=True)
+        return local
+    metrics.cache_result("condition_classifier", hit=False)
+
+    if llm_fallback is not None:
+        try:
+            result = _coerce_output(llm_fallback())
+            if result is not None:
+                return result
+        except Exception as e:
+            print(f"⚠️ LLM condition classification failed: {e}")
+
+    if local is not None:
+        return local
+    return MentalConditionOutput(condition="General Well-being", rationale="Could not classify the query.", confidence=0.0)
+
+
+def _coerce_output(result) -> Optional[MentalConditionOutput]:
+    if isinstance(result, MentalConditionOutput):
+        return result
+    if hasattr(result, "json_dict") and result.json_dict:
+        result = result.json_dict
+    if isinstance(result, dict) and result.get("condition"):
+        return MentalConditionOutput(condition=result["condition"],
+                                     rationale=result.get("rationale", ""),
+                                     confidence=result.get("confidence"))
+    return None
@@ -1,10 +1,22 @@
 # Filename: modules/config.py
 
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
 
+def _json_env(name, default):
+    """Parses a JSON-valued environment variable, keeping the default when unset or invalid."""
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError:
+        print(f"⚠️ Ignoring invalid JSON in {name}")
+        return default
+
 def get_config():
     """
     Returns a dictionary of configuration values used across the chatbot system.
@@ -21,9 +33,94 @@ def get_config():
         "llm_timeout": int(os.getenv("LLM_TIMEOUT", "30")),
         "llm_max_retries": int(os.getenv("LLM_MAX_RETRIES", "2")),
 
+        # LLM backend: live | record | replay | template (see modules/offline_llm.py)
+        "llm_backend": os.getenv("LLM_BACKEND", "live"),
+        "llm_record_file": os.getenv("LLM_RECORD_FILE", "llm_recordings.jsonl"),
+        "llm_replay_miss": os.getenv("LLM_REPLAY_MISS", "template"),
+        "llm_synthetic_latency_ms": float(os.getenv("LLM_SYNTHETIC_LATENCY_MS", "800")),
+        "llm_synthetic_jitter_ms": float(os.getenv("LLM_SYNTHETIC_JITTER_MS", "200")),
+        # Where tasks write their output_file (task1.txt, ...); offline backends write none unless it is set
+        "task_output_dir": os.getenv("TASK_OUTPUT_DIR", ""),
+
+        # Shared LLM gateway (rate limits apply across all crews in the process)
+        "llm_requests_per_minute": float(os.getenv("LLM_REQUESTS_PER_MINUTE", "60")),
+        "llm_tokens_per_minute": float(os.getenv("LLM_TOKENS_PER_MINUTE", "1000000")),
+        "llm_queue_timeout": float(os.getenv("LLM_QUEUE_TIMEOUT", "60")),
+        "llm_pool_max_connections": int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "10")),
+
+        # Per-stage model routing (see modules/routing.py), e.g.
+        # LLM_ROUTES='{"recommendation": {"tier": "fast", "p95_ms": 8000}}'
+        "llm_tiers": _json_env("LLM_TIERS", {}),
+        "llm_routes": _json_env("LLM_ROUTES", {}),
+        "routing_log_file": os.getenv("ROUTING_LOG_FILE", ""),
+
+        # Per-stage deadlines in seconds and optional hedge delays (modules/deadline.py), e.g.
+        # STAGE_HEDGE_AFTER='{"recommendation": 15}'
+        "stage_deadlines": _json_env("STAGE_DEADLINES", {}),
+        "stage_hedge_after": _json_env("STAGE_HEDGE_AFTER", {}),
+        "stage_workers": int(os.getenv("STAGE_WORKERS", "8")),
+        "fallback_log_file": os.getenv("FALLBACK_LOG_FILE", ""),
+
+        # Structured JSON-lines log (modules/structured_logging.py); LOG_FILE="" disables it
+        "log_file": os.getenv("LOG_FILE", "logs/drukcare.jsonl"),
+        "log_level": os.getenv("LOG_LEVEL", "INFO"),
+        "log_queue_size": int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+        "log_max_bytes": int(os.getenv("LOG_MAX_BYTES", str(10 * 2**20))),
+        "log_rotate_seconds": float(os.getenv("LOG_ROTATE_SECONDS", "86400")),
+        "log_backups": int(os.getenv("LOG_BACKUPS", "5")),
+
+        # Local tracing (modules/tracing.py); TRACE_FILE="" keeps spans in memory only
+        "tracing_enabled": os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes"),
+        "trace_file": os.getenv("TRACE_FILE", ""),
+        "trace_buffer": int(os.getenv("TRACE_BUFFER", "2000")),
+        "trace_max_bytes": int(os.getenv("TRACE_MAX_BYTES", str(5 * 2**20))),
+        "trace_backups": int(os.getenv("TRACE_BACKUPS", "3")),
+
+        # Crew pools (modules/crew_pool.py): isolated crew copies per in-flight turn
+        "crew_pool_size": int(os.getenv("CREW_POOL_SIZE", "4")),
+        "crew_pool_timeout": float(os.getenv("CREW_POOL_TIMEOUT", "60")),
+
+        # Turn profiling (modules/profiling.py): profile the next PROFILE_TURNS turns
+        "profile_turns": int(os.getenv("PROFILE_TURNS", "0")),
+        "profile_dir": os.getenv("PROFILE_DIR", "profiles"),
+        "profile_top": int(os.getenv("PROFILE_TOP", "25")),
+        "profile_interval_ms": float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+
+        # Metrics (Prometheus text format); 0 / "" disables the endpoint / textfile
+        "metrics_port": int(os.getenv("METRICS_PORT", "0")),
+        "metrics_textfile": os.getenv("METRICS_TEXTFILE", ""),
+        "metrics_interval": float(os.getenv("METRICS_INTERVAL", "15")),
+
         # Tool model settings
         "crisis_model": os.getenv("CRISIS_MODEL", "sentinet/suicidality"),
 
+        # Local condition classifier (the LLM classifier is only used below this confidence)
+        "classifier_embedding_model": os.getenv("CLASSIFIER_EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2"),
+        "classifier_confidence_threshold": float(os.getenv("CLASSIFIER_CONFIDENCE_THRESHOLD", "0.6")),
+        "classifier_temperature": float(os.getenv("CLASSIFIER_TEMPERATURE", "0.05")),
+
+        # Knowledge base built by ingest.py, and speculative work during the questionnaire
+        "vectorstore_path": os.getenv("VECTORSTORE_PATH", "vectorstore/db_medicine_buddha"),
+        "rag_embedding_model": os.getenv("RAG_EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2"),  # Must match the index
+        "retrieval_top_k": int(os.getenv("RETRIEVAL_TOP_K", "4")),
+        "speculation_workers": int(os.getenv("SPECULATION_WORKERS", "4")),
+        "speculation_wait_timeout": float(os.getenv("SPECULATION_WAIT_TIMEOUT", "15")),
+
+        # Adaptive administration (modules/adaptive.py): stop once the score band can no longer change
+        "adaptive_assessment": os.getenv("ADAPTIVE_ASSESSMENT", "false").lower() in ("1", "true", "yes"),
+
+        # Server-side profile/assessment state (modules/session_store.py): "memory" or "sqlite"
+        "session_store": os.getenv("SESSION_STORE", "memory").lower(),
+        "session_db": os.getenv("SESSION_DB", "sessions.db"),
+        "session_ttl": float(os.getenv("SESSION_TTL", "86400")),  # Seconds since the last write; 0 keeps sessions forever
+
+        # Profile repository (modules/profile_repository.py): postgresql://... or sqlite:///path
+        "profile_db_url": os.getenv("PROFILE_DB_URL", "sqlite:///drukcare.db"),
+        "profile_db_min_connections": int(os.getenv("PROFILE_DB_MIN_CONNECTIONS", "1")),
+        "profile_db_max_connections": int(os.getenv("PROFILE_DB_MAX_CONNECTIONS", "8")),
+        "profile_db_timeout": float(os.getenv("PROFILE_DB_TIMEOUT", "10")),
+        "profile_db_health_check_interval": float(os.getenv("PROFILE_DB_HEALTH_CHECK_INTERVAL", "30")),
+
         # Questionnaire path
         "questionnaire_file": os.getenv("QUESTIONNAIRE_FILE", "questionnaire.json"),
 
@@ -36,3 +133,16 @@ def get_config():
             "preferences": "Prefers meditation"
         }
     }
+
+
+def task_output_file(name):
+    """
+    The output_file for a task: `name` under TASK_OUTPUT_DIR. With the replay/template
+    backends and no TASK_OUTPUT_DIR it is None, so smoke runs don't overwrite the recorded
+    sample outputs in the repo.
+    """
+    config = get_config()
+    if config["task_output_dir"]:
+        os.makedirs(config["task_output_dir"], exist_ok=True)
+        return os.path.join(config["task_output_dir"], name)
+    return None if config["llm_backend"] in ("replay", "template") else name
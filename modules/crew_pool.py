@@ -0,0 +1,129 @@
+# modules/crew_pool.py
+"""
+Bounded pools of isolated crew instances.
+
+A Crew (and its agents and tasks) holds per-run state: task outputs, the agent executor
+("Executor is already running") and output_file writes. Sharing one instance between
+sessions makes concurrent kickoffs collide. Each pool hands an in-flight turn its own
+copy of a template crew. Copies are cheap: agents keep sharing the template's LLM
+wrappers (and so the inner LLM clients and the gateway), and only the per-run objects
+are new. Copies never write output_file; task outputs go to the structured log instead.
+
+A CrewPool has a kickoff(inputs=...) method, so it can be used wherever a crew is kicked off,
+including modules/singleflight.kickoff:
+
+    kickoff("core.recommendation_crew", get_pool("core.recommendation_crew"), inputs)
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from modules import metrics
+from modules.config import get_config
+from modules.registry import get
+
+class PoolExhausted(TimeoutError):
+    pass
+
+
+class CrewPool:
+    def __init__(self, name: str, template_fn: Callable[[], Any], size: int, timeout: float,
+                 prepare: Optional[Callable[[Any], Any]] = None):
+        self.name, self.size, self.timeout = name, size, timeout
+        self._template_fn = template_fn
+        self._prepare = prepare
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()  # Most recently used first: warmest instance
+        self._created = 0
+        self._in_use = 0
+        self._waits = 0
+        self._lock = threading.Lock()
+
+    def _build(self):
+        crew = self._template_fn().copy()
+        for task in crew.tasks:
+            task.output_file = None
+        return self._prepare(crew) if self._prepare else crew
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """Yields a crew nobody else is using; waits (up to `timeout`) when all `size` are busy."""
+        started = time.perf_counter()
+        crew, build = None, False
+        try:
+            crew = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    build = True
+                else:
+                    self._waits += 1
+            if build:
+                try:
+                    crew = self._build()
+                except BaseException:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                try:
+                    wait = self.timeout if timeout is None else timeout
+                    crew = self._idle.get(timeout=wait)
+                except queue.Empty:
+                    raise PoolExhausted(f"No {self.name} free after {wait:g}s ({self.size} in use)") from None
+        metrics.CREW_POOL_WAIT.observe(time.perf_counter() - started, crew=self.name)
+        with self._lock:
+            self._in_use += 1
+        try:
+            yield crew
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(crew)
+
+    def kickoff(self, inputs: Dict[str, Any] = None):
+        with self.acquire() as crew:
+            return crew.kickoff(inputs=inputs)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": self.size, "created": self._created, "in_use": self._in_use, "waited": self._waits}
+
+
+_pools: Dict[str, CrewPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(name: str, template=None, prepare: Optional[Callable[[Any], Any]] = None) -> CrewPool:
+    """
+    The process-wide pool for `name`. The template is the registry object `name` unless a
+    crew is given (e.g. one built at module level); `prepare` runs on every new copy.
+    """
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                config = get_config()
+                template_fn = (lambda: template) if template is not None else (lambda: get(name))
+                pool = _pools[name] = CrewPool(name, template_fn, config["crew_pool_size"],
+                                               config["crew_pool_timeout"], prepare)
+    return pool
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    with _pools_lock:
+        pools = dict(_pools)
+    return {name: pool.stats() for name, pool in sorted(pools.items())}
+
+
+def _pool_lines():
+    lines = ["# HELP drukcare_crew_pool_instances Pooled crew instances by state.",
+             "# TYPE drukcare_crew_pool_instances gauge"]
+    for name, s in pool_stats().items():
+        lines.append(f'drukcare_crew_pool_instances{{crew="{name}",state="in_use"}} {s["in_use"]}')
+        lines.append(f'drukcare_crew_pool_instances{{crew="{name}",state="created"}} {s["created"]}')
+    return lines
+
+metrics.register_collector(_pool_lines)
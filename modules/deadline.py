@@ -0,0 +1,172 @@
+# modules/deadline.py
+"""
+Per-stage deadlines with optional hedged requests.
+
+A stage call runs on a worker thread and the caller waits at most the stage deadline.
+If a hedge is configured and the call is still running after `hedge_after` seconds, a
+second request is started and whichever succeeds first is used. When the deadline is
+missed (or every attempt fails) the stage's fallback is returned and the event recorded.
+Calls that miss the deadline are abandoned, not killed: they finish on their worker
+within the LLM timeout and their result is discarded.
+"""
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from modules import metrics, tracing
+from modules.config import get_config
+from modules.routing import get_stage_model
+
+DEFAULT_DEADLINES = {"crisis_detection": 20, "condition_classification": 20, "recommendation": 45}
+DEFAULT_DEADLINE = 30
+
+
+class StageTimeout(TimeoutError):
+    pass
+
+
+def get_stage_deadline(stage: str):
+    """(deadline seconds, hedge delay seconds or None) for a stage, with config overrides."""
+    config = get_config()
+    deadlines = {**DEFAULT_DEADLINES, **config["stage_deadlines"]}
+    return deadlines.get(stage, DEFAULT_DEADLINE), config["stage_hedge_after"].get(stage)
+
+
+class DeadlineStats:
+    """Per-stage counters plus the most recent fallbacks (optionally appended to a JSONL file)."""
+
+    def __init__(self, path: str = "", keep: int = 500):
+        self.path = path
+        self._stages: Dict[str, Dict[str, int]] = {}
+        self._fallbacks = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def count(self, stage: str, event: str):
+        with self._lock:
+            counters = self._stages.setdefault(stage, {"calls": 0, "hedged": 0, "hedge_wins": 0,
+                                                       "errors": 0, "deadline_misses": 0, "fallbacks": 0})
+            counters[event] += 1
+
+    def record_fallback(self, stage: str, reason: str, **context):
+        self.count(stage, "fallbacks")
+        entry = {"ts": round(time.time(), 3), "stage": stage, "reason": reason, **context}
+        print(f"⚠️ {stage}: using fallback ({reason})")
+        with self._lock:
+            self._fallbacks.append(entry)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, default=str) + "\n")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"stages": {s: dict(c) for s, c in self._stages.items()},
+                    "recent_fallbacks": list(self._fallbacks)[-10:]}
+
+
+def run_with_deadline(stage: str, call: Callable[[], Any], hedge: Optional[Callable[[], Any]] = None,
+                      fallback: Optional[Callable[[], Any]] = None, deadline: Optional[float] = None,
+                      hedge_after: Optional[float] = None, context: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Returns the first successful result of `call` (or `hedge`) within the stage deadline.
+
+    Falls back to `fallback()` on a missed deadline or when every attempt failed; without a
+    fallback, StageTimeout (or the last error) is raised instead.
+    """
+    model = get_stage_model(stage)
+    started = time.perf_counter()
+    try:
+        with tracing.span(stage, "stage", model=model) as current:
+            result, fell_back = _run_with_deadline(stage, call, hedge, fallback, deadline, hedge_after, context)
+            if current is not None and fell_back:
+                current.attrs["fallback"] = True
+    except Exception as e:
+        metrics.STAGE_ERRORS.inc(stage=stage, model=model, reason=type(e).__name__)
+        raise
+    finally:
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, model=model)
+    if fell_back:
+        metrics.STAGE_ERRORS.inc(stage=stage, model=model, reason="fallback")
+    return result
+
+
+def _submit(executor: ThreadPoolExecutor, fn: Callable[[], Any]):
+    # Each attempt gets its own copy of the caller's context so its spans nest under this stage
+    return executor.submit(contextvars.copy_context().run, fn)
+
+
+def _run_with_deadline(stage, call, hedge, fallback, deadline, hedge_after, context):
+    default_deadline, default_hedge = get_stage_deadline(stage)
+    deadline = default_deadline if deadline is None else deadline
+    hedge_after = default_hedge if hedge_after is None else hedge_after
+    stats = get_deadline_stats()
+    stats.count(stage, "calls")
+
+    executor = get_executor()
+    started = time.monotonic()
+    end = started + deadline
+    pending = {_submit(executor, call): "primary"}
+    hedge_pending = hedge is not None and hedge_after is not None
+    errors: List[BaseException] = []
+
+    while pending or hedge_pending:
+        now = time.monotonic()
+        if now >= end:
+            break
+        if hedge_pending and (not pending or now >= started + hedge_after):
+            # Hedge after the delay, or straight away if the first attempt already failed
+            pending[_submit(executor, hedge)] = "hedge"
+            hedge_pending = False
+            stats.count(stage, "hedged")
+            continue
+        timeout = end - now
+        if hedge_pending:
+            timeout = min(timeout, started + hedge_after - now)
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            kind = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(e)
+                stats.count(stage, "errors")
+                continue
+            if kind == "hedge":
+                stats.count(stage, "hedge_wins")
+            return result, False
+
+    reason = f"deadline of {deadline:g}s exceeded" if pending else f"failed: {errors[-1]}"
+    if pending:
+        stats.count(stage, "deadline_misses")
+    if fallback is None:
+        if pending:
+            raise StageTimeout(f"{stage} {reason}")
+        raise errors[-1]
+    stats.record_fallback(stage, reason, **(context or {}))
+    return fallback(), True
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_stats: Optional[DeadlineStats] = None
+_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    """Worker pool for deadline-bounded stage calls."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_config()["stage_workers"],
+                                               thread_name_prefix="stage")
+    return _executor
+
+def get_deadline_stats() -> DeadlineStats:
+    global _stats
+    if _stats is None:
+        with _lock:
+            if _stats is None:
+                _stats = DeadlineStats(get_config()["fallback_log_file"])
+    return _stats
@@ -0,0 +1,105 @@
+# modules/eval_classifier.py
+"""
+Compare the local condition classifier with the LLM classifier crew.
+
+Usage (from the repository root):
+    python -m modules.eval_classifier --queries eval_queries.jsonl
+    python -m modules.eval_classifier --no-llm        # local classifier only
+
+The queries file is JSON lines with a "query" field and an optional "label" field.
+Without --queries the seed examples are used, which is only a smoke test since the
+prototypes were built from them.
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Dict, List
+
+from modules.condition_classifier import SEED_EXAMPLES_PATH, get_condition_classifier
+from modules.config import get_config
+
+
+def load_queries(path: str = None) -> List[Dict[str, str]]:
+    if path is None:
+        with open(SEED_EXAMPLES_PATH, "r", encoding="utf-8") as f:
+            seeds = json.load(f)
+        return [{"query": q, "label": label} for label, queries in seeds.items() for q in queries]
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                queries.append(json.loads(line))
+    return queries
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def describe(name: str, latencies: List[float]):
+    print(f"  {name:<6} mean={statistics.mean(latencies) * 1000:8.1f} ms  "
+          f"p50={percentile(latencies, 50) * 1000:8.1f} ms  p95={percentile(latencies, 95) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the local condition classifier against the LLM crew.")
+    parser.add_argument("--queries", help="JSONL file with 'query' and optional 'label' fields")
+    parser.add_argument("--no-llm", action="store_true", help="Skip the LLM crew (no API calls)")
+    args = parser.parse_args()
+
+    threshold = get_config()["classifier_confidence_threshold"]
+    classifier = get_condition_classifier()
+    queries = load_queries(args.queries)
+
+    # Build prototypes and load the embedding model outside the timed loop
+    classifier.classify("warm up")
+
+    mental_condition_crew = None
+    if not args.no_llm:
+        from modules.chatbot import get_crew
+        mental_condition_crew = get_crew("mental_condition_crew")
+
+    local_latencies, llm_latencies = [], []
+    agree = gold_local = gold_llm = labelled = confident = 0
+    for item in queries:
+        start = time.perf_counter()
+        local = classifier.classify(item["query"])
+        local_latencies.append(time.perf_counter() - start)
+        confident += local.confidence >= threshold
+
+        llm_condition = None
+        if mental_condition_crew is not None:
+            start = time.perf_counter()
+            result = mental_condition_crew.kickoff({"user_query": item["query"], "user_profile": "{}"})
+            llm_latencies.append(time.perf_counter() - start)
+            llm_condition = (getattr(result, "json_dict", None) or {}).get("condition")
+            agree += llm_condition == local.condition
+
+        if item.get("label"):
+            labelled += 1
+            gold_local += local.condition == item["label"]
+            gold_llm += llm_condition == item["label"]
+
+        print(f"{local.condition:<20} {local.confidence:5.2f}  {str(llm_condition):<20} {item['query'][:60]}")
+
+    total = len(queries)
+    print(f"\nQueries: {total}")
+    print(f"Confident (>= {threshold:.2f}, no LLM call): {confident}/{total} ({confident / total:.0%})")
+    if llm_latencies:
+        print(f"Agreement with LLM: {agree}/{total} ({agree / total:.0%})")
+    if labelled:
+        print(f"Accuracy vs labels: local {gold_local / labelled:.0%}"
+              + (f", LLM {gold_llm / labelled:.0%}" if llm_latencies else ""))
+    print("Latency:")
+    describe("local", local_latencies)
+    if llm_latencies:
+        describe("llm", llm_latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# modules/fallback.py
+"""
+Templated recommendations used when the recommendation stage misses its deadline.
+
+Texts are written per condition and severity ahead of time; a short knowledge-base
+excerpt per condition is retrieved once in the background (warm_fallbacks), so building a
+fallback never waits on the LLM or the vector store.
+"""
+import threading
+from textwrap import dedent
+from typing import Dict, Optional
+
+from modules.instruments import get_instrument
+from modules.retrieval import CONDITION_QUERIES, retrieve_context
+
+CONDITION_GUIDANCE = {
+    "PHQ-9": [
+        "Keep a gentle daily rhythm: regular sleep, meals and a short walk outdoors, even on difficult days.",
+        "Spend a little time each day with family or friends you trust, and tell one of them how you are feeling.",
+        "Try a few minutes of quiet breathing or prayer, or a visit to a lhakhang, if that brings you comfort.",
+    ],
+    "GAD-7": [
+        "When worry builds, slow your breathing: breathe in for four counts and out for six, for a few minutes.",
+        "Set aside a short 'worry time' each day and gently return to the present outside of it.",
+        "Reduce caffeine and doma late in the day, and keep a steady sleep routine.",
+    ],
+    "DAST-10": [
+        "Notice the people, places and feelings that lead to using, and plan one alternative for each.",
+        "Share your goal to cut down or stop with someone you trust who can support you.",
+        "Avoid stopping some substances suddenly on your own; withdrawal can be serious, so involve a health worker.",
+    ],
+    "General Well-being": [
+        "Balance work and rest, and make time for something you enjoy each day.",
+        "Stay connected with family and community; small conversations matter.",
+        "Spend time in nature and try a few minutes of mindful breathing or meditation.",
+    ],
+}
+CONDITION_GUIDANCE["Other"] = CONDITION_GUIDANCE["General Well-being"]
+
+SEVERITY_NOTES = {
+    "low": "Your answers suggest mild difficulties. The steps above are a good start; reach out for support if things get harder.",
+    "moderate": "Your answers suggest moderate difficulties. Please consider talking to a counsellor or health worker soon.",
+    "high": "Your answers suggest significant difficulties. Please contact a health professional or one of the helplines below as soon as you can.",
+    "unknown": "If these feelings continue or get worse, please talk to a counsellor or health worker.",
+}
+
+# Used only if the helplines tool can't be loaded
+HELPLINES_TEXT = """
+Here are some mental health helplines in Bhutan:
+- National Mental Health Program Hotline: 1717 (24/7)
+- Jigme Dorji Wangchuck National Referral Hospital (JDWNRH) Psychiatry Department: +975-2-322137
+- Youth HelpLine (for young people): 1769 / 1768
+"""
+
+_kb_excerpts: Dict[str, str] = {}
+_warm_lock = threading.Lock()
+_warmed = False
+
+
+def severity(condition: str, score) -> str:
+    try:
+        score = int(score)
+    except (TypeError, ValueError):
+        return "unknown"
+    instrument = get_instrument(condition)
+    band = instrument.band(score) if instrument is not None else None
+    return band.severity if band is not None else "unknown"
+
+
+def helplines() -> str:
+    """Text of the 'Bhutanese Helplines' tool, so fallbacks and agents give the same numbers."""
+    try:
+        from new_flow.new_agents.tools import MentalHealthTools
+        return dedent(MentalHealthTools.get_bhutanese_helplines.run()).strip()
+    except Exception:
+        return HELPLINES_TEXT.strip()
+
+
+def warm_fallbacks():
+    """Retrieve one knowledge-base excerpt per condition in the background (once per process)."""
+    global _warmed
+    with _warm_lock:
+        if _warmed:
+            return
+        _warmed = True
+    from modules.speculative import get_executor
+
+    def _load(condition):
+        excerpt = retrieve_context(CONDITION_QUERIES[condition], k=2)
+        if excerpt:
+            _kb_excerpts[condition] = excerpt
+
+    for condition in CONDITION_QUERIES:
+        get_executor().submit(_load, condition)
+
+
+def fallback_recommendation(condition: str, score=None, retrieved_data: Optional[str] = None,
+                            is_crisis: bool = False) -> str:
+    """A condition- and severity-specific recommendation built without the LLM."""
+    condition = condition if condition in CONDITION_GUIDANCE else "General Well-being"
+    tier = "high" if is_crisis else severity(condition, score)
+
+    parts = []
+    if is_crisis:
+        parts.append("You don't have to go through this alone. Please reach out to one of the helplines below right now.")
+    parts.append("Here are some steps that may help:\n" + "\n".join(f"- {step}" for step in CONDITION_GUIDANCE[condition]))
+    parts.append(SEVERITY_NOTES[tier])
+    excerpt = retrieved_data or _kb_excerpts.get(condition)
+    if excerpt and excerpt != "No specific data retrieved":
+        parts.append("From our knowledge base:\n" + excerpt[:1200].strip())
+    parts.append(helplines())
+    return "\n\n".join(parts)
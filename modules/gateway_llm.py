@@ -0,0 +1,143 @@
+# modules/gateway_llm.py
+import contextvars
+import threading
+import time
+
+from crewai.llms.base_llm import BaseLLM, call_stop_override
+from crewai.types.usage_metrics import UsageMetrics
+
+from modules import metrics, tracing
+from modules.llm_gateway import LLMGateway, QueueTimeout, estimate_tokens, get_gateway
+from modules.routing import get_recorder, is_timeout
+
+
+# Usage dicts the provider reports during the current call (set by GatewayLLM._call)
+_call_usage: contextvars.ContextVar = contextvars.ContextVar("gateway_call_usage", default=None)
+_hook_lock = threading.Lock()
+
+
+def _observe_usage(llm):
+    """
+    Makes a shared LLM (and the LLM a recording wrapper holds) also report each usage dict
+    to the current call's collector. Providers report usage in the calling thread, inside
+    llm.call, so concurrent calls each see only their own.
+    """
+    for target in (llm, getattr(llm, "inner", None)):
+        if target is None or not hasattr(target, "_track_token_usage_internal"):
+            continue
+        with _hook_lock:
+            if target.__dict__.get("_gateway_usage_hook"):
+                continue
+            track = target._track_token_usage_internal
+
+            def report(usage_data, track=track):
+                track(usage_data)
+                collected = _call_usage.get()
+                if collected is not None:
+                    collected.append(usage_data)
+
+            object.__setattr__(target, "_track_token_usage_internal", report)
+            object.__setattr__(target, "_gateway_usage_hook", True)
+
+
+class GatewayLLM(BaseLLM):
+    """
+    A crewai LLM that sends every call through the shared gateway.
+
+    The wrapped (inner) LLM is shared by all agents using the same model settings, so
+    its HTTP client and connections are reused instead of being created per module.
+    When built for a routed `stage`, each call's latency is recorded and a timed-out
+    call is retried once on the `fallback` tier's LLM.
+    """
+
+    def __init__(self, inner, lane: str = "interactive", gateway: LLMGateway = None,
+                 stage: str = None, route: dict = None, fallback=None):
+        super().__init__(model=inner.model, temperature=getattr(inner, "temperature", None))
+        object.__setattr__(self, "inner", inner)
+        object.__setattr__(self, "lane", lane)
+        object.__setattr__(self, "gateway", gateway or get_gateway())
+        object.__setattr__(self, "stage", stage)
+        object.__setattr__(self, "route", route or {})
+        object.__setattr__(self, "fallback", fallback)
+        for llm in (inner, fallback):
+            if llm is not None:
+                _observe_usage(llm)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        if self.stage is None:
+            return self._call(self.inner, messages, tools, callbacks, available_functions, **kwargs)
+
+        started = time.monotonic()
+        try:
+            result = self._call(self.inner, messages, tools, callbacks, available_functions, **kwargs)
+        except Exception as e:
+            timed_out = is_timeout(e)
+            self._record(self.route["tier"], self.inner, started, "timeout" if timed_out else "error")
+            if not (timed_out and self.fallback is not None):
+                raise
+            print(f"⚠️ {self.stage} timed out on {self.inner.model}, falling back to {self.fallback.model}")
+            started = time.monotonic()
+            try:
+                result = self._call(self.fallback, messages, tools, callbacks, available_functions, **kwargs)
+            except Exception:
+                self._record(self.route["fallback"], self.fallback, started, "error")
+                raise
+            self._record(self.route["fallback"], self.fallback, started, "fallback")
+            return result
+        self._record(self.route["tier"], self.inner, started, "ok")
+        return result
+
+    def _call(self, llm, messages, tools, callbacks, available_functions, **kwargs):
+        tokens = estimate_tokens(messages, getattr(llm, "max_tokens", None))
+        started, outcome = time.perf_counter(), "ok"
+        usage = _call_usage.set([])
+        try:
+            with tracing.span(llm.model, "llm", stage=self.stage, lane=self.lane) as current:
+                if current is not None:
+                    current.set_input(messages)
+                # The inner LLM is shared across agents and threads, so this call's stop words are
+                # scoped to the call (a contextvar override) instead of written onto the instance
+                with self.gateway.admit(self.lane, tokens), call_stop_override(llm, list(self.stop_sequences) or None):
+                    result = llm.call(messages, tools=tools, callbacks=callbacks,
+                                      available_functions=available_functions, **kwargs)
+                if current is not None:
+                    current.set_output(result)
+                return result
+        except Exception as e:
+            outcome = "queue_timeout" if isinstance(e, QueueTimeout) else "timeout" if is_timeout(e) else "error"
+            raise
+        finally:
+            metrics.LLM_SECONDS.observe(time.perf_counter() - started, stage=self.stage or "",
+                                        model=llm.model, outcome=outcome)
+            self._count_tokens(llm, _call_usage.get())
+            _call_usage.reset(usage)
+
+    def _count_tokens(self, llm, reported):
+        for usage_data in reported:
+            usage = UsageMetrics.from_provider_dict(usage_data)
+            if usage is None:
+                continue
+            for kind in ("prompt", "completion", "cached_prompt"):
+                count = getattr(usage, f"{kind}_tokens", 0) or 0
+                if count:
+                    metrics.LLM_TOKENS.inc(count, stage=self.stage or "", model=llm.model, kind=kind)
+
+    def _record(self, tier: str, llm, started: float, outcome: str):
+        get_recorder().record(self.stage, tier, llm.model, 1000 * (time.monotonic() - started),
+                              outcome, self.route["p95_ms"])
+
+    async def acall(self, *args, **kwargs):
+        import asyncio
+        return await asyncio.to_thread(self.call, *args, **kwargs)
+
+    def supports_function_calling(self) -> bool:
+        return self.inner.supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self.inner.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.inner.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self.inner.get_token_usage_summary()
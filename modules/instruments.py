@@ -0,0 +1,294 @@
+# modules/instruments.py
+"""
+Questionnaire registry.
+
+Every instrument (PHQ-9, GAD-7, DAST-10 and the open General Well-being / Other question
+sets) is defined once, in modules/instruments.json. The file is read, validated and
+compiled once per process into immutable Instrument objects: item ids, a normalized
+answer -> value map, a question text -> item id index and the interpretation bands.
+Every lookup after that is a dict hit.
+
+    phq9 = get_instrument("depression")                       # by name or alias
+    phq9.item_id("2. Feeling down, depressed, or hopeless?")  # "phq9_2"
+    phq9.response_value("Several days")                       # 1
+    phq9.interpret(12)                                        # "Moderate depression"
+    phq9.interpret_many(scores)                               # array of labels, one bisect each
+
+Band tables are checked when the file is loaded: they must cover every possible total,
+from the lowest to the highest, with no gaps or overlaps.
+
+Scoring lives in modules/scoring.py.
+"""
+import bisect
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+INSTRUMENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instruments.json")
+
+_NUMBERING = re.compile(r"^(?:\s*(?:q\s*)?\d+\s*[.:)])+\s*", re.IGNORECASE)  # "1. ", "Q1: ", "Q1: 1. "
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_text(text: str) -> str:
+    """Question text as matched by the reverse index: no "1. "/"Q1:" prefix, case or punctuation."""
+    return _NON_WORD.sub(" ", _NUMBERING.sub("", str(text)).lower()).strip()
+
+
+def normalize_answer(answer) -> str:
+    return " ".join(str(answer).lower().split())
+
+
+def _name_key(name: str) -> str:
+    return _NON_WORD.sub("", str(name).lower())  # "PHQ-9", "phq9" and "Phq 9" are one key
+
+
+@dataclass(frozen=True)
+class Item:
+    id: str
+    number: int
+    text: str
+    prompt: str  # As shown to users and used as the answer key by the chat front ends
+    critical: bool = False  # Any endorsement needs attention on its own (PHQ-9 item 9, self-harm)
+
+
+@dataclass(frozen=True)
+class Band:
+    low: int
+    high: int
+    label: str
+    severity: str = "unknown"  # low / moderate / high, used to pick fallback wording
+
+
+@dataclass(frozen=True)
+class BandTable:
+    """Contiguous score bands; a score's band is one bisect over the sorted upper bounds."""
+    bands: Tuple[Band, ...] = ()
+    highs: Tuple[int, ...] = ()
+
+    @classmethod
+    def compile(cls, name: str, bands: List[Band], lowest: int, highest: int) -> "BandTable":
+        """Sorts the bands and checks they cover lowest..highest exactly once, with no gaps or overlaps."""
+        bands = sorted(bands, key=lambda b: b.low)
+        if not bands:
+            return cls()
+        expected = lowest
+        for band in bands:
+            if band.low > band.high:
+                raise ValueError(f"{name}: band {band.label!r} runs from {band.low} down to {band.high}")
+            if band.low != expected:
+                problem = "gap" if band.low > expected else "overlap"
+                raise ValueError(f"{name}: {problem} before band {band.label!r} (starts at {band.low}, expected {expected})")
+            expected = band.high + 1
+        if expected - 1 != highest:
+            raise ValueError(f"{name}: bands end at {expected - 1} but the maximum score is {highest}")
+        return cls(tuple(bands), tuple(b.high for b in bands))
+
+    def __bool__(self) -> bool:
+        return bool(self.bands)
+
+    def __iter__(self):
+        return iter(self.bands)
+
+    def index(self, score) -> int:
+        """Position of the band holding `score`; -1 if it is outside the score range."""
+        if not self.bands or score < self.bands[0].low or score > self.highs[-1]:
+            return -1
+        return bisect.bisect_left(self.highs, score)
+
+    def band(self, score) -> Optional[Band]:
+        index = self.index(score)
+        return self.bands[index] if index >= 0 else None
+
+    def indices(self, scores):
+        """Vectorized index(): a NumPy array of band positions (-1 outside the range) for an array of scores."""
+        import numpy as np
+        scores = np.asarray(scores)
+        indices = np.searchsorted(np.asarray(self.highs), scores, side="left")
+        if self.bands:
+            indices[(scores < self.bands[0].low) | (scores > self.highs[-1])] = -1
+        else:
+            indices[...] = -1
+        return indices
+
+    def labels(self, scores, missing: str = "Interpretation not available for this score."):
+        """Vectorized interpretation: an object array of band labels for an array of scores."""
+        import numpy as np
+        lookup = np.array([b.label for b in self.bands] + [missing], dtype=object)
+        return lookup[self.indices(scores)]  # -1 picks `missing`
+
+    def summary(self) -> str:
+        """The bands as one line, e.g. for showing a score in context: '0-4: Minimal depression, 5-9: ...'."""
+        return ", ".join(f"{b.low}-{b.high}: {b.label}" if b.high > b.low else f"{b.low}: {b.label}" for b in self.bands)
+
+
+@dataclass(frozen=True)
+class Instrument:
+    name: str
+    title: str
+    aliases: Tuple[str, ...]
+    instructions: Optional[str]
+    scale_text: str
+    items: Tuple[Item, ...]
+    responses: Mapping[str, int]
+    bands: BandTable
+    text_index: Mapping[str, str]
+    positions: Mapping[str, int]
+    labels: Mapping[str, int]  # Scale labels only, as the legacy front-end scorers matched them
+
+    @property
+    def scored(self) -> bool:
+        return bool(self.bands)
+
+    @property
+    def min_value(self) -> int:
+        return min(self.responses.values(), default=0)
+
+    @property
+    def max_value(self) -> int:
+        return max(self.responses.values(), default=0)
+
+    @property
+    def max_score(self) -> int:
+        return self.max_value * len(self.items)
+
+    def item(self, item_id: str) -> Item:
+        return self.items[self.positions[item_id]]
+
+    def item_id(self, key: str) -> Optional[str]:
+        """Item id for an item id, its prompt or its question text (numbered or not); None if unknown."""
+        if key in self.positions:
+            return key
+        item_id = self.text_index.get(key)
+        return item_id if item_id is not None else self.text_index.get(normalize_text(key))
+
+    def response_value(self, answer) -> Optional[int]:
+        """Value of a free-text answer ("Several days", "y", "3"); None if it is not on the scale."""
+        value = self.responses.get(answer)
+        return value if value is not None else self.responses.get(normalize_answer(answer))
+
+    def band(self, score) -> Optional[Band]:
+        return self.bands.band(score)
+
+    def interpret(self, score: int) -> str:
+        if not self.bands:
+            return "Score interpreted"
+        band = self.bands.band(score)
+        return band.label if band is not None else "Interpretation not available for this score."
+
+    def interpret_many(self, scores):
+        """interpret() over a whole array of scores at once (NumPy)."""
+        return self.bands.labels(scores) if self.bands else self.bands.labels(scores, missing="Score interpreted")
+
+    def questions(self) -> List[str]:
+        """The legacy list view: the instruction line (if any) followed by the item prompts."""
+        return ([self.instructions] if self.instructions else []) + [item.prompt for item in self.items]
+
+
+def compile_instrument(name: str, spec: Dict[str, Any], scales: Dict[str, Any]) -> Instrument:
+    scale = scales.get(spec["scale"]) if "scale" in spec else {"text": "", "options": []}
+    if scale is None:
+        raise ValueError(f"{name}: unknown scale {spec['scale']!r}")
+    responses: Dict[str, int] = {}
+    labels = {option["label"]: int(option["value"]) for option in scale["options"]}
+    for option in scale["options"]:
+        for answer in [option["label"], *option.get("aliases", [])]:
+            for key in (normalize_answer(answer), answer):  # As written too, so exact answers skip normalizing
+                if responses.get(key, option["value"]) != option["value"]:
+                    raise ValueError(f"{name}: answer {answer!r} maps to two values")
+                responses[key] = int(option["value"])
+
+    items, positions, text_index = [], {}, {}
+    for number, entry in enumerate(spec["items"], 1):
+        item_id = entry["id"]
+        if item_id in positions:
+            raise ValueError(f"{name}: duplicate item id {item_id!r}")
+        prompt = f"{number}. {entry['text']}" if spec.get("numbered") else entry["text"]
+        positions[item_id] = number - 1
+        items.append(Item(item_id, number, entry["text"], prompt, bool(entry.get("critical"))))
+        for text in [entry["text"], *entry.get("aliases", [])]:
+            key = normalize_text(text)
+            if text_index.get(key, item_id) != item_id:
+                raise ValueError(f"{name}: question text {text!r} matches two items")
+            text_index[key] = item_id
+        # Exact prompt/text keys: answers stored by the front ends resolve without normalizing
+        text_index.setdefault(prompt, item_id)
+        text_index.setdefault(entry["text"], item_id)
+
+    bands = [Band(int(b["min"]), int(b["max"]), b["label"], b.get("severity", "unknown")) for b in spec.get("bands", [])]
+    if bands and not responses:
+        raise ValueError(f"{name}: bands without a response scale")
+    values = set(responses.values())
+    table = BandTable.compile(name, bands, min(values, default=0) * len(items), max(values, default=0) * len(items))
+
+    return Instrument(
+        name=name, title=spec.get("title", name), aliases=tuple(spec.get("aliases", [])),
+        instructions=spec.get("instructions"), scale_text=scale["text"], items=tuple(items),
+        responses=MappingProxyType(responses), bands=table,
+        text_index=MappingProxyType(text_index), positions=MappingProxyType(positions),
+        labels=MappingProxyType(labels),
+    )
+
+
+class InstrumentRegistry:
+    def __init__(self, instruments: List[Instrument]):
+        self._by_name = {i.name: i for i in instruments}
+        self._lookup: Dict[str, Instrument] = {}
+        for instrument in instruments:
+            for key in (instrument.name, *instrument.aliases):
+                other = self._lookup.setdefault(_name_key(key), instrument)
+                if other is not instrument:
+                    raise ValueError(f"{key!r} names both {other.name} and {instrument.name}")
+
+    @classmethod
+    def load(cls, path: str = INSTRUMENTS_FILE) -> "InstrumentRegistry":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls([compile_instrument(name, spec, data.get("scales", {}))
+                    for name, spec in data["instruments"].items()])
+
+    def get(self, name: str) -> Optional[Instrument]:
+        if not name:
+            return None
+        instrument = self._by_name.get(name)
+        return instrument if instrument is not None else self._lookup.get(_name_key(name))
+
+    def __getitem__(self, name: str) -> Instrument:
+        instrument = self.get(name)
+        if instrument is None:
+            raise KeyError(name)
+        return instrument
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def names(self) -> List[str]:
+        return list(self._by_name)
+
+    def scored(self) -> List[Instrument]:
+        return [i for i in self._by_name.values() if i.scored]
+
+    def legacy_questions(self) -> Dict[str, List[str]]:
+        """{name: [instructions, "1. item", ...]}, the shape the old questionnaire.json files had."""
+        return {name: instrument.questions() for name, instrument in self._by_name.items()}
+
+
+_registry: Optional[InstrumentRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_instruments() -> InstrumentRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = InstrumentRegistry.load()
+    return _registry
+
+
+def get_instrument(name: str) -> Optional[Instrument]:
+    """The instrument called `name` (or one of its aliases, e.g. 'depression'); None if there is none."""
+    return get_instruments().get(name)
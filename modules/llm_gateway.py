@@ -0,0 +1,171 @@
+# modules/llm_gateway.py
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from modules.config import get_config
+
+# Priority lanes: lower number is admitted first
+LANES = {"crisis": 0, "interactive": 1, "background": 2}
+
+
+class QueueTimeout(TimeoutError):
+    """Raised when a call waits in the gateway queue longer than its queue timeout; nothing was sent."""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.refill_per_sec = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_per_sec)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are available now)."""
+        self._refill(now)
+        # Requests bigger than the whole bucket are let through once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_sec
+
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+
+class LLMGateway:
+    """
+    Process-wide admission control for LLM calls.
+
+    Every call waits for a ticket: tickets are served strictly by lane (crisis first),
+    then in arrival order, and only when both the request bucket and the token bucket
+    have room. Waiting happens in the caller's thread, so no worker pool is needed.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, queue_timeout: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (lane priority, sequence)
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._stats = {lane: {"admitted": 0, "timeouts": 0, "wait_total": 0.0, "wait_max": 0.0} for lane in LANES}
+
+    @contextmanager
+    def admit(self, lane: str = "interactive", tokens: int = 0):
+        """Blocks until the call may proceed, then holds an in-flight slot for the duration."""
+        lane = lane if lane in LANES else "interactive"
+        ticket = (LANES[lane], next(self._sequence))
+        enqueued = time.monotonic()
+        deadline = enqueued + self.queue_timeout
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._waiting[0] == ticket:
+                        delay = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                        if delay == 0:
+                            break
+                    else:
+                        delay = None
+                    if now >= deadline:
+                        self._stats[lane]["timeouts"] += 1
+                        raise QueueTimeout(f"LLM gateway queue wait exceeded {self.queue_timeout:g}s ({lane} lane)")
+                    self._cond.wait(timeout=min(delay, deadline - now) if delay is not None else deadline - now)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self._in_flight += 1
+            waited = time.monotonic() - enqueued
+            stats = self._stats[lane]
+            stats["admitted"] += 1
+            stats["wait_total"] += waited
+            stats["wait_max"] = max(stats["wait_max"], waited)
+            self._cond.notify_all()
+        try:
+            yield waited
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, in-flight calls and wait times per lane."""
+        with self._cond:
+            depth = {lane: 0 for lane in LANES}
+            by_priority = {priority: lane for lane, priority in LANES.items()}
+            for priority, _ in self._waiting:
+                depth[by_priority[priority]] += 1
+            return {
+                "queue_depth": depth,
+                "in_flight": self._in_flight,
+                "lanes": {
+                    lane: {
+                        "admitted": s["admitted"],
+                        "timeouts": s["timeouts"],
+                        "wait_avg_ms": round(1000 * s["wait_total"] / s["admitted"], 1) if s["admitted"] else 0.0,
+                        "wait_max_ms": round(1000 * s["wait_max"], 1),
+                    }
+                    for lane, s in self._stats.items()
+                },
+            }
+
+
+def estimate_tokens(messages, max_tokens: Optional[int]) -> int:
+    """Rough token estimate (~4 characters per token) of the prompt plus the completion budget."""
+    if isinstance(messages, str):
+        chars = len(messages)
+    else:
+        chars = 0
+        for message in messages or []:
+            content = message.get("content", "") if isinstance(message, dict) else str(message)
+            chars += len(content) if isinstance(content, str) else len(str(content))
+    return chars // 4 + (max_tokens or 512)
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+def get_gateway() -> LLMGateway:
+    """Returns the process-wide gateway, configured from modules/config on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                config = get_config()
+                _configure_connection_pool(config["llm_pool_max_connections"])
+                _gateway = LLMGateway(
+                    requests_per_minute=config["llm_requests_per_minute"],
+                    tokens_per_minute=config["llm_tokens_per_minute"],
+                    queue_timeout=config["llm_queue_timeout"],
+                )
+    return _gateway
+
+
+def _configure_connection_pool(max_connections: int):
+    """Give litellm-backed calls one keep-alive HTTP client instead of a connection per call."""
+    try:
+        import httpx
+        import litellm
+    except ImportError:
+        return  # Native providers keep their own client on the shared inner LLM
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    if getattr(litellm, "client_session", None) is None:
+        litellm.client_session = httpx.Client(limits=limits)
+    if getattr(litellm, "aclient_session", None) is None:
+        litellm.aclient_session = httpx.AsyncClient(limits=limits)
@@ -1,21 +1,74 @@
 # modules/llm_setup.py
 import os
 from dotenv import load_dotenv
-from crewai import LLM
+from modules.config import get_config
+from modules.registry import register, get
 
 load_dotenv()
 
-def get_llm():
-    """Initializes and returns the Gemini LLM with fallback handling."""
+@register("llm_setup.inner_llm")
+def build_inner_llm(model: str, temperature: float, timeout: float = None):
+    """One crewai LLM (and HTTP client) per model settings, shared by every agent."""
+    config = get_config()
+    backend = config["llm_backend"]
+    if backend in ("replay", "template"):
+        from modules.offline_llm import build_offline_llm
+        return build_offline_llm(model, temperature, backend)
+
+    from crewai import LLM  # imported here so callers don't pay for crewai at import time
+    llm = LLM(
+        model=model,
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        temperature=temperature,
+        max_tokens=None,
+        timeout=timeout or config["llm_timeout"],
+        max_retries=config["llm_max_retries"],
+    )
+    if backend == "record":
+        from modules.offline_llm import RecordingLLM, get_record_store
+        return RecordingLLM(llm, get_record_store())
+    return llm
+
+def _resolve_route(stage: str, model: str = None):
+    """The stage's route and its primary/fallback model names; unknown stages and tiers raise KeyError."""
+    from modules.routing import DEFAULT_ROUTES, get_route, get_tiers
+    if stage not in DEFAULT_ROUTES and stage not in get_config()["llm_routes"]:
+        raise KeyError(f"No LLM route for stage {stage!r} (known: {', '.join(DEFAULT_ROUTES)})")
+    route, tiers = get_route(stage), get_tiers()
+    for key in ("tier", "fallback"):
+        if route[key] and route[key] not in tiers:
+            raise KeyError(f"Stage {stage!r} routes to unknown {key} {route[key]!r} (tiers: {', '.join(tiers)})")
+    fallback = None
+    if route["fallback"] and route["fallback"] != route["tier"] and not model:
+        fallback = tiers[route["fallback"]]
+    return route, model or tiers[route["tier"]], fallback
+
+def get_llm(model: str = None, temperature: float = None, lane: str = None, stage: str = None):
+    """
+    Initializes and returns the Gemini LLM with fallback handling.
+
+    Every LLM returned here goes through the process-wide gateway (modules/llm_gateway.py),
+    which rate-limits calls across all crews and serves the 'crisis' lane first.
+    With `stage`, the model, timeout, lane and fallback tier come from modules/routing.py
+    (an explicit `model` or `lane` still wins). An unknown stage or tier is a configuration
+    error and raises KeyError; only a provider that fails to initialize returns None.
+    """
+    config = get_config()
+    temperature = config["llm_temperature"] if temperature is None else temperature
+    route = None
+    if stage is not None:
+        route, model, fallback_model = _resolve_route(stage, model)
     try:
-        return LLM(
-            model="gemini/gemini-2.0-flash",
-            api_key=os.getenv("GOOGLE_API_KEY"),
-            temperature=0,
-            max_tokens=None,
-            timeout=None,
-            max_retries=2,
-        )
+        from modules.gateway_llm import GatewayLLM
+        if route is None:
+            inner = get("llm_setup.inner_llm", model=model or config["llm_model"], temperature=temperature)
+            return GatewayLLM(inner, lane=lane or "interactive")
+
+        inner = get("llm_setup.inner_llm", model=model, temperature=temperature, timeout=route["timeout_s"])
+        fallback = None
+        if fallback_model:
+            fallback = get("llm_setup.inner_llm", model=fallback_model, temperature=temperature, timeout=route["timeout_s"])
+        return GatewayLLM(inner, lane=lane or route["lane"], stage=stage, route=route, fallback=fallback)
     except Exception as e:
         print(f"❌ Error initializing LLM: {e}")
         return None
@@ -0,0 +1,272 @@
+# modules/loadtest.py
+"""
+Load generator: N concurrent scripted conversations through one DrukCare worker.
+
+Usage (from the repository root):
+    python -m modules.loadtest --users 10 --conversations 50                 # offline, templated LLM
+    python -m modules.loadtest --target interactive --backend replay
+    python -m modules.loadtest --backend live --users 2 --conversations 4     # real Gemini calls
+
+Targets:
+    chatbot      modules.chatbot.full_chat_flow, questionnaire answered through `answer_fn`
+    interactive  new_flow/interactive_chatbot.chat_interface, messages fed through `input_fn`
+
+Reports throughput, per-stage p50/p95/p99 latency, error rate and peak memory.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One script per path through the pipeline; answers are cycled to the questionnaire length
+SCRIPTS = {
+    "crisis": {"query": "I can't go on anymore, I want to kill myself", "condition": None, "answers": []},
+    "phq9": {"query": "I feel hopeless and down, nothing interests me anymore", "condition": "PHQ-9",
+             "answers": ["Several days", "More than half the days", "Nearly every day", "Not at all"]},
+    "gad7": {"query": "I am anxious and worried all the time, I can't relax", "condition": "GAD-7",
+             "answers": ["Nearly every day", "Several days", "More than half the days"]},
+    "dast10": {"query": "I have been using drugs a lot and can't stop", "condition": "DAST-10",
+               "answers": ["Yes", "No", "Yes"]},
+    "general": {"query": "I would like some tips to improve my well-being", "condition": "General Well-being",
+                "answers": ["Okay I guess", "Time with my family", "Work pressure", "Sleep better"]},
+}
+STANDARDIZED = {"PHQ-9", "GAD-7", "DAST-10"}
+
+
+class StageRecorder:
+    """Thread-safe collection of per-stage latencies and errors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.latencies[stage].append(seconds)
+
+    def error(self, stage: str):
+        with self._lock:
+            self.errors[stage] += 1
+
+    def timed(self, stage: str, fn: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                self.error(stage)
+                raise
+            finally:
+                self.record(stage, time.perf_counter() - started)
+        return wrapper
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * (len(ordered) - 1) + 0.5))]
+
+
+# --- Targets ---
+
+@contextlib.contextmanager
+def instrument_chatbot(recorder: StageRecorder):
+    """Times the stage functions full_chat_flow looks up from modules.chatbot for the duration of the run."""
+    import modules.chatbot as chatbot
+    stages = {"run_crisis_check": "crisis_check", "run_condition_classification": "classification",
+              "conduct_assessment": "assessment", "run_recommendations": "recommendation"}
+    originals = {name: getattr(chatbot, name) for name in stages}
+    for name, stage in stages.items():
+        setattr(chatbot, name, recorder.timed(stage, originals[name]))
+    try:
+        yield
+    finally:
+        for name, fn in originals.items():
+            setattr(chatbot, name, fn)
+
+
+def run_chatbot_conversation(script: Dict[str, Any], user_id: str, recorder: StageRecorder):
+    from modules.chatbot import full_chat_flow
+    answers = itertools.cycle(script["answers"] or ["Not at all"])
+    full_chat_flow(script["query"], user_id=user_id, answer_fn=lambda prompt: next(answers))
+
+
+def interactive_steps(script: Dict[str, Any], questions: Dict[str, List[str]]) -> List[tuple]:
+    """(stage label, message) pairs; the label names the work that message triggers."""
+    if script["condition"] is None:
+        return [("crisis_recommendation", script["query"])]
+    items = questions.get(script["condition"], [])
+    count = len(items) - (1 if script["condition"] in STANDARDIZED else 0)
+    answers = list(itertools.islice(itertools.cycle(script["answers"]), count))
+    # The chatbot shows the consent question only after the next message, hence "ok"
+    steps = [("triage", script["query"]), ("consent_prompt", "ok"), ("first_question", "yes")]
+    steps += [("next_question", a) for a in answers[:-1]]
+    if answers:
+        steps.append(("recommendation", answers[-1]))
+    return steps
+
+
+def run_interactive_conversation(script: Dict[str, Any], user_id: str, recorder: StageRecorder):
+    from interactive_chatbot import QUESTIONS, chat_interface
+    steps = interactive_steps(script, QUESTIONS)
+    position = {"index": 0, "sent_at": None}
+
+    def input_fn(prompt=""):
+        # Time from handing over a message to being asked for the next one = that message's stage
+        now = time.perf_counter()
+        if position["index"] > 0:
+            recorder.record(steps[position["index"] - 1][0], now - position["sent_at"])
+        if position["index"] >= len(steps):
+            return "quit"
+        message = steps[position["index"]][1]
+        position["index"] += 1
+        position["sent_at"] = time.perf_counter()
+        return message
+
+    chat_interface(input_fn=input_fn)
+
+
+TARGETS = {"chatbot": run_chatbot_conversation, "interactive": run_interactive_conversation}
+
+
+# --- Runner ---
+
+def run_load(target: str, users: int, conversations: int, scripts: List[str], quiet: bool = True,
+             warmup: int = 1, trace_memory: bool = False, distinct: bool = False) -> Dict[str, Any]:
+    """
+    Runs `conversations` scripted conversations, `users` at a time.
+
+    `warmup` conversations run first and are not measured, so imports and crew construction
+    don't land in the first stage's latency. tracemalloc slows every allocation, so Python-level
+    peak memory is only traced on request; peak RSS is always reported. Identical concurrent
+    conversations share crew kickoffs (modules/singleflight.py); `distinct` makes every query unique.
+    """
+    recorder = StageRecorder()
+    run_one = TARGETS[target]
+    conversation_latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def conversation(i: int):
+        name = scripts[i % len(scripts)]
+        script = SCRIPTS[name]
+        if distinct:
+            script = dict(script, query=f"{script['query']} (conversation {i})")
+        started = time.perf_counter()
+        try:
+            run_one(script, f"load_user_{i}", recorder)
+        except Exception as e:
+            with lock:
+                errors.append(f"{name}: {type(e).__name__}: {e}")
+        finally:
+            with lock:
+                conversation_latencies.append(time.perf_counter() - started)
+
+    devnull = open(os.devnull, "w")
+    # Pipeline output is printed to stdout; keep the report readable
+    output = contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext()
+    try:
+        with output:
+            for i in range(warmup):
+                run_one(SCRIPTS[scripts[i % len(scripts)]], f"warmup_user_{i}", StageRecorder())
+
+        if trace_memory:
+            tracemalloc.start()
+        instrument = instrument_chatbot(recorder) if target == "chatbot" else contextlib.nullcontext()
+        started = time.perf_counter()
+        try:
+            with instrument, output:
+                with ThreadPoolExecutor(max_workers=users, thread_name_prefix="loadtest") as pool:
+                    list(pool.map(conversation, range(conversations)))
+        finally:
+            elapsed = time.perf_counter() - started
+            peak_traced = tracemalloc.get_traced_memory()[1] if trace_memory else None
+            tracemalloc.stop()
+    finally:
+        devnull.close()
+
+    report = {
+        "target": target,
+        "users": users,
+        "conversations": conversations,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_per_s": round(conversations / elapsed, 3) if elapsed else 0.0,
+        "error_rate": round(len(errors) / conversations, 4) if conversations else 0.0,
+        "errors": errors[:10],
+        "peak_traced_mb": round(peak_traced / 2**20, 1) if peak_traced is not None else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages": {},
+    }
+    stage_latencies = dict(recorder.latencies, conversation=conversation_latencies)
+    for stage, values in stage_latencies.items():
+        if values:
+            report["stages"][stage] = {
+                "count": len(values),
+                "errors": recorder.errors.get(stage, 0),
+                "p50_ms": round(1000 * percentile(values, 50), 1),
+                "p95_ms": round(1000 * percentile(values, 95), 1),
+                "p99_ms": round(1000 * percentile(values, 99), 1),
+            }
+    return report
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None  # Not available on Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n=== Load test: {report['target']}, {report['users']} users, {report['conversations']} conversations ===")
+    print(f"Elapsed {report['elapsed_s']}s | throughput {report['throughput_per_s']} conv/s | "
+          f"error rate {report['error_rate']:.1%} | peak RSS {report['peak_rss_mb']} MB"
+          + (f" | peak traced {report['peak_traced_mb']} MB" if report["peak_traced_mb"] is not None else ""))
+    print(f"{'stage':<24}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<24}{s['count']:>7}{s['errors']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    for error in report["errors"]:
+        print(f"❌ {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent scripted conversations and report latency.")
+    parser.add_argument("--target", choices=sorted(TARGETS), default="chatbot")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent conversations")
+    parser.add_argument("--conversations", type=int, default=50, help="Total conversations to run")
+    parser.add_argument("--scripts", nargs="+", choices=sorted(SCRIPTS), default=list(SCRIPTS))
+    parser.add_argument("--backend", choices=["live", "record", "replay", "template"], default="template",
+                        help="LLM backend (see modules/offline_llm.py); defaults to the offline template")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured conversations run first")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report tracemalloc peak (slows the run)")
+    parser.add_argument("--distinct", action="store_true", help="Make every query unique so nothing is coalesced")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's own output")
+    args = parser.parse_args()
+
+    # Must be set before the first LLM is built
+    os.environ["LLM_BACKEND"] = args.backend
+    sys.path.append(os.path.join(REPO_ROOT, "new_flow"))  # interactive_chatbot / new_agents imports
+
+    report = run_load(args.target, args.users, args.conversations, args.scripts, quiet=not args.verbose,
+                      warmup=args.warmup, trace_memory=args.trace_memory, distinct=args.distinct)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
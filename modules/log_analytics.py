@@ -0,0 +1,196 @@
+# modules/log_analytics.py
+"""
+Performance baselines mined from crew task logs.
+
+Reads both the legacy crew log (output.txt: `YYYY-MM-DD HH:MM:SS: task_name="...", task="...",
+agent="...", status="started"/"completed"[, output="..."]`, records may span several lines)
+and the JSON-lines log written by modules/structured_logging.py. Files are streamed, so
+only per-task durations are kept in memory.
+
+    python -m modules.log_analytics output.txt logs/drukcare.jsonl
+    python -m modules.log_analytics output.txt --bucket 1440 --json baseline.json
+
+Start and completion records are paired per (agent, task). A second start for a pair that
+never completed counts as a retry. A new turn begins when the first agent of the crew
+starts (or, in JSON logs, when the trace id changes); starts still open then are abandoned.
+"""
+import argparse
+import json
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+LEGACY_START = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}: ")
+LEGACY_RECORD = re.compile(
+    r'^(?P<ts>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}): task_name="(?P<task_name>.*?)", task="(?P<task>.*?)", '
+    r'agent="(?P<agent>.*?)", status="(?P<status>\w+)"', re.DOTALL)
+# Task descriptions embed the user's words in quotes; strip them so one task groups across turns
+QUOTED = re.compile(r"(?<!\w)'.*?'(?!\w)", re.DOTALL)
+
+
+def _legacy_records(lines: Iterable[str]) -> Iterator[str]:
+    """Joins continuation lines onto the timestamped line that starts each record."""
+    record: List[str] = []
+    for line in lines:
+        if LEGACY_START.match(line) and record:
+            yield "".join(record)
+            record = []
+        if record or LEGACY_START.match(line):
+            record.append(line)
+    if record:
+        yield "".join(record)
+
+
+def read_events(path: str) -> Iterator[Dict[str, Any]]:
+    """Task start/completion events from one log file: ts (datetime), agent, task, status, turn_id."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        first = f.readline()
+        f.seek(0)
+        if first.lstrip().startswith("{"):
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get("event") != "task":
+                    continue
+                yield {"ts": datetime.fromisoformat(entry["ts"]).astimezone().replace(tzinfo=None),
+                       "agent": entry.get("agent") or "?", "task": entry.get("task") or "",
+                       "status": entry.get("status"), "turn_id": entry.get("trace_id")}
+        else:
+            for record in _legacy_records(f):
+                match = LEGACY_RECORD.match(record)
+                if match:
+                    yield {"ts": datetime.strptime(match["ts"], "%Y-%m-%d %H:%M:%S"), "agent": match["agent"],
+                           "task": match["task"], "status": match["status"], "turn_id": None}
+
+
+def task_label(task: str, width: int = 70) -> str:
+    label = " ".join(QUOTED.sub("'…'", task).split())
+    return label if len(label) <= width else label[:width - 1] + "…"
+
+
+class LogAnalyzer:
+    def __init__(self, bucket_minutes: int = 60):
+        self.bucket_minutes = bucket_minutes
+        self.by_agent: Dict[str, List[float]] = defaultdict(list)
+        self.by_task: Dict[str, List[float]] = defaultdict(list)
+        self.retries: Dict[str, int] = defaultdict(int)
+        self.abandoned: Dict[str, int] = defaultdict(int)
+        self.unmatched_completions = 0
+        self.buckets: Dict[datetime, Dict[str, float]] = defaultdict(lambda: {"turns": 0, "tasks": 0, "task_seconds": 0.0})
+        self.turns: List[Dict[str, Any]] = []
+        self._open: Dict[tuple, datetime] = {}
+        self._first_agent: Optional[str] = None
+        self._turn: Optional[Dict[str, Any]] = None
+
+    def _bucket(self, ts: datetime) -> datetime:
+        minutes = (ts.hour * 60 + ts.minute) // self.bucket_minutes * self.bucket_minutes
+        return ts.replace(hour=min(minutes // 60, 23), minute=minutes % 60, second=0, microsecond=0) \
+            if self.bucket_minutes < 1440 else ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _new_turn(self, ts: datetime, turn_id: Optional[str]):
+        for (agent, _), _ in self._open.items():
+            self.abandoned[agent] += 1
+        self._open.clear()
+        self._turn = {"start": ts, "end": ts, "tasks": 0, "turn_id": turn_id}
+        self.turns.append(self._turn)
+        self.buckets[self._bucket(ts)]["turns"] += 1
+
+    def add(self, event: Dict[str, Any]):
+        ts, agent, status = event["ts"], event["agent"], event["status"]
+        key = (agent, task_label(event["task"]))
+        if self._first_agent is None:
+            self._first_agent = agent
+
+        if status == "started":
+            if key in self._open:
+                self.retries[agent] += 1  # The earlier attempt never completed
+            elif self._turn is None or (event["turn_id"] and event["turn_id"] != self._turn["turn_id"]) \
+                    or (not event["turn_id"] and agent == self._first_agent):
+                self._new_turn(ts, event["turn_id"])
+            self._open[key] = ts
+        elif status == "completed":
+            started = self._open.pop(key, None)
+            if started is None:
+                self.unmatched_completions += 1
+                return
+            seconds = (ts - started).total_seconds()
+            self.by_agent[agent].append(seconds)
+            self.by_task[key[1]].append(seconds)
+            bucket = self.buckets[self._bucket(ts)]
+            bucket["tasks"] += 1
+            bucket["task_seconds"] += seconds
+            if self._turn is not None:
+                self._turn["end"] = max(self._turn["end"], ts)
+                self._turn["tasks"] += 1
+
+    def report(self, top: int = 10) -> Dict[str, Any]:
+        for (agent, _), _ in self._open.items():
+            self.abandoned[agent] += 1
+        self._open.clear()
+        turns = sorted(self.turns, key=lambda t: t["end"] - t["start"], reverse=True)
+        return {
+            "agents": {a: dict(distribution(v), retries=self.retries.get(a, 0), abandoned=self.abandoned.get(a, 0))
+                       for a, v in sorted(self.by_agent.items())},
+            "tasks": dict(sorted(((t, distribution(v)) for t, v in self.by_task.items()),
+                                 key=lambda kv: kv[1]["p95_s"], reverse=True)[:top]),
+            "slowest_turns": [{"start": t["start"].isoformat(sep=" "), "seconds": (t["end"] - t["start"]).total_seconds(),
+                               "tasks_completed": t["tasks"], "turn_id": t["turn_id"]} for t in turns[:top]],
+            "throughput": [{"bucket": b.isoformat(sep=" "), "turns": v["turns"], "tasks": v["tasks"],
+                            "mean_task_s": round(v["task_seconds"] / v["tasks"], 2) if v["tasks"] else None}
+                           for b, v in sorted(self.buckets.items())],
+            "turns": len(self.turns),
+            "retries": sum(self.retries.values()),
+            "abandoned": sum(self.abandoned.values()),
+            "unmatched_completions": self.unmatched_completions,
+        }
+
+
+def distribution(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1) + 0.5))]
+    return {"count": len(ordered), "mean_s": round(sum(ordered) / len(ordered), 2),
+            "p50_s": pick(0.5), "p95_s": pick(0.95), "max_s": ordered[-1]}
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"=== {report['turns']} turns | {report['retries']} retries | {report['abandoned']} abandoned starts | "
+          f"{report['unmatched_completions']} unmatched completions ===")
+    print(f"\n{'agent':<42}{'count':>7}{'mean s':>9}{'p50 s':>8}{'p95 s':>8}{'max s':>8}{'retries':>9}{'abandon':>9}")
+    for agent, d in report["agents"].items():
+        print(f"{agent[:41]:<42}{d['count']:>7}{d['mean_s']:>9}{d['p50_s']:>8.0f}{d['p95_s']:>8.0f}{d['max_s']:>8.0f}"
+              f"{d['retries']:>9}{d['abandoned']:>9}")
+    print(f"\n{'slowest tasks (by p95)':<72}{'count':>7}{'p50 s':>8}{'p95 s':>8}")
+    for task, d in report["tasks"].items():
+        print(f"{task:<72}{d['count']:>7}{d['p50_s']:>8.0f}{d['p95_s']:>8.0f}")
+    print(f"\n{'slowest turns':<24}{'seconds':>9}{'tasks':>7}")
+    for t in report["slowest_turns"]:
+        print(f"{t['start']:<24}{t['seconds']:>9.0f}{t['tasks_completed']:>7}" + (f"  trace={t['turn_id']}" if t["turn_id"] else ""))
+    print(f"\n{'throughput':<24}{'turns':>7}{'tasks':>7}{'mean task s':>13}")
+    for b in report["throughput"]:
+        print(f"{b['bucket']:<24}{b['turns']:>7}{b['tasks']:>7}{str(b['mean_task_s']):>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-agent/task durations, slowest turns, retries and throughput from crew logs.")
+    parser.add_argument("files", nargs="+", help="output.txt-style crew logs and/or structured JSON-lines logs")
+    parser.add_argument("--bucket", type=int, default=60, help="Throughput bucket size in minutes (1440 = per day)")
+    parser.add_argument("--top", type=int, default=10, help="Rows in the slowest task/turn tables")
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    analyzer = LogAnalyzer(args.bucket)
+    for path in args.files:
+        for event in read_events(path):
+            analyzer.add(event)
+    report = analyzer.report(args.top)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# modules/metrics.py
+"""
+Low-overhead metrics in the Prometheus text exposition format.
+
+Stages, tools and LLM calls record into process-wide counters and histograms (a lock
+and a bisect per observation). The text format is served on METRICS_PORT (/metrics)
+and/or written to METRICS_TEXTFILE every METRICS_INTERVAL seconds, for the node
+exporter textfile collector.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from modules import tracing
+from modules.config import get_config
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name, self.documentation = name, documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.documentation = name, documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+# --- Metrics ---
+STAGE_SECONDS = Histogram("drukcare_stage_duration_seconds", "Wall time of a pipeline stage.", ("stage", "model"))
+STAGE_ERRORS = Counter("drukcare_stage_errors_total", "Pipeline stages that raised or fell back.", ("stage", "model", "reason"))
+TOOL_SECONDS = Histogram("drukcare_tool_duration_seconds", "Wall time of an agent tool call.", ("tool",))
+TOOL_ERRORS = Counter("drukcare_tool_errors_total", "Agent tool calls that raised.", ("tool",))
+LLM_SECONDS = Histogram("drukcare_llm_request_duration_seconds", "Wall time of one LLM request, including gateway wait.",
+                        ("stage", "model", "outcome"))
+CREW_POOL_WAIT = Histogram("drukcare_crew_pool_wait_seconds", "Time a turn waited for a pooled crew instance.", ("crew",))
+LLM_TOKENS = Counter("drukcare_llm_tokens_total", "Tokens reported by the LLM provider, per call.",
+                     ("stage", "model", "kind"))
+DB_QUERY_SECONDS = Histogram("drukcare_db_query_duration_seconds", "Wall time of one profile repository query.",
+                             ("backend", "query"), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+DB_POOL_WAIT = Histogram("drukcare_db_pool_wait_seconds", "Time a query waited for a pooled database connection.", ("pool",),
+                         buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10))
+CACHE_HITS = Counter("drukcare_cache_hits_total", "Work answered without a new LLM/crew run.", ("cache",))
+CACHE_MISSES = Counter("drukcare_cache_misses_total", "Work that needed a new LLM/crew run.", ("cache",))
+
+_METRICS = [STAGE_SECONDS, STAGE_ERRORS, TOOL_SECONDS, TOOL_ERRORS, LLM_SECONDS, LLM_TOKENS, CREW_POOL_WAIT, DB_QUERY_SECONDS, DB_POOL_WAIT,
+            CACHE_HITS, CACHE_MISSES]
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collector: Callable[[], List[str]]):
+    """Adds a callback that renders extra lines at scrape time (for values kept elsewhere)."""
+    _collectors.append(collector)
+
+
+@contextmanager
+def stage(name: str, model: str = ""):
+    """Times a pipeline stage (and traces it); an exception is counted as an error and re-raised."""
+    started = time.perf_counter()
+    try:
+        with tracing.span(name, "stage", model=model):
+            yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=name, model=model, reason=type(e).__name__)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name, model=model)
+
+
+def timed_stage(name: str, model: str = ""):
+    """Decorator form of stage()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name, model):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def tool(name: str):
+    started = time.perf_counter()
+    try:
+        with tracing.span(name, "tool"):
+            yield
+    except Exception:
+        TOOL_ERRORS.inc(tool=name)
+        raise
+    finally:
+        TOOL_SECONDS.observe(time.perf_counter() - started, tool=name)
+
+
+def timed_tool(name: str):
+    """
+    Decorator for tool functions; apply it under crewai's @tool so the tool schema
+    still comes from the original signature and docstring (functools.wraps keeps both).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tool(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_result(cache: str, hit: bool):
+    (CACHE_HITS if hit else CACHE_MISSES).inc(cache=cache)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            lines.append(f"# collector error: {_escape(e)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Exposure ---
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # Scrapes would otherwise be logged to stderr every interval
+
+
+def write_textfile(path: str):
+    """Atomically replaces `path` with the current metrics."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)
+
+
+_started = False
+_start_lock = threading.Lock()
+
+def start_exporters(port: Optional[int] = None, textfile: Optional[str] = None):
+    """Starts the /metrics endpoint and/or textfile writer from config, once per process."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    config = get_config()
+    port = config["metrics_port"] if port is None else port
+    textfile = config["metrics_textfile"] if textfile is None else textfile
+
+    if port:
+        try:
+            server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            print(f"📈 Metrics on http://127.0.0.1:{port}/metrics")
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint not started: {e}")
+    if textfile:
+        interval = config["metrics_interval"]
+
+        def _loop():
+            while True:
+                try:
+                    write_textfile(textfile)
+                except OSError as e:
+                    print(f"⚠️ Could not write metrics to {textfile}: {e}")
+                time.sleep(interval)
+        threading.Thread(target=_loop, name="metrics-textfile", daemon=True).start()
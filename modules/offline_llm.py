@@ -0,0 +1,250 @@
+# modules/offline_llm.py
+"""
+Offline LLM backends for benchmarking without Gemini quota.
+
+LLM_BACKEND selects what modules/llm_setup builds for every agent:
+    live      real Gemini calls (default)
+    record    real Gemini calls, each request/response pair appended to LLM_RECORD_FILE
+    replay    answers from LLM_RECORD_FILE; misses get a templated answer (or fail, see LLM_REPLAY_MISS)
+    template  templated answers only, no network at all
+
+Offline answers wait a synthetic latency (LLM_SYNTHETIC_LATENCY_MS +/- LLM_SYNTHETIC_JITTER_MS).
+The jitter is derived from the request hash, so repeated runs see the same latencies.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from crewai.llms.base_llm import BaseLLM, call_stop_override
+
+from modules.config import get_config
+
+CRISIS_PATTERN = re.compile(r"suicid|kill myself|end my life|want to die|hurt myself|self-harm", re.IGNORECASE)
+CONDITION_PATTERNS = [
+    ("DAST-10", re.compile(r"drug|alcohol|drink|substance|addict|weed|pills", re.IGNORECASE)),
+    ("GAD-7", re.compile(r"anxi|worr|nervous|panic|on edge|restless", re.IGNORECASE)),
+    ("PHQ-9", re.compile(r"depress|hopeless|sad|down|empty|no interest|worthless", re.IGNORECASE)),
+]
+
+
+def _model_name(model: str) -> str:
+    # crewai strips the provider prefix on native clients ("gemini/gemini-2.0-flash" -> "gemini-2.0-flash")
+    return model.split("/", 1)[-1]
+
+
+def request_key(model: str, messages) -> str:
+    """Stable hash of the model (without provider prefix) and the message contents."""
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    canonical = [
+        {"role": m.get("role", ""), "content": str(m.get("content", ""))} if isinstance(m, dict) else str(m)
+        for m in messages
+    ]
+    payload = json.dumps({"model": _model_name(model), "messages": canonical}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecordStore:
+    """Request/response pairs in an append-only JSONL file, indexed in memory by request key."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def put(self, key: str, model: str, messages, response: str, latency_ms: float, function_calling: bool):
+        entry = {"key": key, "model": model, "response": response, "latency_ms": round(latency_ms, 1),
+                 "function_calling": function_calling, "messages": messages}
+        with self._lock:
+            self._entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+    def function_calling(self, model: str) -> bool:
+        """Whether the recordings for `model` were made in native function-calling mode."""
+        return any(e.get("function_calling") for e in self._entries.values()
+                   if _model_name(e["model"]) == _model_name(model))
+
+
+def _last_user_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    texts = [str(m.get("content", "")) for m in messages if isinstance(m, dict) and m.get("role") == "user"]
+    return texts[-1] if texts else ""
+
+
+def _all_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(m.get("content", "")) if isinstance(m, dict) else str(m) for m in messages)
+
+
+def template_answer(messages, response_model=None) -> str:
+    """
+    A plausible answer for the prompt: JSON for structured-output tasks, otherwise a ReAct final answer.
+
+    The crisis flag and condition come from simple keyword rules on the prompt, so the
+    pipeline takes realistic branches (crisis, PHQ-9, GAD-7, DAST-10, general) offline.
+    """
+    prompt = _last_user_text(messages)
+    full_text = _all_text(messages)
+    if "READY: I am ready to execute the task." in full_text or "Conclude with READY or NOT READY" in full_text:
+        # Agents with reasoning=True plan first; answer with a one-step plan that is ready to run
+        return "Plan: answer the task directly from the given context.\n\nREADY: I am ready to execute the task."
+    is_crisis = bool(CRISIS_PATTERN.search(prompt))
+    # Task descriptions mention several conditions, so the query's own keywords tip the balance
+    hits = {label: len(pattern.findall(prompt)) for label, pattern in CONDITION_PATTERNS}
+    condition = max(hits, key=hits.get) if any(hits.values()) else "General Well-being"
+    values = {
+        "is_crisis": is_crisis,
+        "explanation": "Crisis language detected." if is_crisis else "No crisis indicators found.",
+        "condition": condition,
+        "rationale": f"Keywords in the query match {condition}.",
+        "confidence": 0.9,
+    }
+
+    fields = None
+    schema_marker = "following OpenAPI schema"
+    schema = full_text[full_text.index(schema_marker):] if schema_marker in full_text else ""
+    if response_model is not None:
+        fields = response_model.model_fields
+    elif "is_crisis" in schema:
+        fields = {"is_crisis": None, "explanation": None}
+    elif "condition" in schema and "rationale" in schema:
+        fields = {"condition": None, "rationale": None}
+
+    if fields is not None:
+        answer = {}
+        for name, field in fields.items():
+            value = values.get(name, "")
+            annotation = getattr(field, "annotation", None)
+            if name == "is_crisis" and annotation is str:
+                value = "YES" if is_crisis else "NO"
+            answer[name] = value
+        payload = json.dumps(answer)
+        return payload if response_model is not None else f"Thought: I now know the final answer\nFinal Answer: {payload}"
+
+    from modules.fallback import fallback_recommendation
+    score = re.search(r"score[^0-9]{0,20}(\d{1,2})", prompt, re.IGNORECASE)
+    text = fallback_recommendation(condition, score.group(1) if score else None, is_crisis=is_crisis)
+    return f"Thought: I now know the final answer\nFinal Answer: {text}"
+
+
+class _OfflineLLM(BaseLLM):
+    """Shared synthetic-latency handling for the offline backends."""
+
+    def __init__(self, model: str, temperature: float = None, latency_ms: float = 0, jitter_ms: float = 0):
+        super().__init__(model=model, temperature=temperature)
+        object.__setattr__(self, "latency_ms", latency_ms)
+        object.__setattr__(self, "jitter_ms", jitter_ms)
+
+    def _sleep(self, key: str):
+        jitter = (int(key[:8], 16) / 0xFFFFFFFF * 2 - 1) * self.jitter_ms
+        delay = max(0.0, self.latency_ms + jitter) / 1000
+        if delay:
+            time.sleep(delay)
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return True
+
+    def get_context_window_size(self) -> int:
+        return 1_000_000
+
+
+class TemplateLLM(_OfflineLLM):
+    """Serves templated answers after a synthetic latency; never touches the network."""
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        self._sleep(request_key(self.model, messages))
+        return template_answer(messages, kwargs.get("response_model"))
+
+
+class ReplayLLM(_OfflineLLM):
+    """Answers from recorded pairs; unknown requests get a templated answer unless misses are errors."""
+
+    def __init__(self, model: str, store: RecordStore, temperature: float = None, latency_ms: float = 0,
+                 jitter_ms: float = 0, miss: str = "template"):
+        super().__init__(model, temperature, latency_ms, jitter_ms)
+        object.__setattr__(self, "store", store)
+        object.__setattr__(self, "miss", miss)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        key = request_key(self.model, messages)
+        self._sleep(key)
+        entry = self.store.get(key)
+        if entry is not None:
+            return entry["response"]
+        if self.miss == "error":
+            raise KeyError(f"No recorded response for request {key[:12]} ({self.model})")
+        return template_answer(messages, kwargs.get("response_model"))
+
+    def supports_function_calling(self) -> bool:
+        return self.store.function_calling(self.model)
+
+
+class RecordingLLM(BaseLLM):
+    """Passes calls to a real LLM and records each request/response pair."""
+
+    def __init__(self, inner, store: RecordStore):
+        super().__init__(model=inner.model, temperature=getattr(inner, "temperature", None))
+        object.__setattr__(self, "inner", inner)
+        object.__setattr__(self, "store", store)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        started = time.monotonic()
+        with call_stop_override(self.inner, list(self.stop_sequences) or None):  # Never written onto the shared inner LLM
+            response = self.inner.call(messages, tools=tools, callbacks=callbacks,
+                                       available_functions=available_functions, **kwargs)
+        stored = response.model_dump_json() if hasattr(response, "model_dump_json") else response
+        if isinstance(stored, str):
+            self.store.put(request_key(self.model, messages), self.model, messages, stored,
+                           1000 * (time.monotonic() - started), self.supports_function_calling())
+        return response
+
+    def supports_function_calling(self) -> bool:
+        return self.inner.supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self.inner.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.inner.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self.inner.get_token_usage_summary()
+
+
+_stores: Dict[str, RecordStore] = {}
+_stores_lock = threading.Lock()
+
+def get_record_store(path: Optional[str] = None) -> RecordStore:
+    """One store per file, shared by every LLM in the process."""
+    path = path or get_config()["llm_record_file"]
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = RecordStore(path)
+        return _stores[path]
+
+
+def build_offline_llm(model: str, temperature: float, backend: str) -> BaseLLM:
+    config = get_config()
+    latency, jitter = config["llm_synthetic_latency_ms"], config["llm_synthetic_jitter_ms"]
+    if backend == "replay":
+        return ReplayLLM(model, get_record_store(), temperature, latency, jitter, miss=config["llm_replay_miss"])
+    return TemplateLLM(model, temperature, latency, jitter)
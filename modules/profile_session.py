@@ -0,0 +1,258 @@
+# modules/profile_session.py
+"""
+Rule-based profile collection: consent, then age, gender, district and ethnicity, one per turn.
+
+This is the logic behind the User Profile Manager tool. The vocabularies (modules/
+profile_vocabulary.json: the 20 dzongkhags with their towns, common spellings and
+misspellings, ethnicities, gender words, consent words) are compiled once per process
+into word tries; an answer is tokenized once and matched in one pass, longest phrase
+first. A word of five or more letters that is one edit away from exactly one vocabulary
+word is read as that word ("Punaka", "Phuntsoling", "Lhotshamp").
+
+    session = ProfileSession({"consent_given": True})
+    session.respond("I'm 34")                 # gender_pending, profile {'consent_given': True, 'age': 34}
+    session.accepts("I live in samtsi")       # True: the whole answer is understood
+    session.accepts("Paro, but I can't sleep")  # False: left for the agent (and its crisis check)
+
+Replies keep the tool's contract: 'profile', 'message_for_agent', 'next_question_for_user'
+and 'status' (consent_pending, age_pending, gender_pending, location_pending,
+ethnicity_pending, complete, skipped_all, consent_denied). A skipped field is stored as
+None and not asked again. Towns are stored as their district (Phuentsholing -> Chukha).
+"""
+import json
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+VOCABULARY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profile_vocabulary.json")
+
+FIELDS = ("age", "gender", "location", "ethnicity")
+QUESTIONS = {
+    "consent": "To help me tailor recommendations, may I collect some basic profile information (age, gender, location, ethnicity)? Please say 'yes' or 'no'.",
+    "age": "What is your age? You can say 'skip'.",
+    "gender": "What is your gender (e.g., Male, Female, Non-binary)? You can say 'skip'.",
+    "location": "Which district in Bhutan are you located in (e.g., Thimphu, Paro)? You can say 'skip'.",
+    "ethnicity": "What is your ethnicity (e.g., Drukpa, Lhotshampa)? You can say 'skip'.",
+}
+_LABELS = {"age": "Age", "gender": "Gender", "location": "Location", "ethnicity": "Ethnicity"}
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_AGE = re.compile(r"^\d{1,3}$")
+_END = ""  # Trie key marking the end of a phrase
+_NEGATIONS = frozenset({"not", "no", "never", "don", "dont", "nope", "nor"})
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(str(text).lower())
+
+
+def _deletions(word: str) -> List[str]:
+    return [word[:i] + word[i + 1:] for i in range(len(word))]
+
+
+class Vocabulary:
+    """Phrases -> canonical values, as a trie over word tokens plus a one-edit deletion index for misspellings."""
+
+    def __init__(self, entries: Dict[str, Iterable[str]], min_fuzzy: int = 5):
+        self.trie: Dict[str, Any] = {}
+        self.min_fuzzy = min_fuzzy
+        words = set()
+        for value, aliases in entries.items():
+            for phrase in [value, *aliases]:
+                tokens = tokenize(phrase)
+                node = self.trie
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                if node.get(_END, value) != value:
+                    raise ValueError(f"{phrase!r} names both {node[_END]} and {value}")
+                node[_END] = value
+                words.update(tokens)
+        self.words = frozenset(words)
+        self._deletes: Dict[str, set] = {}
+        for word in self.words:
+            if len(word) >= min_fuzzy:
+                for key in (word, *_deletions(word)):
+                    self._deletes.setdefault(key, set()).add(word)
+
+    def correct(self, token: str) -> str:
+        """`token` itself if it is a vocabulary word, else the one vocabulary word within one edit of it, if any."""
+        if token in self.words or len(token) < self.min_fuzzy:
+            return token
+        candidates = self._deletes.get(token, set())  # A letter missing from `token` comes first
+        if not candidates:
+            candidates = set()
+            for key in _deletions(token):  # Then a letter too many, or one letter changed
+                candidates.update(self._deletes.get(key, ()))
+        return next(iter(candidates)) if len(candidates) == 1 else token
+
+    def find(self, tokens: List[str]) -> Optional[Tuple[str, int, int]]:
+        """First (value, start, end) match in `tokens`, taking the longest phrase at each start."""
+        return next(self.find_all(tokens), None)
+
+    def find_all(self, tokens: List[str]) -> Iterator[Tuple[str, int, int]]:
+        """Every non-overlapping (value, start, end) match in `tokens`, left to right."""
+        tokens = [self.correct(t) for t in tokens]
+        start = 0
+        while start < len(tokens):
+            node, match = self.trie, None
+            for end in range(start, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                if _END in node:
+                    match = (node[_END], start, end + 1)
+            if match is not None:
+                yield match
+                start = match[2]
+            else:
+                start += 1
+
+
+class ProfileVocabulary:
+    def __init__(self, data: Dict[str, Any]):
+        self.locations = Vocabulary(data["locations"])
+        self.ethnicities = Vocabulary(data["ethnicities"])
+        self.genders = Vocabulary(data["genders"])
+        self.consent = Vocabulary(data["consent"])
+        self.filler = frozenset(data.get("filler", []))
+
+    @classmethod
+    def load(cls, path: str = VOCABULARY_FILE) -> "ProfileVocabulary":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def parse(self, field: str, text: str) -> Tuple[Any, bool]:
+        """
+        (value, whole) for an answer to `field`: the value found (None if none) and whether
+        every other word of the answer is filler ("I live in", "years old").
+        """
+        tokens = tokenize(text)
+        if field == "age":
+            numbers = [i for i, t in enumerate(tokens) if _AGE.match(t)]
+            if not numbers:
+                return None, False
+            age = int(tokens[numbers[0]])
+            if not 0 < age <= 120:
+                return None, False
+            rest = tokens[:numbers[0]] + tokens[numbers[0] + 1:]
+            return age, len(numbers) == 1 and all(t in self.filler for t in rest)
+        vocabulary = {"gender": self.genders, "location": self.locations, "ethnicity": self.ethnicities}[field]
+        match = vocabulary.find(tokens)
+        if match is None:
+            return None, False
+        value, start, end = match
+        return value, all(t in self.filler for t in tokens[:start] + tokens[end:])
+
+    def consent_answer(self, text: str) -> Optional[bool]:
+        """
+        False if the answer contains a refusal ("no thanks", "no, I do not consent"); True only
+        when the whole answer is a consent phrase ("sure", "I consent"); None otherwise.
+        """
+        tokens = tokenize(text)
+        matches = list(self.consent.find_all(tokens))
+        if any(value == "no" for value, _, _ in matches):
+            return False
+        covered = {i for _, start, end in matches for i in range(start, end)}
+        if not matches or not all(i in covered or t in self.filler for i, t in enumerate(tokens)):
+            return None  # "not sure", "I am not okay with that": re-asked rather than read as a yes
+        return True
+
+
+_vocabulary: Optional[ProfileVocabulary] = None
+_vocabulary_lock = threading.Lock()
+
+def get_vocabulary() -> ProfileVocabulary:
+    global _vocabulary
+    if _vocabulary is None:
+        with _vocabulary_lock:
+            if _vocabulary is None:
+                _vocabulary = ProfileVocabulary.load()
+    return _vocabulary
+
+
+class ProfileSession:
+    def __init__(self, profile: Optional[Dict[str, Any]] = None):
+        self.profile = dict(profile or {})
+        self.vocabulary = get_vocabulary()
+
+    @classmethod
+    def resume(cls, profile: Optional[Dict[str, Any]]) -> Optional["ProfileSession"]:
+        """The session a stored profile is in the middle of (consent given, fields left to ask); None otherwise."""
+        session = cls(profile)
+        return session if session.profile.get("consent_given") is True and session.pending_field else None
+
+    @property
+    def pending_field(self) -> Optional[str]:
+        """The next field to ask; a field already answered or skipped (stored as None) is not asked again."""
+        return next((field for field in FIELDS if field not in self.profile), None)
+
+    def accepts(self, user_input: str) -> bool:
+        """True if `user_input` is wholly an answer to the pending field (or 'skip' / 'skip all')."""
+        field = self.pending_field
+        if field is None:
+            return False
+        text = user_input.lower().strip()
+        if text in ("skip", "skip all"):
+            return True
+        value, whole = self.vocabulary.parse(field, text)
+        return value is not None and whole
+
+    def _reply(self, status: str, message: str, question: Optional[str] = None) -> Dict[str, Any]:
+        return {'profile': dict(self.profile), 'message_for_agent': message,
+                'next_question_for_user': question, 'status': status}
+
+    def _next(self, message: str) -> Dict[str, Any]:
+        field = self.pending_field
+        if field is None:
+            if all(self.profile.get(f) is None for f in FIELDS):
+                message += " All details were skipped."
+            return self._reply('complete', message + " Profile collection complete.")
+        return self._reply(f'{field}_pending', f"{message} Now proceeding to {field}.", QUESTIONS[field])
+
+    def status(self) -> Dict[str, Any]:
+        """The reply for the current state, without changing it."""
+        consent = self.profile.get("consent_given")
+        if consent is None:
+            return self._reply('consent_pending', f"Please ask the user: '{QUESTIONS['consent']}'", QUESTIONS["consent"])
+        if consent is False:
+            return self._reply('consent_denied', "User denied consent. Profile collection will not proceed.")
+        field = self.pending_field
+        if field is None:
+            return self._reply('complete', "All profile information collected or explicitly skipped.")
+        return self._reply(f'{field}_pending', f"Please ask the user: '{QUESTIONS[field]}'", QUESTIONS[field])
+
+    def skip_all(self) -> Dict[str, Any]:
+        self.profile['consent_given'] = self.profile.get('consent_given', True)  # Assume consent if skipping all
+        for field in FIELDS:
+            self.profile[field] = None
+        return self._reply('skipped_all', "User chose to skip all profile questions. Profile collection is complete.")
+
+    def respond(self, user_input: str) -> Dict[str, Any]:
+        """One turn, as the tool receives it: a consent reply, an answer, 'skip' or 'skip all'."""
+        text = user_input.lower().strip()
+        if text == 'skip all':
+            return self.skip_all()
+
+        if 'consent_given' not in self.profile or self.profile['consent_given'] is None:
+            consent = self.vocabulary.consent_answer(text)
+            if consent is None:
+                return self.status()
+            self.profile['consent_given'] = consent
+            if not consent:
+                return self.status()
+            return self._next("Consent received.")
+
+        field = self.pending_field
+        if not self.profile['consent_given'] or field is None:
+            return self.status()
+        if text == 'skip':
+            self.profile[field] = None
+            return self._next(f"{_LABELS[field]} skipped.")
+        value, whole = self.vocabulary.parse(field, text)
+        if value is None or (not whole and _NEGATIONS.intersection(tokenize(text))):  # "not in thimphu"
+            reply = self.status()
+            reply['message_for_agent'] = f"Invalid {field} input. {reply['message_for_agent']}"
+            return reply
+        self.profile[field] = value
+        return self._next(f"Noted {field}: {value}.")
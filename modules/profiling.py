@@ -0,0 +1,195 @@
+# modules/profiling.py
+"""
+On-demand profiling of whole conversation turns.
+
+Ask for the next N turns to be profiled (PROFILE_TURNS at startup, or request_turns() /
+the "Profiling" sidebar control at runtime). Each profiled turn runs a sampling profiler
+over every thread (stage workers included) and takes tracemalloc snapshots before and
+after. Three files are written to PROFILE_DIR, named by session and turn:
+
+    <session>_turn<NNN>.txt     top functions by cumulative/self time and top allocation sites
+    <session>_turn<NNN>.folded  collapsed stacks (flamegraph.pl, speedscope)
+    <session>_turn<NNN>.json    the same summary, machine-readable
+
+Turns that aren't profiled pay one lock and one counter check.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from modules.config import get_config
+
+# Threads parked in these stdlib waits are idle workers, not part of the turn
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "socketserver.py", "thread.py")
+IDLE_FUNCTIONS = {"wait", "get", "select", "poll", "_worker", "serve_forever", "_wait_for_tstate_lock", "sleep"}
+
+
+class StackSampler:
+    """Samples the stacks of all other threads every `interval` seconds on a daemon thread."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+        self._started = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    @property
+    def period(self) -> float:
+        """Measured seconds per sample; well above `interval` when the GIL and stack walks delay the sampler."""
+        return self.elapsed / self.samples if self.samples and self.elapsed else self.interval
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def top_functions(self, limit: int) -> List[Dict[str, Any]]:
+        cumulative, own = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            for function in set(stack):
+                cumulative[function] += count
+            own[stack[-1]] += count
+        period = self.period
+        seconds = lambda n: round(n * period, 3)
+        return [{"function": f, "cumulative_s": seconds(n), "self_s": seconds(own[f])}
+                for f, n in cumulative.most_common(limit)]
+
+    def folded(self) -> str:
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+
+def _is_idle(frame) -> bool:
+    return os.path.basename(frame.f_code.co_filename) in IDLE_FILES and frame.f_code.co_name in IDLE_FUNCTIONS
+
+
+class TurnProfiler:
+    """Counts down the turns still to profile and writes one set of files per profiled turn."""
+
+    def __init__(self, turns: int = 0, directory: str = "profiles", top: int = 25, interval: float = 0.005):
+        self.directory, self.top, self.interval = directory, top, interval
+        self._remaining = turns
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> int:
+        return self._remaining
+
+    def request_turns(self, turns: int):
+        with self._lock:
+            self._remaining = max(0, turns)
+
+    def _claim(self) -> bool:
+        with self._lock:
+            if self._remaining <= 0:
+                return False
+            self._remaining -= 1
+            return True
+
+    @contextmanager
+    def profile_turn(self, session_id: str, turn: int):
+        """Profiles the enclosed turn if one was requested; yields the summary path or None."""
+        if not self._claim():
+            yield None
+            return
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()  # One frame per trace is enough for per-line sites and much cheaper
+        before = tracemalloc.take_snapshot()
+        sampler = StackSampler(self.interval)
+        sampler.start()
+        started = time.perf_counter()
+        base = os.path.join(self.directory, f"{_safe(session_id)}_turn{turn:03d}")
+        try:
+            yield f"{base}.txt"
+        finally:
+            elapsed = time.perf_counter() - started
+            sampler.stop()
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            self._write(base, session_id, turn, elapsed, sampler, before, after, peak)
+
+    def _write(self, base, session_id, turn, elapsed, sampler, before, after, peak):
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        growth = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+        summary = {
+            "session": session_id, "turn": turn, "elapsed_s": round(elapsed, 3),
+            "samples": sampler.samples, "interval_s": self.interval, "period_s": round(sampler.period, 5),
+            "traced_peak_mb": round(peak / 2**20, 1),
+            "top_functions": sampler.top_functions(self.top),
+            "top_allocations": [{"site": str(stat.traceback[0]), "size_kb": round(stat.size_diff / 1024, 1),
+                                 "count": stat.count_diff} for stat in growth[:self.top]],
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f"{base}.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        with open(f"{base}.folded", "w", encoding="utf-8") as f:
+            f.write(sampler.folded())
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(format_summary(summary))
+        print(f"📊 Turn {turn} of session {session_id} profiled: {base}.txt")
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    lines = [f"Session {summary['session']} turn {summary['turn']}: {summary['elapsed_s']}s, "
+             f"{summary['samples']} samples every {summary['period_s'] * 1000:.2f}ms "
+             f"(asked for {summary['interval_s'] * 1000:g}ms), "
+             f"traced peak {summary['traced_peak_mb']} MB", "",
+             f"{'cumulative s':>12} {'self s':>8}  function (all non-idle threads)"]
+    lines += [f"{f['cumulative_s']:>12.3f} {f['self_s']:>8.3f}  {f['function']}" for f in summary["top_functions"]]
+    lines += ["", f"{'KiB':>10} {'blocks':>8}  allocation site (growth during the turn)"]
+    lines += [f"{a['size_kb']:>10.1f} {a['count']:>8}  {a['site']}" for a in summary["top_allocations"]]
+    return "\n".join(lines) + "\n"
+
+
+def _safe(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(name))[:64]
+
+
+_profiler: Optional[TurnProfiler] = None
+_profiler_lock = threading.Lock()
+
+def get_profiler() -> TurnProfiler:
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                config = get_config()
+                _profiler = TurnProfiler(config["profile_turns"], config["profile_dir"], config["profile_top"],
+                                         config["profile_interval_ms"] / 1000)
+    return _profiler
+
+
+def profile_turn(session_id: str, turn: int):
+    return get_profiler().profile_turn(session_id, turn)
@@ -0,0 +1,68 @@
+# modules/registry.py
+import json
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class LazyRegistry:
+    """
+    Builds named objects (LLMs, agents, tasks, crews) on first use and memoizes them.
+
+    Factories are registered by name and called with keyword config; each distinct
+    (name, config) pair is built exactly once, even when several threads ask for it
+    at the same time.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[..., Any]] = {}
+        self._instances: Dict[Tuple[str, str], Any] = {}
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[..., Any] = None):
+        """Register a factory; usable directly or as a decorator."""
+        if factory is None:
+            return lambda f: self.register(name, f)
+        self._factories[name] = factory
+        return factory
+
+    def get(self, name: str, **config) -> Any:
+        if name not in self._factories:
+            raise KeyError(f"Nothing registered under '{name}'")
+        key = (name, json.dumps(config, sort_keys=True, default=str))
+        instance = self._instances.get(key)
+        if instance is not None:
+            return instance
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._instances:
+                self._instances[key] = self._factories[name](**config)
+            return self._instances[key]
+
+    def is_built(self, name: str, **config) -> bool:
+        return (name, json.dumps(config, sort_keys=True, default=str)) in self._instances
+
+    def built(self, name: str) -> List[Tuple[Dict[str, Any], Any]]:
+        """(config, instance) for everything already built under `name`; nothing is built."""
+        with self._lock:
+            items = list(self._instances.items())
+        return [(json.loads(key[1]), instance) for key, instance in items if key[0] == name]
+
+    def clear(self, name: str = None):
+        """Drop memoized instances (all of them, or only those built for `name`)."""
+        with self._lock:
+            for key in list(self._instances):
+                if name is None or key[0] == name:
+                    del self._instances[key]
+
+
+registry = LazyRegistry()
+
+def register(name: str):
+    """Decorator registering a factory in the process-wide registry."""
+    return registry.register(name)
+
+def get(name: str, **config) -> Any:
+    """Fetch (building on first use) an object from the process-wide registry."""
+    return registry.get(name, **config)
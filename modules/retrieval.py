@@ -0,0 +1,41 @@
+# modules/retrieval.py
+"""Retrieval from the Medicine Buddha FAISS store built by ingest.py."""
+from functools import lru_cache
+from typing import Optional
+
+from modules import metrics
+from modules.config import get_config
+
+# Condition-specific search terms appended to the user's own words
+CONDITION_QUERIES = {
+    "PHQ-9": "depression, low mood, loss of interest, hopelessness",
+    "GAD-7": "anxiety, worry, nervousness, restlessness",
+    "DAST-10": "substance use, drug dependence, recovery from addiction",
+    "General Well-being": "stress, well-being, balance, mindfulness",
+    "Other": "mental well-being, healing, compassion",
+}
+
+
+@lru_cache(maxsize=2)
+def load_vectorstore(path: str, embedding_model: str):
+    """Loads the FAISS index once per process (embedding model included)."""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from langchain_community.vectorstores import FAISS
+    embeddings = HuggingFaceEmbeddings(model_name=embedding_model, model_kwargs={'device': 'cpu'})
+    return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+
+def retrieve_context(user_query: str, condition: Optional[str] = None, k: Optional[int] = None) -> str:
+    """Top-k passages for the query (and condition) joined into one string; '' if the store is unavailable."""
+    config = get_config()
+    query = user_query
+    if condition:
+        query = f"{user_query} ({CONDITION_QUERIES.get(condition, condition)})"
+    try:
+        with metrics.stage("retrieval", model=config["rag_embedding_model"]):
+            store = load_vectorstore(config["vectorstore_path"], config["rag_embedding_model"])
+            documents = store.similarity_search(query, k=k or config["retrieval_top_k"])
+    except Exception as e:
+        print(f"⚠️ Knowledge base retrieval unavailable: {e}")
+        return ""
+    return "\n\n".join(doc.page_content for doc in documents)
@@ -0,0 +1,144 @@
+# modules/routing.py
+"""
+Per-stage model routing with latency targets.
+
+Each pipeline stage is assigned a model tier, a target p95 latency, a request timeout,
+a gateway lane and (optionally) a fallback tier used when the primary call times out.
+Tiers and routes can be overridden from modules/config (LLM_TIERS / LLM_ROUTES, JSON).
+
+Every routed call is recorded so tiers can be re-tuned from data:
+    python -m modules.routing routing_log.jsonl
+"""
+import argparse
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional
+
+from modules.config import get_config
+from modules.llm_gateway import QueueTimeout
+
+DEFAULT_TIERS = {
+    "lite": "gemini/gemini-2.0-flash-lite",
+    "fast": "gemini/gemini-2.0-flash",
+    "standard": "gemini/gemini-2.5-flash",
+}
+
+# Trivial jobs (restating a label, extracting a field) go to the lite tier; only the
+# final recommendation needs the strongest model.
+DEFAULT_ROUTES = {
+    "crisis_detection":         {"tier": "fast",     "p95_ms": 4000,  "timeout_s": 8,  "fallback": "lite", "lane": "crisis"},
+    "condition_classification": {"tier": "lite",     "p95_ms": 2500,  "timeout_s": 6,  "fallback": None,   "lane": "interactive"},
+    "profile_retrieval":        {"tier": "lite",     "p95_ms": 2500,  "timeout_s": 6,  "fallback": None,   "lane": "interactive"},
+    "profile_collection":       {"tier": "lite",     "p95_ms": 3000,  "timeout_s": 8,  "fallback": None,   "lane": "interactive"},
+    "rag_retrieval":            {"tier": "fast",     "p95_ms": 5000,  "timeout_s": 12, "fallback": "lite", "lane": "interactive"},
+    "assessment":               {"tier": "lite",     "p95_ms": 3000,  "timeout_s": 8,  "fallback": None,   "lane": "interactive"},
+    "recommendation":           {"tier": "standard", "p95_ms": 15000, "timeout_s": 30, "fallback": "fast", "lane": "interactive"},
+}
+DEFAULT_ROUTE = {"tier": "fast", "p95_ms": 5000, "timeout_s": 15, "fallback": "lite", "lane": "interactive"}
+
+
+def get_tiers() -> Dict[str, str]:
+    return {**DEFAULT_TIERS, **get_config()["llm_tiers"]}
+
+
+def get_route(stage: str) -> Dict[str, Any]:
+    """The routing entry for `stage`, with config overrides applied on top of the defaults."""
+    overrides = get_config()["llm_routes"]
+    return {**DEFAULT_ROUTE, **DEFAULT_ROUTES.get(stage, {}), **overrides.get(stage, {})}
+
+
+def get_stage_model(stage: str) -> str:
+    """The model name the stage's primary tier resolves to."""
+    return get_tiers().get(get_route(stage)["tier"], "")
+
+
+def is_timeout(error: BaseException) -> bool:
+    """
+    True for provider and request timeouts (httpx, litellm, google-genai, the standard library).
+    Not for the gateway's own queue wait: the request was never sent, and retrying it on the
+    fallback tier would only add load to a full bucket.
+    """
+    if isinstance(error, QueueTimeout):
+        return False
+    if isinstance(error, TimeoutError):
+        return True
+    return any("timeout" in cls.__name__.lower() for cls in type(error).__mro__)
+
+
+class RoutingRecorder:
+    """Keeps recent routing decisions in memory and optionally appends them to a JSONL file."""
+
+    def __init__(self, path: str = "", keep: int = 5000):
+        self.path = path
+        self._records = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, tier: str, model: str, latency_ms: float, outcome: str, p95_ms: float):
+        entry = {
+            "ts": round(time.time(), 3), "stage": stage, "tier": tier, "model": model,
+            "latency_ms": round(latency_ms, 1), "outcome": outcome, "p95_ms": p95_ms,
+        }
+        with self._lock:
+            self._records.append(entry)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    def records(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._records)
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per stage and tier: calls, observed p50/p95, SLO breaches, timeouts and fallbacks."""
+    groups = defaultdict(list)
+    for r in records:
+        groups[(r["stage"], r["tier"])].append(r)
+    summary = {}
+    for (stage, tier), rows in sorted(groups.items()):
+        latencies = sorted(r["latency_ms"] for r in rows)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * (len(latencies) - 1) + 0.5))]
+        target = rows[-1]["p95_ms"]
+        summary[f"{stage}/{tier}"] = {
+            "calls": len(rows),
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": p95,
+            "target_p95_ms": target,
+            "over_target": sum(1 for r in rows if r["latency_ms"] > target),
+            "timeouts": sum(1 for r in rows if r["outcome"] == "timeout"),
+            "fallbacks": sum(1 for r in rows if r["outcome"] == "fallback"),
+            "errors": sum(1 for r in rows if r["outcome"] == "error"),
+            "meets_target": p95 <= target,
+        }
+    return summary
+
+
+_recorder: Optional[RoutingRecorder] = None
+_recorder_lock = threading.Lock()
+
+def get_recorder() -> RoutingRecorder:
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = RoutingRecorder(get_config()["routing_log_file"])
+    return _recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize routed LLM latencies against their p95 targets.")
+    parser.add_argument("log_file", help="JSONL file written with ROUTING_LOG_FILE set")
+    args = parser.parse_args()
+
+    with open(args.log_file, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    for key, s in summarize(records).items():
+        verdict = "ok" if s["meets_target"] else "OVER TARGET - consider a faster tier"
+        print(f"{key:<36} calls={s['calls']:<5} p50={s['p50_ms']:>8.0f}ms p95={s['p95_ms']:>8.0f}ms "
+              f"target={s['target_p95_ms']:>6}ms timeouts={s['timeouts']} fallbacks={s['fallbacks']}  {verdict}")
+
+
+if __name__ == "__main__":
+    main()
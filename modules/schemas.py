@@ -0,0 +1,13 @@
+# modules/schemas.py
+from typing import Optional
+from pydantic import BaseModel, Field
+
+# ======================= OUTPUT SCHEMAS =======================
+class CrisisDetectionOutput(BaseModel):
+    is_crisis: bool = Field(description="True if the query indicates a mental health crisis.")
+    explanation: str = Field(description="Reason for classifying as crisis or not.")
+
+class MentalConditionOutput(BaseModel):
+    condition: str = Field(description="The classified mental health condition or concern (e.g., 'PHQ-9', 'GAD-7', 'DAST-10', 'General Well-being', 'Other').")
+    rationale: str = Field(description="Why the classification was made.")
+    confidence: Optional[float] = Field(default=None, description="Classifier confidence between 0 and 1, if available.")
@@ -0,0 +1,175 @@
+# modules/scoring.py
+"""
+Questionnaire scoring keyed by item id.
+
+The front ends record each answer under its item id as it arrives (`capture`), so a score
+is one pass over the answers with one dict lookup per answer. Answers stored the old way,
+keyed by question text, are re-keyed once through the registry's text index (`by_item_id`)
+instead of scanning every key for every question.
+
+`exact=True` scores the way the chat front ends' old scorers did: only a scale label such as
+"Several days" (surrounding spaces aside) counts, and anything else scores 0. Without it,
+answers are normalized through the registry, so "several days", "1" or "y" score too.
+
+    responses = {}
+    capture(responses, "PHQ-9", "1. Little interest or pleasure in doing things?", "Several days")
+    score_responses("PHQ-9", responses)   # 1
+
+    python -m modules.scoring --assessments 20000   # micro-benchmark against the substring scan
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from modules.instruments import Instrument, get_instrument, get_instruments, normalize_answer
+
+
+def capture(responses: Dict[str, str], condition: str, question: str, answer: str) -> Optional[str]:
+    """Stores `answer` under the item id of `question`; returns the id (None if it isn't an item of `condition`)."""
+    instrument = get_instrument(condition)
+    item_id = instrument.item_id(question) if instrument is not None else None
+    if item_id is not None:
+        responses[item_id] = answer.strip()
+    return item_id
+
+
+def by_item_id(instrument: Instrument, answers: Mapping[str, Any]) -> Dict[str, Any]:
+    """Re-keys answers keyed by question text (or already by id) by item id; other keys are dropped."""
+    responses = {}
+    for key, answer in answers.items():
+        item_id = instrument.item_id(key)
+        if item_id is not None and item_id not in responses:
+            responses[item_id] = answer
+    return responses
+
+
+def score(instrument: Instrument, responses: Mapping[str, Any], exact: bool = False) -> int:
+    """Total of answers keyed by item id; answers that aren't on the scale (or labels, if `exact`) count 0."""
+    positions = instrument.positions
+    total = 0
+    if exact:
+        labels = instrument.labels
+        for item_id, answer in responses.items():
+            if item_id in positions:
+                total += labels.get(str(answer).strip(), 0)
+        return total
+    values = instrument.responses
+    for item_id, answer in responses.items():
+        if item_id in positions:
+            value = values.get(answer)
+            total += value if value is not None else values.get(normalize_answer(answer), 0)
+    return total
+
+
+def score_responses(condition: str, responses: Mapping[str, Any], exact: bool = False) -> Optional[int]:
+    """Score of item-id-keyed answers; None for unscored question sets (General Well-being, Other)."""
+    instrument = get_instrument(condition)
+    if instrument is None or not instrument.scored:
+        return None
+    return score(instrument, responses, exact)
+
+
+def score_answers(condition: str, answers: Mapping[str, Any], exact: bool = False) -> Optional[int]:
+    """Score of answers keyed by question text (as stored before item ids) or item id."""
+    instrument = get_instrument(condition)
+    if instrument is None or not instrument.scored:
+        return None
+    return score(instrument, by_item_id(instrument, answers), exact)
+
+
+# --- Micro-benchmark ---
+
+def _substring_scan(name: str, questions: List[str], answers: Mapping[str, str]) -> int:
+    """The previous new_flow/utils.py scorer: every question scans every answer key for its text."""
+    score_map = _LABELS[name]
+    total = 0
+    for i in range(1, len(questions)):
+        question_text_prefix = questions[i].split('. ', 1)[0]  # Unused, but it was paid for on every question
+        found_question_key = None
+        for key in answers.keys():
+            if questions[i] in key:
+                found_question_key = key
+                break
+        if found_question_key:
+            total += score_map.get(answers.get(found_question_key, "").strip(), 0)
+    return total
+
+
+_LABELS = {
+    "PHQ-9": {"Not at all": 0, "Several days": 1, "More than half the days": 2, "Nearly every day": 3},
+    "GAD-7": {"Not at all": 0, "Several days": 1, "More than half the days": 2, "Nearly every day": 3},
+    "DAST-10": {"Yes": 1, "No": 0},
+}
+
+# What users actually type besides the labels: the old scorer gave all of these 0
+_FREE_TEXT = {
+    "PHQ-9": ["1", "3", "more than half", "several days", "Several days ", "nearly every", "sometimes"],
+    "GAD-7": ["1", "3", "more than half", "several days", "Several days ", "nearly every", "sometimes"],
+    "DAST-10": ["y", "n", "yes", "YES", "1", "true", "maybe"],
+}
+
+
+def stored_assessments(count: int, shuffled: bool = False, seed: int = 7, free_text: float = 0.0) -> List[Dict[str, Any]]:
+    """
+    Completed assessments as the chat front ends stored them: answers keyed by question prompt,
+    in question order unless `shuffled` (e.g. after a JSON round trip through another store).
+    A `free_text` share of answers are typed variants (_FREE_TEXT) instead of scale labels.
+    """
+    rng = random.Random(seed)
+    registry = get_instruments()
+    assessments = []
+    for _ in range(count):
+        name = rng.choice(list(_LABELS))
+        labels = list(_LABELS[name])
+        items = list(registry[name].items)
+        if shuffled:
+            rng.shuffle(items)
+        answers = {item.prompt: rng.choice(_FREE_TEXT[name] if rng.random() < free_text else labels) for item in items}
+        assessments.append({"condition": name, "answers": answers})
+    return assessments
+
+
+def benchmark(count: int, shuffled: bool = False, free_text: float = 0.1) -> Dict[str, float]:
+    assessments = stored_assessments(count, shuffled, free_text=free_text)
+    registry = get_instruments()
+    for a in assessments:  # Re-keyed once, as capture() would have stored them
+        a["responses"] = by_item_id(registry[a["condition"]], a["answers"])
+
+    def timed(fn) -> Tuple[float, List[int]]:
+        started = time.perf_counter()
+        scores = [fn(a) for a in assessments]
+        return time.perf_counter() - started, scores
+
+    questions = registry.legacy_questions()
+    scan_s, expected = timed(lambda a: _substring_scan(a["condition"], questions[a["condition"]], a["answers"]))
+    text_s, by_text = timed(lambda a: score_answers(a["condition"], a["answers"], exact=True))
+    id_s, by_id = timed(lambda a: score_responses(a["condition"], a["responses"], exact=True))
+    _, normalized = timed(lambda a: score_responses(a["condition"], a["responses"]))
+    mismatches = sum(x != y for x, y in zip(expected, by_text)) + sum(x != y for x, y in zip(expected, by_id))
+    return {"assessments": count, "substring_scan_s": scan_s, "text_keyed_s": text_s, "id_keyed_s": id_s,
+            "mismatches": mismatches, "normalized_differ": sum(x != y for x, y in zip(expected, normalized))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scores stored assessments with the substring scan and the indexed scorer.")
+    parser.add_argument("--assessments", type=int, default=20000, help="Number of stored assessments to score")
+    parser.add_argument("--free-text", type=float, default=0.1, help="Share of answers typed as free text instead of a scale label")
+    args = parser.parse_args()
+
+    for shuffled in (False, True):
+        result = benchmark(args.assessments, shuffled, args.free_text)
+        per = lambda seconds: seconds / result["assessments"] * 1e6
+        order = "answers out of question order" if shuffled else "answers in question order"
+        print(f"=== Scoring {result['assessments']} stored PHQ-9/GAD-7/DAST-10 assessments, {order} ===")
+        print(f"{'scorer':<34}{'total ms':>10}{'µs each':>10}{'speedup':>9}")
+        for label, key in (("substring scan (old)", "substring_scan_s"), ("indexed, keyed by question text", "text_keyed_s"),
+                           ("indexed, keyed by item id", "id_keyed_s")):
+            print(f"{label:<34}{result[key] * 1000:>10.1f}{per(result[key]):>10.2f}"
+                  f"{result['substring_scan_s'] / result[key]:>8.1f}x")
+        print(f"Scores that differ from the old scorer: {result['mismatches']} "
+              f"(normalized scoring, which also counts free text: {result['normalized_differ']})\n")
+
+
+if __name__ == "__main__":
+    main()
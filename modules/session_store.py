@@ -0,0 +1,194 @@
+# modules/session_store.py
+"""
+Server-side profile and assessment state, kept under a session id.
+
+run_crew_turn loads a session's states from the store and hands the crew only a short
+reference ("session:1a2b3c4d") for the tools plus one-line views for the prompts. The
+User Profile Manager and Administer Questionnaire tools resolve the reference, update
+the state and write it back, so the full JSON never goes through an LLM prompt.
+
+    store = get_session_store()
+    store.put("1a2b3c4d", "profile", {"consent_given": True, "age": 29})
+    state, session_id = resolve("session:1a2b3c4d", "profile")
+
+Two backends: "memory" (one process, the default) and "sqlite" (SESSION_DB, shared by
+every process on the host, for multi-worker deployments). A session not written for
+SESSION_TTL seconds reads as empty, and writes prune expired sessions at most once a minute.
+"""
+import copy
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from modules.config import get_config
+from modules.structured_logging import get_logger
+
+KINDS = ("profile", "assessment")
+REFERENCE_PREFIX = "session:"
+PRUNE_INTERVAL = 60  # Seconds between the prunes writes trigger
+
+log = get_logger("session_store")
+
+
+class _Expiring:
+    """TTL bookkeeping shared by the stores: `ttl` seconds since the last write (0: never expire)."""
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self._pruned = time.monotonic()
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl if self.ttl > 0 else float("-inf")
+
+    def _maybe_prune(self):
+        if self.ttl > 0 and time.monotonic() - self._pruned >= PRUNE_INTERVAL:
+            self._pruned = time.monotonic()
+            self.prune(self.ttl)
+
+
+class MemorySessionStore(_Expiring):
+    def __init__(self, ttl: float = 0):
+        super().__init__(ttl)
+        self._states: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, kind: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._states.get((session_id, kind))
+        return copy.deepcopy(entry[1]) if entry and entry[0] >= self._cutoff() else {}
+
+    def put(self, session_id: str, kind: str, state: Dict[str, Any]):
+        state = copy.deepcopy(state or {})  # Callers keep mutating their own dicts
+        with self._lock:
+            self._states[(session_id, kind)] = (time.time(), state)
+        self._maybe_prune()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            for kind in KINDS:
+                self._states.pop((session_id, kind), None)
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Drops sessions not written for `max_age_seconds`; returns how many states were dropped."""
+        cutoff = time.time() - max_age_seconds
+        with self._lock:
+            stale = [key for key, (updated, _) in self._states.items() if updated < cutoff]
+            for key in stale:
+                del self._states[key]
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "sessions": len({sid for sid, _ in self._states})}
+
+
+class SQLiteSessionStore(_Expiring):
+    """One row per (session, kind); one connection per thread, WAL so readers don't block the writer."""
+
+    def __init__(self, path: str, ttl: float = 0):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS session_state (session_id TEXT NOT NULL, kind TEXT NOT NULL, "
+                         "state TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (session_id, kind))")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str, kind: str) -> Dict[str, Any]:
+        row = self._connection().execute("SELECT state FROM session_state WHERE session_id = ? AND kind = ? AND updated_at >= ?",
+                                         (session_id, kind, self._cutoff())).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def put(self, session_id: str, kind: str, state: Dict[str, Any]):
+        with self._connection() as conn:
+            conn.execute("INSERT INTO session_state (session_id, kind, state, updated_at) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (session_id, kind) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                         (session_id, kind, json.dumps(state or {}, separators=(",", ":")), time.time()))
+        self._maybe_prune()
+
+    def delete(self, session_id: str):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+
+    def prune(self, max_age_seconds: float) -> int:
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM session_state WHERE updated_at < ?", (time.time() - max_age_seconds,)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        sessions = self._connection().execute("SELECT COUNT(DISTINCT session_id) FROM session_state").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "sessions": sessions}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_session_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = get_config()
+                if config["session_store"] == "sqlite":
+                    _store = SQLiteSessionStore(config["session_db"], ttl=config["session_ttl"])
+                else:
+                    _store = MemorySessionStore(ttl=config["session_ttl"])
+    return _store
+
+
+def reference(session_id: str) -> str:
+    return REFERENCE_PREFIX + session_id
+
+
+def resolve(value, kind: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    (state, session id) for a tool's state argument: a session reference is loaded from the
+    store; a JSON string (the older form) is parsed, with session id None.
+    """
+    if isinstance(value, dict):
+        return value, None
+    value = (value or "").strip()
+    if value.startswith(REFERENCE_PREFIX):
+        session_id = value[len(REFERENCE_PREFIX):]
+        return get_session_store().get(session_id, kind), session_id
+    try:
+        state = json.loads(value) if value else {}
+    except json.JSONDecodeError:
+        log.warning("unreadable %s state, starting from an empty one", kind, extra={"fields": {"state": value[:200]}})
+        return {}, None
+    return (state if isinstance(state, dict) else {}), None
+
+
+def profile_view(profile: Dict[str, Any]) -> str:
+    """The profile as one short line for prompts, e.g. 'age 29, Female, Samtse, Lhotshampa'."""
+    if not profile or profile.get("consent_given") is None:
+        return "not collected"
+    if profile.get("consent_given") is False:
+        return "consent_denied"
+    values = [f"age {profile['age']}" if profile.get("age") is not None else None,
+              profile.get("gender"), profile.get("location"), profile.get("ethnicity")]
+    if all(v is None for v in values):
+        return "skipped_all"
+    return ", ".join(v for v in values if v is not None)
+
+
+def assessment_view(state: Dict[str, Any]) -> str:
+    """The assessment as one short line for prompts, e.g. 'PHQ-9 complete: 12 (Moderate depression)'."""
+    from modules.assessment_session import AssessmentSession
+    if not state or not state.get("assessment_name"):
+        return "none"
+    reply = AssessmentSession(state["assessment_name"], state).status()
+    if reply["status"] == "complete":
+        return f"{reply['assessment_name']} complete: {reply['total_score']} ({reply['interpretation']})"
+    if reply["status"] == "q_pending":
+        return f"{reply['assessment_name']} in progress, question {reply['current_q_idx'] + 1}"
+    return f"{reply['assessment_name']} {reply['status']}"
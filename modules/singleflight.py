@@ -0,0 +1,98 @@
+# modules/singleflight.py
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from modules import metrics, tracing
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one.
+
+    The first caller for a key runs the function; callers arriving while it is still
+    running wait for it and get the same result (or exception). Nothing is kept once the
+    call finishes, so a cache in front of or behind `do()` still decides what is reused.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        metrics.cache_result("singleflight", hit=not leader)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+def inputs_key(name: str, inputs: Dict[str, Any]) -> tuple:
+    """(name, hash of the canonicalized inputs): key order and whitespace around strings don't matter."""
+    canonical = json.dumps(_canonicalize(inputs), sort_keys=True, separators=(",", ":"), default=str)
+    return name, hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _canonicalize(value):
+    if isinstance(value, dict):
+        return {str(k): _canonicalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonicalize(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+_flights = SingleFlight()
+
+def get_singleflight() -> SingleFlight:
+    """Returns the process-wide SingleFlight shared by all crews and classifiers."""
+    return _flights
+
+def kickoff(name: str, crew, inputs: Dict[str, Any]):
+    """`crew.kickoff(inputs=inputs)`, sharing the result with identical concurrent kickoffs."""
+    with tracing.span(name, "crew") as current:
+        if current is not None:
+            current.set_input(inputs)
+        result = _flights.do(inputs_key(name, inputs), lambda: crew.kickoff(inputs=inputs))
+        if current is not None:
+            current.set_output(getattr(result, "raw", result))
+        return result
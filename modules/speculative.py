@@ -0,0 +1,114 @@
+# modules/speculative.py
+"""
+Speculative work started while the user is still answering the questionnaire.
+
+As soon as the condition is classified, everything the recommendation needs except the
+score (profile, knowledge-base retrieval, the score-independent crew inputs) is prepared
+in the background. When the last answer arrives only the score-dependent inputs remain.
+"""
+import contextvars
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from modules import metrics
+from modules.config import get_config
+from modules.retrieval import retrieve_context
+
+
+def recommendation_prefix(user_query: str, condition: str, user_profile: Dict[str, Any],
+                          retrieved_data: str) -> Dict[str, str]:
+    """The recommendation crew inputs that don't depend on the assessment answers or score."""
+    return {
+        "user_query": user_query,
+        "user_profile": json.dumps(user_profile),
+        "retrieved_data": retrieved_data or "No specific data retrieved",
+        "classified_condition": condition,
+    }
+
+
+class Speculation:
+    """A set of named background jobs for one conversation turn; cancel() discards them all."""
+
+    def __init__(self, executor: ThreadPoolExecutor):
+        self._executor = executor
+        self._futures: Dict[str, Future] = {}
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def submit(self, name: str, fn: Callable, *args) -> Future:
+        future = self._executor.submit(contextvars.copy_context().run, fn, *args)
+        self._futures[name] = future
+        return future
+
+    def get(self, name: str, timeout: Optional[float] = None, default=None):
+        """The job's result, or `default` if it was cancelled, failed or isn't done within `timeout`."""
+        future = self._futures.get(name)
+        if future is None or self.cancelled:
+            metrics.cache_result(f"speculation_{name}", hit=False)
+            return default
+        try:
+            result = future.result(timeout=timeout)
+        except Exception as e:
+            print(f"⚠️ Speculative {name} not used: {str(e) or type(e).__name__}")
+            metrics.cache_result(f"speculation_{name}", hit=False)
+            return default
+        metrics.cache_result(f"speculation_{name}", hit=True)
+        return result
+
+    def cancel(self):
+        """Drops queued jobs; jobs already running finish but their results are ignored."""
+        self._cancelled.set()
+        for future in self._futures.values():
+            future.cancel()
+
+
+def speculate_recommendation(user_query: str, condition: str,
+                             profile_fn: Callable[[], Dict[str, Any]]) -> Speculation:
+    """
+    Starts profile lookup and retrieval in parallel; 'prefix' resolves once both are done.
+
+    `profile_fn` runs on a worker thread, so it must not touch UI/session state.
+    """
+    speculation = Speculation(get_executor())
+    profile = speculation.submit("profile", profile_fn)
+    retrieval = speculation.submit("retrieval", retrieve_context, user_query, condition)
+
+    # Assembled in whichever callback completes last, so it never occupies a worker while waiting
+    prefix = speculation._futures["prefix"] = Future()
+    remaining = [2]
+    lock = threading.Lock()
+
+    def _assemble(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        if speculation.cancelled or not prefix.set_running_or_notify_cancel():
+            return
+        try:
+            prefix.set_result(recommendation_prefix(user_query, condition, profile.result(), retrieval.result()))
+        except BaseException as e:
+            prefix.set_exception(e)
+
+    profile.add_done_callback(_assemble)
+    retrieval.add_done_callback(_assemble)
+    return speculation
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for speculative work, sized from modules/config."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_config()["speculation_workers"],
+                                               thread_name_prefix="speculative")
+    return _executor
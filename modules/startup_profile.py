@@ -0,0 +1,81 @@
+# modules/startup_profile.py
+"""
+Import-time breakdown for the chatbot entry points (cold start tracking).
+
+Usage (from the repository root):
+    python -m modules.startup_profile                      # default entry points
+    python -m modules.startup_profile crew new_agents.core --top 15
+
+Each target is imported in a fresh interpreter with `python -X importtime`, so
+results are not skewed by modules already loaded in this process.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# crew / new_agents.core back the CLI flows, modules.chatbot the refactored flow
+DEFAULT_TARGETS = ["modules.chatbot", "crew", "new_agents.core"]
+
+
+def profile_import(target: str) -> List[Tuple[str, int, int]]:
+    """Import `target` in a subprocess and return (module, self_us, cumulative_us) rows."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([REPO_ROOT, os.path.join(REPO_ROOT, "new_flow"), env.get("PYTHONPATH", "")])
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+        raise RuntimeError(f"importing {target} failed: {last_line}")
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def summarize(rows: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Self time per top-level package, which is what decides whether a dependency is worth deferring."""
+    per_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        per_package[name.strip().split(".")[0]] += self_us
+    return per_package
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print an import-time breakdown for DrukCare entry points.")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS, help="Modules to import")
+    parser.add_argument("--top", type=int, default=10, help="Rows to show per section")
+    args = parser.parse_args()
+
+    for target in args.targets:
+        print(f"\n=== import {target} ===")
+        try:
+            rows = profile_import(target)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            continue
+
+        total_us = sum(self_us for _, self_us, _ in rows)
+        print(f"Total: {total_us / 1000:.1f} ms across {len(rows)} modules")
+
+        print(f"\nTop {args.top} packages by self time:")
+        for package, self_us in sorted(summarize(rows).items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+            print(f"  {self_us / 1000:9.1f} ms  {package}")
+
+        print(f"\nTop {args.top} modules by cumulative time:")
+        for name, _, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+            print(f"  {cumulative_us / 1000:9.1f} ms  {name.strip()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# modules/structured_logging.py
+"""
+Asynchronous JSON-lines logging.
+
+Request threads only put records on a bounded queue; one background thread formats them
+and writes LOG_FILE, rotating it at LOG_MAX_BYTES or every LOG_ROTATE_SECONDS (whichever
+comes first) and keeping LOG_BACKUPS old files. Under pressure debug records are dropped
+instead of blocking the request; other records wait at most a few milliseconds. Each
+record carries the current trace/span id (modules/tracing.py) when there is one.
+
+    log = get_logger("tools")
+    log.debug("vector_db_operations called", extra={"fields": {"operation": "query"}})
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
+from modules import metrics
+from modules.config import get_config
+
+MAX_FIELD_CHARS = 2000  # Long task outputs are cut so one record stays one readable line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("trace_id", "span_id"):
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        for key, value in (getattr(record, "fields", None) or {}).items():
+            if isinstance(value, str) and len(value) > MAX_FIELD_CHARS:
+                value = value[:MAX_FIELD_CHARS] + "…"
+            entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler (numbered backups) that also rolls over every `interval` seconds."""
+
+    def __init__(self, filename: str, max_bytes: int, interval: float, backups: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval if interval else None
+
+    def shouldRollover(self, record) -> bool:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        super().doRollover()
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Enqueues without blocking the caller for long; counts what it had to drop."""
+
+    def __init__(self, log_queue: queue.Queue, debug_high_water: float = 0.8, put_timeout: float = 0.005):
+        super().__init__(log_queue)
+        self.debug_limit = int(log_queue.maxsize * debug_high_water) if log_queue.maxsize else None
+        self.put_timeout = put_timeout
+        self.dropped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        from modules.tracing import current_span
+        span = current_span()
+        if span is not None:
+            record.trace_id, record.span_id = span.trace_id, span.span_id
+        # Format the message now (arguments may change later) but leave JSON formatting to the writer
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.debug_limit is not None and record.levelno <= logging.DEBUG and self.queue.qsize() >= self.debug_limit:
+            self._drop(record)
+            return
+        try:
+            self.queue.put(record, timeout=self.put_timeout)
+        except queue.Full:
+            self._drop(record)
+
+    def _drop(self, record: logging.LogRecord):
+        with self._lock:
+            self.dropped[record.levelname.lower()] = self.dropped.get(record.levelname.lower(), 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"queued": self.queue.qsize(), "capacity": self.queue.maxsize, "dropped": dict(self.dropped)}
+
+
+_handler: Optional[BoundedQueueHandler] = None
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+def setup_logging() -> Optional[BoundedQueueHandler]:
+    """Attaches the queue handler to the 'drukcare' logger and starts the writer thread, once."""
+    global _handler, _listener
+    if _handler is None:
+        with _setup_lock:
+            if _handler is None:
+                config = get_config()
+                root = logging.getLogger("drukcare")
+                root.setLevel(getattr(logging, config["log_level"].upper(), logging.INFO))
+                root.propagate = False
+                handler = BoundedQueueHandler(queue.Queue(maxsize=config["log_queue_size"]))
+                if config["log_file"]:
+                    directory = os.path.dirname(config["log_file"])
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    writer = SizeAndTimeRotatingFileHandler(config["log_file"], config["log_max_bytes"],
+                                                            config["log_rotate_seconds"], config["log_backups"])
+                    writer.setFormatter(JsonFormatter())
+                    _listener = QueueListener(handler.queue, writer, respect_handler_level=False)
+                    _listener.start()
+                    atexit.register(_listener.stop)  # Flushes what is still queued
+                    root.addHandler(handler)
+                else:
+                    root.addHandler(logging.NullHandler())
+                _handler = handler
+    return _handler
+
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(f"drukcare.{name}")
+
+
+def logging_stats() -> Dict[str, Any]:
+    handler = setup_logging()
+    return handler.stats() if handler is not None else {}
+
+
+def _dropped_lines():
+    lines = ["# HELP drukcare_log_records_dropped_total Log records dropped because the log queue was full.",
+             "# TYPE drukcare_log_records_dropped_total counter"]
+    for level, count in sorted(logging_stats().get("dropped", {}).items()):
+        lines.append(f'drukcare_log_records_dropped_total{{level="{level}"}} {count}')
+    return lines
+
+metrics.register_collector(_dropped_lines)
+
+
+# --- crewai task log (replaces Crew(output_log_file=...)) ---
+_logged_crews = set()
+_hooks_installed = False
+
+def log_crew_tasks(crew):
+    """Logs the start and completion of every task `crew` runs; returns the crew."""
+    global _hooks_installed
+    _logged_crews.add(id(crew))
+    with _setup_lock:
+        if not _hooks_installed:
+            from crewai.hooks import InterceptionPoint, register_hook
+            register_hook(InterceptionPoint.PRE_STEP, lambda ctx: _log_step(ctx, "started"))
+            register_hook(InterceptionPoint.POST_STEP, lambda ctx: _log_step(ctx, "completed"))
+            _hooks_installed = True
+    return crew
+
+
+def _log_step(ctx, status: str):
+    agent = getattr(ctx, "agent", None)
+    if getattr(ctx, "kind", None) != "task" or id(getattr(agent, "crew", None)) not in _logged_crews:
+        return None
+    task = ctx.task
+    fields = {"event": "task", "task_name": getattr(task, "name", None), "task": getattr(task, "description", ""),
+              "agent": getattr(ctx, "agent_role", None), "status": status}
+    if status == "completed":
+        fields["output"] = getattr(ctx.output, "raw", ctx.output)
+    get_logger("crew").info(f"task {status}", extra={"fields": fields})
+    return None
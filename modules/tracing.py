@@ -0,0 +1,301 @@
+# modules/tracing.py
+"""
+Local tracer: nested spans (turn -> stage -> crew -> task -> tool / LLM call) without LangSmith.
+
+The current span lives in a contextvar, so spans nest across function calls without being
+passed around; work handed to another thread keeps its parent when submitted with
+`contextvars.copy_context().run`. Finished spans go to an in-memory ring buffer and, with
+TRACE_FILE set, to a size-rotated JSONL file. Tracing can be switched off at runtime with
+set_enabled(False); a disabled span costs one flag check.
+
+    python -m modules.tracing traces.jsonl                  # slowest spans + flame view of the slowest turns
+    python -m modules.tracing traces.jsonl --trace <id>     # one turn
+"""
+import argparse
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+from modules.config import get_config
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("drukcare_span", default=None)
+
+
+def _size(value) -> int:
+    """Rough payload size in characters; good enough to spot oversized prompts and outputs."""
+    if value is None:
+        return 0
+    try:
+        return len(value) if isinstance(value, (str, bytes)) else len(str(value))
+    except Exception:
+        return 0
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "duration_ms",
+                 "in_bytes", "out_bytes", "error", "attrs", "_started", "_open_children", "_parent")
+
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.name, self.kind, self.attrs = name, kind, attrs
+        self.start = time.time()
+        self.duration_ms = None
+        self.in_bytes = self.out_bytes = 0
+        self.error = None
+        self._started = time.perf_counter()
+        self._open_children: List["Span"] = []
+        self._parent = parent
+
+    def set_input(self, value):
+        self.in_bytes = _size(value)
+
+    def set_output(self, value):
+        self.out_bytes = _size(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "name": self.name, "kind": self.kind, "start": round(self.start, 6),
+                "duration_ms": self.duration_ms, "in_bytes": self.in_bytes, "out_bytes": self.out_bytes,
+                "error": self.error, "attrs": self.attrs}
+
+
+class Tracer:
+    """Collects finished spans into a ring buffer and an optional rotating JSONL file."""
+
+    def __init__(self, enabled: bool = True, path: str = "", keep: int = 2000,
+                 max_bytes: int = 5 * 2**20, backups: int = 3):
+        self.enabled = enabled
+        self.path = path
+        self._spans = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._file_logger = None
+        if path:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file_logger = logging.getLogger(f"drukcare.traces.{id(self)}")
+            self._file_logger.propagate = False
+            self._file_logger.setLevel(logging.INFO)
+            self._file_logger.addHandler(handler)
+
+    def start(self, name: str, kind: str, **attrs) -> Span:
+        parent = _current.get()
+        span = Span(name, kind, parent, attrs)
+        if parent is not None:
+            with self._lock:
+                parent._open_children.append(span)
+        return span
+
+    def finish(self, span: Span, error: Optional[BaseException] = None):
+        with self._lock:
+            if span.duration_ms is not None:
+                return  # Already closed with its parent (e.g. an attempt abandoned at a stage deadline)
+            span.duration_ms = round(1000 * (time.perf_counter() - span._started), 3)
+            children = list(span._open_children)
+        # Children a failed task never closed (e.g. no post-step hook) are closed with their parent
+        for child in children:
+            self.finish(child, RuntimeError("not finished when its parent ended"))
+        if error is not None and span.error is None:
+            span.error = f"{type(error).__name__}: {error}"[:300]
+        record = span.to_dict()
+        with self._lock:
+            if span._parent is not None and span in span._parent._open_children:
+                span._parent._open_children.remove(span)
+            self._spans.append(record)
+        if self._file_logger is not None:
+            self._file_logger.info(json.dumps(record, default=str))
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            spans = list(self._spans)
+        return [s for s in spans if trace_id is None or s["trace_id"] == trace_id]
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                config = get_config()
+                _tracer = Tracer(config["tracing_enabled"], config["trace_file"], config["trace_buffer"],
+                                 config["trace_max_bytes"], config["trace_backups"])
+    return _tracer
+
+
+def set_enabled(enabled: bool):
+    get_tracer().enabled = enabled
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, kind: str = "span", **attrs):
+    """Records the enclosed block as a child of the current span; yields the Span (or None when off)."""
+    tracer = get_tracer()
+    if not tracer.enabled:
+        yield None
+        return
+    if kind == "crew":
+        _install_crewai_hooks()  # crewai is loaded by now; importing it earlier would slow startup
+    current = tracer.start(name, kind, **attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        tracer.finish(current, e)
+        raise
+    else:
+        tracer.finish(current)
+    finally:
+        _current.reset(token)
+
+
+def traceable(fn=None, *, name: Optional[str] = None, kind: str = "turn"):
+    """Drop-in for langsmith's @traceable / @traceable(name=...): a span with argument and result sizes."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__, kind) as current:
+                if current is not None:
+                    current.in_bytes = sum(_size(a) for a in args) + sum(_size(v) for v in kwargs.values())
+                result = fn(*args, **kwargs)
+                if current is not None:
+                    current.set_output(result)
+                return result
+        return wrapper
+    return decorator(fn) if fn is not None else decorator
+
+
+# --- crewai tasks ---
+# Tasks are executed inside crewai; its pre/post step hooks run on the task's own thread,
+# so the task span can be pushed onto the contextvar there and LLM/tool spans nest under it.
+_task_tokens: Dict[tuple, tuple] = {}
+_hooks_installed = False
+
+def _on_pre_step(ctx):
+    if getattr(ctx, "kind", None) != "task" or not get_tracer().enabled:
+        return None
+    task = ctx.task
+    role = getattr(ctx, "agent_role", None)
+    current = get_tracer().start(getattr(task, "name", None) or f"{role or 'agent'} task", "task", agent=role)
+    current.set_input(getattr(task, "description", ""))
+    _task_tokens[(id(task), threading.get_ident())] = (current, _current.set(current))
+    return None
+
+def _on_post_step(ctx):
+    if getattr(ctx, "kind", None) != "task":
+        return None
+    entry = _task_tokens.pop((id(ctx.task), threading.get_ident()), None)
+    if entry is None:
+        return None
+    current, token = entry
+    current.set_output(getattr(ctx.output, "raw", ctx.output))
+    get_tracer().finish(current)
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(current._parent)  # Token from another context; restore the parent directly
+    return None
+
+def _install_crewai_hooks():
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    with _tracer_lock:
+        if _hooks_installed:
+            return
+        _hooks_installed = True
+        try:
+            from crewai.hooks import InterceptionPoint, register_hook
+        except ImportError:
+            return  # Older crewai without step hooks: tasks just don't get their own spans
+        register_hook(InterceptionPoint.PRE_STEP, _on_pre_step)
+        register_hook(InterceptionPoint.POST_STEP, _on_post_step)
+
+
+# --- CLI ---
+
+def load_spans(paths: List[str]) -> List[Dict[str, Any]]:
+    """Reads span files, including their rotated backups (file.1, file.2, ...)."""
+    spans = []
+    for path in paths:
+        candidates = [path] + [f"{path}.{i}" for i in range(1, 100) if os.path.exists(f"{path}.{i}")]
+        for candidate in candidates:
+            if not os.path.exists(candidate):
+                continue
+            with open(candidate, "r", encoding="utf-8") as f:
+                spans.extend(json.loads(line) for line in f if line.strip())
+    return spans
+
+
+def flame(spans: List[Dict[str, Any]], trace_id: str, width: int = 40) -> List[str]:
+    """Indented tree of one trace; the bar is the span's share of the turn, `self` excludes children."""
+    trace = [s for s in spans if s["trace_id"] == trace_id]
+    ids = {s["span_id"] for s in trace}
+    children = defaultdict(list)
+    for s in trace:
+        children[s["parent_id"] if s["parent_id"] in ids else None].append(s)
+    roots = sorted(children[None], key=lambda s: s["start"])
+    total = max((s["duration_ms"] for s in roots), default=0) or 1
+    lines = []
+
+    def walk(s, depth):
+        kids = sorted(children[s["span_id"]], key=lambda c: c["start"])
+        self_ms = s["duration_ms"] - sum(c["duration_ms"] for c in kids)
+        bar = "█" * max(1, round(width * s["duration_ms"] / total))
+        error = "  ❌" if s["error"] else ""
+        lines.append(f"{'  ' * depth}{s['kind']}:{s['name'][:50]:<{54 - 2 * depth}} "
+                     f"{s['duration_ms']:>10.1f}ms self {max(self_ms, 0):>9.1f}ms {bar}{error}")
+        for c in kids:
+            walk(c, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the slowest spans and a flame-style breakdown per turn.")
+    parser.add_argument("files", nargs="+", help="Span files written with TRACE_FILE set")
+    parser.add_argument("--top", type=int, default=15, help="How many slowest spans to list")
+    parser.add_argument("--kind", help="Only list spans of this kind (turn, stage, crew, task, tool, llm)")
+    parser.add_argument("--trace", help="Show only this trace id")
+    parser.add_argument("--turns", type=int, default=3, help="Flame view for this many slowest turns")
+    args = parser.parse_args()
+
+    spans = load_spans(args.files)
+    if args.trace:
+        spans = [s for s in spans if s["trace_id"] == args.trace]
+    if not spans:
+        print("No spans found.")
+        return
+
+    listed = [s for s in spans if not args.kind or s["kind"] == args.kind]
+    print(f"=== Slowest {min(args.top, len(listed))} of {len(listed)} spans ===")
+    for s in sorted(listed, key=lambda s: s["duration_ms"], reverse=True)[:args.top]:
+        print(f"{s['duration_ms']:>10.1f}ms  {s['kind']:<6} {s['name'][:50]:<52} trace={s['trace_id']} "
+              f"in={s['in_bytes']} out={s['out_bytes']}" + (f"  ❌ {s['error']}" if s["error"] else ""))
+
+    roots = [s for s in spans if s["parent_id"] is None]
+    for root in sorted(roots, key=lambda s: s["duration_ms"], reverse=True)[:args.turns]:
+        print(f"\n=== Trace {root['trace_id']} ({time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(root['start']))}) ===")
+        print("\n".join(flame(spans, root["trace_id"])))
+
+
+if __name__ == "__main__":
+    main()
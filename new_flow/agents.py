@@ -1,8 +1,8 @@
 import os
-from crewai import Agent, LLM
+from crewai import Agent
 from tools import MentalHealthTools, TextClassifierTool
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
+from modules.llm_setup import get_llm
 
 load_dotenv()
 
@@ -10,14 +10,12 @@ load_dotenv()
 mental_health_tools = MentalHealthTools()
 sentiment_classifier_tool = TextClassifierTool(model_name="sentinet/suicidality")
 
-llm = LLM(
-          model="gemini/gemini-2.0-flash",
-          api_key=os.getenv("GOOGLE_API_KEY"),
-          temperature=0.3,
-          max_tokens=None,
-          timeout=None,
-          max_retries=2,
-        )
+# One LLM per pipeline stage: tier, timeout and gateway lane come from modules/routing.py
+crisis_llm = get_llm(temperature=0.3, stage="crisis_detection")
+classifier_llm = get_llm(temperature=0.3, stage="condition_classification")
+retriever_llm = get_llm(temperature=0.3, stage="profile_retrieval")
+rag_llm = get_llm(temperature=0.3, stage="rag_retrieval")
+recommendation_llm = get_llm(temperature=0.3, stage="recommendation")
 
 # --- Agents ---
 crisis_detection_agent = Agent(
@@ -31,7 +29,7 @@ crisis_detection_agent = Agent(
     tools=[sentiment_classifier_tool],
     verbose=True,
     allow_delegation=False,
-    llm=llm 
+    llm=crisis_llm
 )
 
 mental_condition_classifier_agent = Agent(
@@ -44,7 +42,7 @@ mental_condition_classifier_agent = Agent(
         "or to 'General Well-being' or 'Other'."
     ),
     tools=[],
-    llm=llm,
+    llm=classifier_llm,
     verbose=False,
     allow_delegation=False
 )
@@ -54,7 +52,7 @@ data_retriever_agent = Agent(
     goal='Fetch relevant user profile information from the database.',
     backstory="You are an efficient data access specialist.",
     tools=[],
-    llm=llm, # Even though it's simulated, an LLM is required by CrewAI
+    llm=retriever_llm, # Even though it's simulated, an LLM is required by CrewAI
     verbose=False,
     allow_delegation=False
 )
@@ -72,7 +70,7 @@ rag_agent = Agent(
     tools=[],
     verbose=True,
     allow_delegation=False,
-    llm=llm
+    llm=rag_llm
 )
 
 personalized_recommendation_agent = Agent(
@@ -87,7 +85,7 @@ personalized_recommendation_agent = Agent(
     tools=[mental_health_tools.get_bhutanese_helplines], # This agent primarily synthesizes information, might not need new tools but processes info from previous tasks
     verbose=True,
     allow_delegation=False,
-    llm=llm,
+    llm=recommendation_llm,
     max_retry_limit=2,
     reasoning = True,
     max_reasoning_attempts=2
@@ -5,63 +5,48 @@ from crewai import Crew
 from agents import *
 from tasks import *
 from utils import *
-
-# --- Load Questionnaires from JSON ---
-QUESTIONNAIRES_FILE = "new_flow\questionnaire.json"
-
-@st.cache_data
-def load_questionnaires():
-    try:
-        # In a real deployed environment, ensure this file is accessible
-        with open(QUESTIONNAIRES_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        st.error(f"Error: {QUESTIONNAIRES_FILE} not found. Please ensure it's in the same directory.")
-        return {}
-    except json.JSONDecodeError:
-        st.error(f"Error: Could not decode JSON from {QUESTIONNAIRES_FILE}. Check file format.")
-        return {}
-
-QUESTIONS = load_questionnaires()
-
-# --- Database Simulation (Replace with actual PostgreSQL connection) ---
-def get_postgresql_connection():
+from modules.condition_classifier import classify_condition
+from modules.instruments import get_instrument, get_instruments
+from modules.scoring import capture, score_responses
+from modules.adaptive import enabled as adaptive_enabled, next_question_index, stopped_early
+from modules.singleflight import kickoff
+from modules.crew_pool import get_pool
+from modules.config import get_config
+from modules.speculative import recommendation_prefix, speculate_recommendation
+from modules.retrieval import retrieve_context
+from modules.deadline import run_with_deadline
+from modules.fallback import fallback_recommendation, warm_fallbacks
+from modules.metrics import start_exporters, timed_stage
+from modules.profile_repository import load_profile, record_assessment, record_history
+
+# --- Questionnaires (modules/instruments.json, compiled once by the instrument registry) ---
+QUESTIONS = get_instruments().legacy_questions()
+
+# --- Profile database (modules/profile_repository.py: PostgreSQL via PROFILE_DB_URL, or the SQLite stand-in) ---
+@timed_stage("profile_fetch")
+def lookup_user_profile(user_id):
     """
-    Placeholder for establishing a PostgreSQL database connection.
-    In a real application, you would use a library like `psycopg2` or `SQLAlchemy`.
-    Example:
-    import psycopg2
-    conn = psycopg2.connect(
-        host="your_host",
-        database="your_database",
-        user="your_user",
-        password="your_password"
-    )
-    return conn
+    Fetches the user's profile through the pooled profile repository.
+    Doesn't touch st.session_state, so it is safe to call from a background thread.
     """
-    st.info("Simulating PostgreSQL database connection.")
-    # For demonstration, we'll use a dummy in-memory data store
-    pass
+    return load_profile(user_id)
 
 def fetch_user_profile_from_db(user_id):
-    """
-    Simulates fetching user profile data from a PostgreSQL database.
-    In a real application, you would execute SQL queries here.
-    """
-    # conn = get_postgresql_connection()
-    # cursor = conn.cursor()
-    # cursor.execute("SELECT * FROM user_profiles WHERE user_id = %s", (user_id,))
-    # user_profile = cursor.fetchone()
-    # conn.close()
-
-    # Dummy user profiles for demonstration
-    dummy_profiles = {
-        "user123": {"name": "Alice", "age": 30, "history": "Anxiety, seeking stress management."},
-        "user456": {"name": "Bob", "age": 25, "history": "Feeling overwhelmed with work."},
-        "anon_user": {"name": "Guest", "age": "N/A", "history": "First-time user."}
-    }
     st.session_state['user_id'] = st.session_state.get('user_id', "anon_user") # Default to anon if not set
-    return dummy_profiles.get(st.session_state['user_id'], dummy_profiles["anon_user"])
+    return lookup_user_profile(st.session_state['user_id'])
+
+def save_chat_history():
+    """Stores the messages added since the last save, in one batch."""
+    saved = st.session_state.get('history_saved', 0)
+    record_history(st.session_state['user_id'], st.session_state['chat_history'][saved:])
+    st.session_state['history_saved'] = len(st.session_state['chat_history'])
+
+def cancel_speculation():
+    """Discards background work prepared for the previous query."""
+    speculation = st.session_state.get('speculation')
+    if speculation is not None:
+        speculation.cancel()
+        st.session_state['speculation'] = None
 
 
 # --- CrewAI Setup ---
@@ -78,12 +63,17 @@ mental_condition_classifier_crew = Crew(
     verbose=1
 )
 
+# Retrieval already happened (speculatively, or inline in handle_recommendation): it comes in as {retrieved_data}
 rag_recommendation_crew = Crew(
-    agents=[data_retriever_agent, rag_agent, personalized_recommendation_agent],
-    tasks=[query_vector_db_task, personalize_and_recommend_task],
+    agents=[personalized_recommendation_agent],
+    tasks=[personalize_and_recommend_task],
     verbose=1
 )
 
+# Knowledge-base excerpts for the templated fallback recommendations
+warm_fallbacks()
+start_exporters()
+
 # --- Streamlit App ---
 
 st.set_page_config(page_title="DrukCare Chatbot", layout="centered")
@@ -101,7 +91,9 @@ if 'chat_history' not in st.session_state:
     st.session_state['current_question_index'] = 0 # New: to track current question for conversational flow
     st.session_state['assessment_questions_list'] = [] # New: to store questions for current assessment
     st.session_state['assessment_answers'] = {}
+    st.session_state['assessment_responses'] = {}  # Same answers keyed by item id, for scoring
     st.session_state['questionnaire_score'] = None
+    st.session_state['speculation'] = None # Background retrieval/prompt assembly for the recommendation
     st.session_state['user_id'] = "user" + str(random.randint(100, 999))
 
 # --- Display Chat History ---
@@ -116,6 +108,7 @@ def handle_welcome():
     st.session_state['stage'] = "query"
 
 def handle_user_query(user_input):
+    cancel_speculation()
     st.session_state['current_user_query'] = user_input
     st.session_state['chat_history'].append({"role": "user", "content": user_input})
     st.session_state['stage'] = "crisis_check"
@@ -124,7 +117,9 @@ def handle_crisis_check():
     st.session_state['chat_history'].append({"role": "bot", "content": "Running crisis detection..."})
     inputs = {"user_query": st.session_state['current_user_query']}
     try:
-        result = crisis_management_crew.kickoff(inputs=inputs)
+        # Reruns and double-submits with the same query share one in-flight kickoff
+        result = run_with_deadline("crisis_detection",
+                                   lambda: kickoff("app.crisis_management_crew", get_pool("app.crisis_management_crew", crisis_management_crew), inputs))
         if isinstance(result, CrisisDetectionOutput):
             is_crisis = result.is_crisis
             explanation = result.explanation
@@ -133,6 +128,7 @@ def handle_crisis_check():
             explanation = "Could not parse crisis detection output."
             st.warning(f"Unexpected crisis detection output format: {result}")
 
+        st.session_state['is_crisis'] = bool(is_crisis)
         st.session_state['chat_history'].append({"role": "bot", "content": f"Crisis detection result: {'YES' if is_crisis else 'NO'}. Reason: {explanation}"})
 
         if is_crisis:
@@ -155,14 +151,17 @@ def handle_mental_classify():
         "user_profile": json.dumps(user_profile)
     }
     try:
-        result = mental_condition_classifier_crew.kickoff(inputs=inputs)
-        if isinstance(result, MentalConditionOutput):
-            condition = result.condition
-            rationale = result.rationale
-        else:
-            condition = "General Well-being"
-            rationale = "Could not parse mental condition output."
-            st.warning(f"Unexpected mental condition classification output format: {result}")
+        # Local embedding classifier first; the crew only runs when it is not confident
+        result = classify_condition(
+            inputs["user_query"],
+            llm_fallback=lambda: run_with_deadline(
+                "condition_classification",
+                lambda: kickoff("app.mental_condition_classifier_crew", get_pool("app.mental_condition_classifier_crew", mental_condition_classifier_crew), inputs)
+            ),
+            fallback_key={"crew": "app.mental_condition_classifier_crew", **inputs}
+        )
+        condition = result.condition
+        rationale = result.rationale
 
         st.session_state['classified_condition'] = condition
         st.session_state['chat_history'].append({"role": "bot", "content": f"Based on our analysis, your concern seems related to: **{condition}**. Rationale: {rationale}"})
@@ -173,6 +172,13 @@ def handle_mental_classify():
         st.session_state['current_question_index'] = 0
         st.session_state['assessment_questions_list'] = QUESTIONS.get(st.session_state['classified_condition'], QUESTIONS["Other"])
         st.session_state['assessment_answers'] = {} # Clear previous answers
+        st.session_state['assessment_responses'] = {}
+
+        # Query, profile and condition are known now: prepare the recommendation while the user answers
+        user_id = st.session_state['user_id']
+        st.session_state['speculation'] = speculate_recommendation(
+            inputs["user_query"], condition, lambda: lookup_user_profile(user_id)
+        )
 
         st.session_state['stage'] = "assessment_consent" # New stage for consent
     except Exception as e:
@@ -199,9 +205,12 @@ def handle_ask_question(user_input):
     if st.session_state['current_question_index'] > 0: # Only store if it's an actual question answer
         previous_question_text = st.session_state['assessment_questions_list'][st.session_state['current_question_index'] - 1]
         st.session_state['assessment_answers'][previous_question_text] = user_input.strip()
+        capture(st.session_state['assessment_responses'], st.session_state['classified_condition'], previous_question_text, user_input)
 
-    # Move to the next question
-    st.session_state['current_question_index'] += 1
+    # Move to the next question (past the ones that can no longer change the result, in adaptive mode)
+    st.session_state['current_question_index'] = next_question_index(
+        st.session_state['classified_condition'], st.session_state['assessment_responses'],
+        st.session_state['current_question_index'] + 1)
 
     questions_to_ask = st.session_state['assessment_questions_list']
     
@@ -222,17 +231,17 @@ def handle_ask_question(user_input):
         # All questions answered, calculate score and proceed to recommendation
         st.session_state['chat_history'].append({"role": "bot", "content": "Thank you for completing the assessment."})
         
-        score = None
-        if st.session_state['classified_condition'] == "PHQ-9":
-            score = score_phq9(st.session_state['assessment_answers'])
-            st.session_state['chat_history'].append({"role": "bot", "content": f"Your PHQ-9 score is: **{score}**."})
-        elif st.session_state['classified_condition'] == "GAD-7":
-            score = score_gad7(st.session_state['assessment_answers'])
-            st.session_state['chat_history'].append({"role": "bot", "content": f"Your GAD-7 score is: **{score}**."})
-        elif st.session_state['classified_condition'] == "DAST-10":
-            score = score_dast10(st.session_state['assessment_answers'])
-            st.session_state['chat_history'].append({"role": "bot", "content": f"Your DAST-10 score is: **{score}**."})
+        condition = st.session_state['classified_condition']
+        # Scale labels only, as before; adaptive mode settled its band on normalized answers, so it scores them too
+        score = score_responses(condition, st.session_state['assessment_responses'], exact=not adaptive_enabled())
+        if score is not None:
+            interpretation = get_instrument(condition).interpret(score)
+            st.session_state['chat_history'].append({"role": "bot", "content": f"Your {condition} score is: **{score}** ({interpretation})."})
+            if stopped_early(condition, st.session_state['assessment_responses']):
+                st.session_state['chat_history'].append({"role": "bot", "content": "Your answers already settled this result, so the remaining questions were skipped."})
         
+        if score is not None:
+            record_assessment(st.session_state['user_id'], condition, score, interpretation, st.session_state['assessment_answers'])
         st.session_state['questionnaire_score'] = score
         st.session_state['stage'] = "recommend"
         st.rerun() # Rerun to trigger recommendation flow
@@ -240,16 +249,37 @@ def handle_ask_question(user_input):
 
 def handle_recommendation():
     st.session_state['chat_history'].append({"role": "bot", "content": "Generating personalized recommendations..."})
-    user_profile = fetch_user_profile_from_db(st.session_state['user_id'])
-
+    speculation = st.session_state.get('speculation')
+    prefix = speculation.get("prefix", timeout=get_config()["speculation_wait_timeout"]) if speculation else None
+    if prefix is None:
+        # Crisis path (no classification) or speculation failed: assemble it now. The crisis
+        # response doesn't wait on a cold vector store; it has the helplines without retrieval.
+        condition = st.session_state['classified_condition']
+        retrieved = (retrieve_context(st.session_state['current_user_query'], condition)
+                     if condition and not st.session_state.get('is_crisis', False) else None)
+        prefix = recommendation_prefix(
+            st.session_state['current_user_query'], condition,
+            fetch_user_profile_from_db(st.session_state['user_id']), retrieved
+        )
+
+    # Only the score-dependent inputs are added here
     inputs = {
-        "user_query": st.session_state['current_user_query'],
-        "user_profile": json.dumps(user_profile),
+        **prefix,
         "assessment_answers": json.dumps(st.session_state['assessment_answers']),
         "questionnaire_score": str(st.session_state['questionnaire_score']) if st.session_state['questionnaire_score'] is not None else "N/A"
     }
+    condition = st.session_state['classified_condition']
+    score = st.session_state['questionnaire_score']
+    is_crisis = st.session_state.get('is_crisis', False)
     try:
-        final_recommendation = rag_recommendation_crew.kickoff(inputs=inputs)
+        # Bounded by the stage deadline; an optional hedge runs on a copy of the crew so it isn't coalesced
+        final_recommendation = run_with_deadline(
+            "recommendation",
+            lambda: kickoff("app.rag_recommendation_crew", get_pool("app.rag_recommendation_crew", rag_recommendation_crew), inputs),
+            hedge=lambda: get_pool("app.rag_recommendation_crew", rag_recommendation_crew).kickoff(inputs=inputs),
+            fallback=lambda: fallback_recommendation(condition, score, prefix.get("retrieved_data"), is_crisis),
+            context={"condition": condition, "score": score}
+        )
         st.session_state['chat_history'].append({"role": "bot", "content": f"**Final Recommendation:**\n\n{final_recommendation}"})
         st.session_state['chat_history'].append({"role": "bot", "content": "Is there anything else I can help you with today? Type your next query or say 'reset' to start over."})
         st.session_state['stage'] = "query"
@@ -257,11 +287,13 @@ def handle_recommendation():
         st.error(f"Error during recommendation CrewAI kickoff: {e}")
         st.session_state['chat_history'].append({"role": "bot", "content": "An error occurred while generating recommendations. Please try again or rephrase your query."})
         st.session_state['stage'] = "query"
+    save_chat_history()
 
 
 # --- Trigger Workflow based on Stage ---
 if st.session_state['stage'] == "welcome":
     st.session_state['chat_history'] = []
+    st.session_state['history_saved'] = 0
     handle_welcome()
 elif st.session_state['stage'] == "crisis_check":
     with st.spinner("Checking for crisis..."):
@@ -285,6 +317,7 @@ user_input = st.chat_input("Type your message here...")
 if user_input:
     # Handle 'reset' command first
     if user_input.lower() == "reset":
+        cancel_speculation()
         for key in st.session_state.keys():
             del st.session_state[key]
         st.rerun()
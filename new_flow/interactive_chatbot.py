@@ -1,122 +1,34 @@
-import os
 import json
 import random
-from langsmith import traceable
-# Import everything from the 'agents' package
-from new_agents.core import (
-    mental_condition_classifier_agent,
-    data_retriever_agent,
-    recommendation_agent,
-    crisis_detection_task,
-    mental_condition_classification_task,
-    recommendation_task,
-    crisis_detection_agent,
-    crisis_management_crew,
-    data_retrieval_crew,
-    mental_condition_classifier_crew,
-    recommendation_crew,
-    CrisisDetectionOutput,
-    MentalConditionOutput,
-)
+from modules.condition_classifier import classify_condition
+from modules.instruments import get_instrument, get_instruments
+from modules.scoring import capture, score_responses
+from modules.adaptive import enabled as adaptive_enabled, next_question_index, stopped_early
+from modules.singleflight import kickoff
+from modules.config import get_config
+from modules.speculative import recommendation_prefix, speculate_recommendation
+from modules.deadline import run_with_deadline
+from modules.fallback import fallback_recommendation, warm_fallbacks
+from modules.metrics import start_exporters, timed_stage
+from modules.profile_repository import load_profile, record_assessment
+# Crews are built lazily on first use (see new_agents/core.py)
+from new_agents.core import get_crew, get_crew_pool, CrisisDetectionOutput
 
-# --- Load Questionnaires from JSON ---
-QUESTIONNAIRES_FILE = "questionnaire.json"
+# --- Questionnaires (modules/instruments.json, compiled once by the instrument registry) ---
+QUESTIONS = get_instruments().legacy_questions()
 
-def load_questionnaires():
-    """Loads questionnaire data from a JSON file."""
-    try:
-        with open(QUESTIONNAIRES_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: {QUESTIONNAIRES_FILE} not found. Please ensure it's in the same directory.")
-        return {}
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from {QUESTIONNAIRES_FILE}. Check file format.")
-        return {}
-
-QUESTIONS = load_questionnaires()
-
-# --- Scoring Logic Functions ---
-
-def score_phq9(answers):
-    """Calculates the PHQ-9 score based on user answers."""
-    score_map = {
-        "Not at all": 0,
-        "Several days": 1,
-        "More than half the days": 2,
-        "Nearly every day": 3
-    }
-    total_score = 0
-    # Questions are 1-indexed in the JSON list, skip the first item (instruction)
-    for i in range(1, min(10, len(QUESTIONS.get("PHQ-9", [])))):
-        if i < len(QUESTIONS["PHQ-9"]):
-            question_text_from_json = QUESTIONS["PHQ-9"][i]
-            answer = answers.get(question_text_from_json, "").strip()
-            total_score += score_map.get(answer, 0)
-    return total_score
-
-def score_gad7(answers):
-    """Calculates the GAD-7 score based on user answers."""
-    score_map = {
-        "Not at all": 0,
-        "Several days": 1,
-        "More than half the days": 2,
-        "Nearly every day": 3
-    }
-    total_score = 0
-    for i in range(1, min(8, len(QUESTIONS.get("GAD-7", [])))):
-        if i < len(QUESTIONS["GAD-7"]):
-            question_text_from_json = QUESTIONS["GAD-7"][i]
-            answer = answers.get(question_text_from_json, "").strip()
-            total_score += score_map.get(answer, 0)
-    return total_score
-
-def score_dast10(answers):
-    """Calculates the DAST-10 score based on user answers."""
-    score_map = {
-        "Yes": 1,
-        "No": 0
-    }
-    total_score = 0
-    for i in range(1, min(11, len(QUESTIONS.get("DAST-10", [])))):
-        if i < len(QUESTIONS["DAST-10"]):
-            question_text_from_json = QUESTIONS["DAST-10"][i]
-            answer = answers.get(question_text_from_json, "").strip()
-            total_score += score_map.get(answer, 0)
-    return total_score
-
-# --- Database Simulation (Replace with actual PostgreSQL connection) ---
+# --- Profile database (modules/profile_repository.py: PostgreSQL via PROFILE_DB_URL, or the SQLite stand-in) ---
+@timed_stage("profile_fetch")
 def fetch_user_profile_from_db(user_id):
-    """
-    Simulates fetching user profile data from a PostgreSQL database.
-    In a real application, you would execute SQL queries here.
-    """
-    # For demonstration, we'll use a dummy in-memory data store
-    dummy_profiles = {
-        "user123": {"name": "Alice", "age": 30, "history": "Anxiety, seeking stress management."},
-        "user456": {"name": "Bob", "age": 25, "history": "Feeling overwhelmed with work."},
-        "anon_user": {"name": "Guest", "age": "N/A", "history": "First-time user."}
-    }
-    # Simulate user_id if not set (for initial anonymous access)
-    return dummy_profiles.get(user_id, dummy_profiles["anon_user"])
-
-# --- Import or Create Data Retrieval Crew (to match workflow) ---
-try:
-    from new_agents.core import data_retrieval_crew
-except ImportError:
-    print("Warning: data_retrieval_crew not found. Please implement it in new_agents.core")
-    data_retrieval_crew = None
-
-# Try to import mental health condition classifier crew (separate from mental_condition_classifier_crew_obj)
-try:
-    from new_agents.core import mental_health_condition_classifier_crew
-except ImportError:
-    print("Warning: mental_health_condition_classifier_crew not found. Using mental_condition_classifier_crew_obj instead")
-    mental_health_condition_classifier_crew = mental_condition_classifier_crew
+    """Fetches the user's profile through the pooled profile repository."""
+    return load_profile(user_id)
 
 # --- Interactive Chatbot Logic (Following Workflow) ---
-def chat_interface():
-    """Runs the interactive chatbot following the workflow diagram."""
+def chat_interface(input_fn=input):
+    """
+    Runs the interactive chatbot following the workflow diagram.
+    `input_fn` reads each user message (defaults to `input`; load tests pass a scripted reader).
+    """
     chat_history = []
     user_id = "user" + str(random.randint(100, 999))
 
@@ -135,14 +47,23 @@ def chat_interface():
             'current_question_index': 0,
             'assessment_questions_list': [],
             'assessment_answers': {},
+            'assessment_responses': {},  # Same answers keyed by item id, for scoring
             'questionnaire_score': None,
             'retrieved_data': None,
             'user_profile_data': None,
+            'speculation': None,
             'processing_complete': False
         }
 
+    def cancel_speculation(session_vars):
+        """Discards background work prepared for the previous query."""
+        if session_vars.get('speculation') is not None:
+            session_vars['speculation'].cancel()
+            session_vars['speculation'] = None
+
     def process_user_query_automatically(user_query, session_vars):
         """Process user query through all automatic stages"""
+        cancel_speculation(session_vars)
         session_vars['current_user_query'] = user_query
         session_vars['user_profile_data'] = fetch_user_profile_from_db(user_id)
         
@@ -155,7 +76,7 @@ def chat_interface():
         
         # try:
         #     if data_retrieval_crew:
-        #         session_vars['retrieved_data'] = data_retrieval_crew.kickoff(inputs=data_inputs)
+        #         session_vars['retrieved_data'] = get_crew("data_retrieval_crew").kickoff(inputs=data_inputs)
         #         print_message("bot", "✅ Data retrieval completed.")
         #     else:
         #         session_vars['retrieved_data'] = "Basic mental health resources and general guidelines."
@@ -171,7 +92,8 @@ def chat_interface():
         
         crisis_detected = False
         try:
-            result = crisis_management_crew.kickoff(inputs=inputs)
+            result = run_with_deadline("crisis_detection",
+                                       lambda: kickoff("core.crisis_management_crew", get_crew_pool("crisis_management_crew"), inputs))
             print(f"Type of result: {type(result)}")
             print(f"Result: {result}")
             print(result.get('is_crisis'))
@@ -216,20 +138,17 @@ def chat_interface():
         }
         
         try:
-            result = mental_health_condition_classifier_crew.kickoff(inputs=classification_inputs)
-            if isinstance(result, MentalConditionOutput):
-                session_vars['classified_condition'] = result.condition
-                rationale = result.rationale
-            else:
-                result_str = str(result)
-                # Extract condition from result
-                for cond in ["PHQ-9", "GAD-7", "DAST-10"]:
-                    if cond in result_str:
-                        session_vars['classified_condition'] = cond
-                        break
-                else:
-                    session_vars['classified_condition'] = "General Well-being"
-                rationale = result_str if result_str else "Analysis completed."
+            # Local embedding classifier first; the crew only runs when it is not confident
+            result = classify_condition(
+                user_query,
+                llm_fallback=lambda: run_with_deadline(
+                    "condition_classification",
+                    lambda: kickoff("core.mental_condition_classifier_crew", get_crew_pool("mental_condition_classifier_crew"), classification_inputs)
+                ),
+                fallback_key={"crew": "core.mental_condition_classifier_crew", **classification_inputs}
+            )
+            session_vars['classified_condition'] = result.condition
+            rationale = result.rationale
 
             print_message("bot", f"✅ Analysis complete: **{session_vars['classified_condition']}**")
             print_message("bot", f"Reasoning: {rationale}")
@@ -242,13 +161,30 @@ def chat_interface():
         # Setup assessment variables
         session_vars['assessment_questions_list'] = QUESTIONS.get(session_vars['classified_condition'], QUESTIONS.get("Other", []))
         session_vars['assessment_answers'] = {}
+        session_vars['assessment_responses'] = {}
         session_vars['current_question_index'] = 0
+
+        # Profile, retrieval and the score-independent recommendation inputs are prepared
+        # in the background while the user goes through consent and the questions
+        session_vars['speculation'] = speculate_recommendation(
+            user_query, session_vars['classified_condition'], lambda: fetch_user_profile_from_db(user_id)
+        )
         
         # Move to assessment consent stage
         session_vars['current_stage'] = "assessment_consent"
         session_vars['processing_complete'] = True
         return session_vars
 
+    def run_recommendation(inputs, condition, score, is_crisis=False):
+        """Recommendation crew bounded by the stage deadline, with a templated fallback."""
+        return run_with_deadline(
+            "recommendation",
+            lambda: kickoff("core.recommendation_crew", get_crew_pool("recommendation_crew"), inputs),
+            hedge=lambda: get_crew_pool("recommendation_crew").kickoff(inputs=inputs),
+            fallback=lambda: fallback_recommendation(condition, score, inputs.get("retrieved_data"), is_crisis),
+            context={"condition": condition, "score": score}
+        )
+
     def generate_crisis_recommendations(session_vars):
         """Generate immediate crisis recommendations"""
         print_message("bot", "🚨 Generating immediate crisis support recommendations...")
@@ -265,7 +201,7 @@ def chat_interface():
         }
         
         try:
-            final_recommendation = recommendation_crew.kickoff(inputs=recommendation_inputs)
+            final_recommendation = run_recommendation(recommendation_inputs, "Crisis", None, is_crisis=True)
             print_message("bot", "🆘 **IMMEDIATE CRISIS SUPPORT RECOMMENDATIONS:**")
             print_message("bot", f"{final_recommendation}")
         except Exception as e:
@@ -280,7 +216,47 @@ def chat_interface():
         session_vars['processing_complete'] = True
         return session_vars
 
+    def generate_final_recommendations(session_vars):
+        """Generate final recommendations and return to query stage"""
+        print_message("bot", "📋 Generating your personalized recommendations...")
+
+        speculation = session_vars.get('speculation')
+        prefix = speculation.get("prefix", timeout=get_config()["speculation_wait_timeout"]) if speculation else None
+        if prefix is None:
+            prefix = recommendation_prefix(
+                session_vars['current_user_query'], session_vars['classified_condition'],
+                session_vars['user_profile_data'],
+                str(session_vars['retrieved_data']) if session_vars['retrieved_data'] else ""
+            )
+        session_vars['speculation'] = None
+
+        # Only the score-dependent inputs are added here
+        recommendation_inputs = {
+            **prefix,
+            "assessment_answers": json.dumps(session_vars['assessment_answers']) if session_vars['assessment_answers'] else "{}",
+            "questionnaire_score": str(session_vars['questionnaire_score']) if session_vars['questionnaire_score'] is not None else "N/A",
+            "chat_history": json.dumps(chat_history[-5:]),
+            "is_crisis": "false"
+        }
+        
+        try:
+            final_recommendation = run_recommendation(recommendation_inputs, session_vars['classified_condition'],
+                                                      session_vars['questionnaire_score'])
+            print_message("bot", "📋 **Your Personalized Mental Health Recommendation:**")
+            print_message("bot", f"{final_recommendation}")
+        except Exception as e:
+            print(f"Recommendation generation error: {e}")
+            print_message("bot", "I apologize, but there was an error generating your recommendations. Please try rephrasing your concern.")
+        
+        print_message("bot", "---")
+        print_message("bot", "💡 Is there anything else I can help you with? Feel free to ask another question or type 'reset' to start over.")
+        
+        session_vars['current_stage'] = "query"
+        return session_vars
+
     # Initialize session
+    warm_fallbacks()
+    start_exporters()
     session_vars = reset_session()
     print_message("bot", "Welcome to DrukCare Chatbot! How can I assist you with your mental well-being today?")
 
@@ -289,11 +265,11 @@ def chat_interface():
             # Only ask for input when we're actually waiting for user input
             if session_vars['current_stage'] in ["welcome", "query", "assessment_consent"] or \
                (session_vars['current_stage'] == "ask_question"):
-                user_input = input("\n👤 You: ")
+                user_input = input_fn("\n👤 You: ")
             else:
                 # This should not happen with the new logic, but just in case
                 print("ERROR: Unexpected stage requiring input:", session_vars['current_stage'])
-                user_input = input("\n👤 You: ")
+                user_input = input_fn("\n👤 You: ")
                 
         except (KeyboardInterrupt, EOFError):
             print_message("bot", "Goodbye! Take care of yourself.")
@@ -306,6 +282,7 @@ def chat_interface():
 
         if user_input.lower() == "reset":
             print_message("bot", "Resetting the conversation...")
+            cancel_speculation(session_vars)
             chat_history = []
             session_vars = reset_session()
             print_message("bot", "Welcome to DrukCare Chatbot! How can I assist you with your mental well-being today?")
@@ -364,8 +341,11 @@ def chat_interface():
             if session_vars['current_question_index'] < len(session_vars['assessment_questions_list']):
                 question_text_key = session_vars['assessment_questions_list'][session_vars['current_question_index']]
                 session_vars['assessment_answers'][question_text_key] = user_input.strip()
+                capture(session_vars['assessment_responses'], session_vars['classified_condition'], question_text_key, user_input)
 
-            session_vars['current_question_index'] += 1
+            session_vars['current_question_index'] = next_question_index(
+                session_vars['classified_condition'], session_vars['assessment_responses'],
+                session_vars['current_question_index'] + 1)
             actual_questions_start_idx = 1 if session_vars['classified_condition'] in ["PHQ-9", "GAD-7", "DAST-10"] else 0
 
             if session_vars['current_question_index'] < len(session_vars['assessment_questions_list']):
@@ -378,49 +358,20 @@ def chat_interface():
                 print_message("bot", "Assessment completed! Calculating your results...")
                 
                 # Calculate score
-                score = None
-                if session_vars['classified_condition'] == "PHQ-9":
-                    score = score_phq9(session_vars['assessment_answers'])
-                    print_message("bot", f"Your PHQ-9 score: **{score}** (0-4: Minimal, 5-9: Mild, 10-14: Moderate, 15-19: Moderately Severe, 20-27: Severe)")
-                elif session_vars['classified_condition'] == "GAD-7":
-                    score = score_gad7(session_vars['assessment_answers'])
-                    print_message("bot", f"Your GAD-7 score: **{score}** (0-4: Minimal, 5-9: Mild, 10-14: Moderate, 15-21: Severe)")
-                elif session_vars['classified_condition'] == "DAST-10":
-                    score = score_dast10(session_vars['assessment_answers'])
-                    print_message("bot", f"Your DAST-10 score: **{score}** (0: No problems, 1-2: Low level, 3-5: Moderate, 6-8: Substantial, 9-10: Severe)")
+                # Score and band wording come from the instrument's band table (modules/instruments.json)
+                condition = session_vars['classified_condition']
+                # Scale labels only, as before; adaptive mode settled its band on normalized answers, so it scores them too
+                score = score_responses(condition, session_vars['assessment_responses'], exact=not adaptive_enabled())
+                if score is not None:
+                    instrument = get_instrument(condition)
+                    print_message("bot", f"Your {condition} score: **{score}**, {instrument.interpret(score)} ({instrument.bands.summary()})")
+                    record_assessment(user_id, condition, score, instrument.interpret(score), session_vars['assessment_answers'])
+                    if stopped_early(condition, session_vars['assessment_responses']):
+                        print_message("bot", "(Your answers already settled this result, so the remaining questions were skipped.)")
                 
                 session_vars['questionnaire_score'] = score
                 session_vars = generate_final_recommendations(session_vars)
 
-    def generate_final_recommendations(session_vars):
-        """Generate final recommendations and return to query stage"""
-        print_message("bot", "📋 Generating your personalized recommendations...")
-        
-        recommendation_inputs = {
-            "user_query": session_vars['current_user_query'],
-            "user_profile": json.dumps(session_vars['user_profile_data']),
-            "retrieved_data": str(session_vars['retrieved_data']) if session_vars['retrieved_data'] else "No specific data retrieved",
-            "classified_condition": session_vars['classified_condition'],
-            "assessment_answers": json.dumps(session_vars['assessment_answers']) if session_vars['assessment_answers'] else "{}",
-            "questionnaire_score": str(session_vars['questionnaire_score']) if session_vars['questionnaire_score'] is not None else "N/A",
-            "chat_history": json.dumps(chat_history[-5:]),
-            "is_crisis": "false"
-        }
-        
-        try:
-            final_recommendation = recommendation_crew.kickoff(inputs=recommendation_inputs)
-            print_message("bot", "📋 **Your Personalized Mental Health Recommendation:**")
-            print_message("bot", f"{final_recommendation}")
-        except Exception as e:
-            print(f"Recommendation generation error: {e}")
-            print_message("bot", "I apologize, but there was an error generating your recommendations. Please try rephrasing your concern.")
-        
-        print_message("bot", "---")
-        print_message("bot", "💡 Is there anything else I can help you with? Feel free to ask another question or type 'reset' to start over.")
-        
-        session_vars['current_stage'] = "query"
-        return session_vars
-    
 
 # Run the chatbot
 if __name__ == "__main__":
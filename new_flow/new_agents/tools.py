@@ -2,12 +2,15 @@ from crewai.tools import tool
 from pydantic import Field
 from typing import Optional
 from crewai.tools import BaseTool
-from transformers import pipeline
+from functools import lru_cache
+from modules.metrics import timed_tool, tool as timed
+from modules.singleflight import get_singleflight, inputs_key
 
 class MentalHealthTools:
     """Tools for mental health chatbot"""
     
     @tool("Bhutanese Helplines")
+    @timed_tool("Bhutanese Helplines")
     def get_bhutanese_helplines():
         """
         Provides a list of mental health helplines in Bhutan.
@@ -28,16 +31,20 @@ class TextClassifierTool(BaseTool):
         "A tool that classifies text into predefined categories. "
         "Input should be the text to classify."
     )
-            
+    model: str = "sentinet/suicidality"
+
     def _run(self, text: str) -> str:
         """
         Classifies the given text using the Hugging Face model.
         Returns the classification label and score.
         """
         try:
-            # Initialize the pipeline here (will happen on every tool call)
-            classifier = pipeline("sentiment-analysis", model="sentinet/suicidality")
-            result = classifier(text)
+            # The pipeline is loaded on the first call and reused afterwards;
+            # identical texts classified concurrently share one inference
+            with timed(self.name):
+                classifier = _load_pipeline(self.model)
+                key = inputs_key("text_classifier", {"model": self.model, "text": text})
+                result = get_singleflight().do(key, lambda: classifier(text))
             if result:
                 label = result[0]['label']
                 score = result[0]['score']
@@ -45,3 +52,10 @@ class TextClassifierTool(BaseTool):
             return "Could not classify the text."
         except Exception as e:
             return f"Error during text classification: {e}"
+
+
+@lru_cache(maxsize=None)
+def _load_pipeline(model: str):
+    # transformers is imported here so that importing the tools stays cheap
+    from transformers import pipeline
+    return pipeline("sentiment-analysis", model=model)
@@ -2,15 +2,14 @@ from crewai import Task
 from agents import *
 from pydantic import BaseModel, Field
 from textwrap import dedent
+from modules.schemas import MentalConditionOutput
+from modules.config import task_output_file
 
 # --- Pydantic Models for Structured Output ---
 class CrisisDetectionOutput(BaseModel):
     is_crisis: bool = Field(description="True if the query indicates a mental health crisis or emergency, False otherwise.")
     explanation: str = Field(description="A brief explanation for the crisis detection.")
 
-class MentalConditionOutput(BaseModel):
-    condition: str = Field(description="The classified mental health condition or concern (e.g., 'PHQ-9', 'GAD-7', 'DAST-10', 'General Well-being', 'Other').")
-    rationale: str = Field(description="A brief rationale for the classification.")
 
 
 # --- Tasks ---
@@ -74,19 +73,19 @@ personalize_and_recommend_task = Task(
 
         You will be provided with a {user_query} from the user describing their mental health struggle.
 
-        Synthesize the user's initial query '{user_query}', the collected user profile '{user_profile_data_json}', 
-        the retrieved information '{rag_query_result_json}' from the RAG agent (which includes recommendations and identified condition), 
-        and the assessment results '{assessment_result_json}' from the Assessment Agent.
+        Synthesize the user's initial query '{user_query}', the collected user profile '{user_profile}', 
+        the knowledge-base passages already retrieved for the query and condition '{retrieved_data}', 
+        the identified condition '{classified_condition}' and the assessment results (score '{questionnaire_score}', answers '{assessment_answers}').
         1. Parse all input JSON strings into Python dictionaries. 
         2. Generate a highly personalized, empathetic, and actionable mental health recommendation. 
         3. Ensure the language is culturally sensitive to Bhutan and the recommendations are practical. 
-        4. If `user_profile_data_json` indicates consent was denied or profile was skipped, provide general, but still helpful, recommendations.
-        5. If `assessment_result_json` indicates a completed assessment, incorporate the score and interpretation into the recommendation. 
+        4. If `user_profile` indicates consent was denied or profile was skipped, provide general, but still helpful, recommendations.
+        5. If the score is not 'N/A' the assessment was completed: incorporate the score and interpretation into the recommendation. 
           For example, if 'Mild depression' was assessed, suggest interventions relevant to mild depression.
-          If assessment was skipped or denied, or not needed, proceed with recommendations based on the `identified_condition` from RAG only.
+          If assessment was skipped or denied, or not needed, proceed with recommendations based on the identified condition only.
         The final response should be a well-structured message providing the personalized recommendations,
         acknowledging any assessments made or skipped.
-        6.Personalize and Empathize: Tailor your recommendations by thoughtfully considering the user's {user_profile_data_json}. For instance, an older user might benefit from different social connection suggestions than a younger one, or location might inform community resources.
+        6.Personalize and Empathize: Tailor your recommendations by thoughtfully considering the user's {user_profile}. For instance, an older user might benefit from different social connection suggestions than a younger one, or location might inform community resources.
         7.Align with Bhutanese Cultural Values: Ensure all responses and interactions deeply align with Bhutanese cultural values. This includes:
         8.Gross National Happiness (GNH): Frame recommendations within the holistic pursuit of well-being, acknowledging both material and spiritual aspects of happiness.
         9.Compassion: Express genuine empathy and kindness in your language and suggestions.
@@ -99,14 +98,8 @@ personalize_and_recommend_task = Task(
     expected_output="A comprehensive, personalized, and empathetic mental health recommendation for the user, "
                     "tailored by profile, RAG results and assessment result (if available)",
     agent=personalized_recommendation_agent,
-    context=[crisis_detection_task, mental_condition_classification_task, query_vector_db_task], # Depends on all preceding tasks
-    input_type='json',
-    parameters={
-        'user_profile_data_json': '{{ collect_user_profile_task.output }}',
-        'rag_query_result_json': '{{ query_vector_db_task.output }}',
-        'assessment_result_json': '{{ conduct_assessment_task.output }}'
-    },
-    output_file='task6.txt'
+    # Retrieval happens before kickoff (speculatively, during the questionnaire) and arrives as {retrieved_data}
+    output_file=task_output_file('task6.txt')
 )
 
 